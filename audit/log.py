@@ -0,0 +1,260 @@
+"""
+Write-behind audit log of token validations and issuances.
+
+Request threads only put an event tuple on a bounded in-process queue. A
+background thread writes queued events to the configured sink every
+AUDIT_FLUSH_INTERVAL seconds, or as soon as AUDIT_BATCH_SIZE of them are
+waiting. The sink is either bulk_create into AuditEvent or an append-only
+NDJSON file. When the queue is full, AUDIT_FULL_POLICY decides: 'drop' counts
+the event and returns at once; 'block' waits for room first, up to
+AUDIT_BLOCK_TIMEOUT seconds for all the events of one call together. Callers
+on an event loop pass block=False and always drop. Events still queued are
+written when the worker exits; those held by a worker that is killed are lost.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+
+from audit.models import AuditEvent
+from core.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+audit_events = Counter(
+    registry, 'audit_events_total', 'Audit events by what happened to them',
+    labels=('result',),
+)
+
+
+def occurred_at(timestamp):
+    return datetime.fromtimestamp(timestamp, dt_timezone.utc)
+
+
+class DatabaseSink:
+    """Insert events into AuditEvent with one bulk_create per batch"""
+
+    def write(self, events):
+        AuditEvent.objects.bulk_create([
+            AuditEvent(
+                kind=kind,
+                outcome=outcome,
+                company_name=company_name,
+                token_hash=token_hash,
+                occurred_at=occurred_at(timestamp),
+            )
+            for kind, outcome, company_name, token_hash, timestamp in events
+        ])
+
+
+class FileSink:
+    """
+    Append events to a file as NDJSON with one write and fsync per batch.
+    The file is opened with O_APPEND, so the workers of a host can share it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, events):
+        data = ''.join(
+            json.dumps({
+                'kind': kind,
+                'outcome': outcome,
+                'company_name': company_name,
+                'token_hash': token_hash.hex(),
+                'occurred_at': occurred_at(timestamp).isoformat(),
+            }) + '\n'
+            for kind, outcome, company_name, token_hash, timestamp in events
+        ).encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def get_sink():
+    if settings.AUDIT_SINK == 'file':
+        return FileSink(settings.AUDIT_FILE_PATH)
+    return DatabaseSink()
+
+
+class AuditLog:
+    """
+    Per-process queue of audit events and the thread that writes them.
+
+    Events are (kind, outcome, company_name, token_hash, timestamp) tuples.
+    A batch whose write fails is kept and written ahead of newer events by
+    the next flush, up to AUDIT_QUEUE_SIZE of them; the rest are counted as
+    failed and dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held by whoever is draining the queue, so only one batch is written at a time
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self.reset()
+
+    def reset(self):
+        """Forget queued events and counters"""
+        with self._lock:
+            self._queue = queue.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+            self._retry = []
+            self.recorded = 0
+            self.dropped = 0
+            self.written = 0
+            self.failed = 0
+            self.flushed_at = None
+
+    @property
+    def enabled(self):
+        return settings.AUDIT_ENABLED
+
+    def start(self):
+        """Start the writer thread of this process, once"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name='audit-writer', daemon=True).start()
+
+    def _run(self):
+        while self.enabled:
+            self._wake.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Audit log flush failed')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+        with self._lock:
+            self._started_pid = None
+
+    def _put(self, event, deadline):
+        try:
+            if deadline is None:
+                self._queue.put_nowait(event)
+            else:
+                self._queue.put(event, timeout=max(0, deadline - time.monotonic()))
+        except queue.Full:
+            self._wake.set()
+            return False
+        return True
+
+    def record_many(self, events, block=True):
+        """
+        Queue (kind, outcome, company_name, token_hash) events; never touches
+        the database or the file. With the 'block' policy the wait for room is
+        shared by all of them; block=False drops instead of waiting.
+        """
+        if not self.enabled or not events:
+            return
+        if self._started_pid != os.getpid():
+            self.start()
+        deadline = None
+        if block and settings.AUDIT_FULL_POLICY == 'block':
+            deadline = time.monotonic() + settings.AUDIT_BLOCK_TIMEOUT
+        timestamp = time.time()
+        recorded = 0
+        for kind, outcome, company_name, token_hash in events:
+            recorded += self._put((kind, outcome, company_name, bytes(token_hash), timestamp), deadline)
+        dropped = len(events) - recorded
+        with self._lock:
+            self.recorded += recorded
+            self.dropped += dropped
+        if dropped:
+            audit_events.inc('dropped', amount=dropped)
+        if self._queue.qsize() >= settings.AUDIT_BATCH_SIZE:
+            self._wake.set()
+
+    def record(self, kind, outcome, company_name, token_hash, block=True):
+        """Queue a single event, as record_many() does"""
+        self.record_many([(kind, outcome, company_name, token_hash)], block=block)
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def flush(self):
+        """Write every queued event to the sink and return the number written"""
+        with self._write_lock:
+            events = self._retry + self._drain()
+            self._retry = []
+            if not events:
+                return 0
+
+            sink = get_sink()
+            batch_size = settings.AUDIT_BATCH_SIZE
+            done = 0
+            try:
+                for start in range(0, len(events), batch_size):
+                    batch = events[start:start + batch_size]
+                    sink.write(batch)
+                    done = start + len(batch)
+            except Exception:
+                failed = events[done:]
+                self._retry = failed[:settings.AUDIT_QUEUE_SIZE]
+                lost = len(failed) - len(self._retry)
+                self.failed += lost
+                if lost:
+                    audit_events.inc('failed', amount=lost)
+                raise
+            finally:
+                self.written += done
+                if done:
+                    audit_events.inc('written', amount=done)
+                self.flushed_at = time.monotonic()
+            return done
+
+    def stats(self):
+        """Return the counters used to size the queue"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'queued': self._queue.qsize(),
+                'retrying': len(self._retry),
+                'max_queued': settings.AUDIT_QUEUE_SIZE,
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+                'flushed_age': None if self.flushed_at is None else time.monotonic() - self.flushed_at,
+            }
+
+
+audit_log = AuditLog()
+
+
+@receiver(setting_changed)
+def resize_queue(setting, **kwargs):
+    if setting == 'AUDIT_QUEUE_SIZE':
+        audit_log.reset()
+
+
+@atexit.register
+def flush_audit_log_at_exit():
+    try:
+        audit_log.flush()
+    except Exception:
+        logger.exception('Audit log flush at exit failed')
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("token_validated", "Token validated"),
+                            ("token_issued", "Token issued"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("outcome", models.CharField(max_length=32)),
+                ("company_name", models.CharField(max_length=255)),
+                ("token_hash", models.BinaryField(max_length=32)),
+                ("occurred_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
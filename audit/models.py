@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class AuditEvent(models.Model):
+    """
+    Token validation or issuance, written in batches by audit.log. Companies
+    and tokens are referenced by value so events outlive the rows they describe.
+    """
+    TOKEN_VALIDATED = 'token_validated'
+    TOKEN_ISSUED = 'token_issued'
+    KINDS = [
+        (TOKEN_VALIDATED, 'Token validated'),
+        (TOKEN_ISSUED, 'Token issued'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KINDS)
+    # 'valid' or why validation failed, or the format of an issued token
+    outcome = models.CharField(max_length=32)
+    company_name = models.CharField(max_length=255)
+    token_hash = models.BinaryField(max_length=32)
+    occurred_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.occurred_at} {self.kind} {self.outcome} {self.company_name}"
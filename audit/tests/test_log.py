@@ -0,0 +1,150 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from audit.log import DatabaseSink, audit_log
+from audit.models import AuditEvent
+from companies.tests.factories import CompanyFactory
+from core.metrics import registry
+from tokens.issuance import issue_token, issue_tokens
+from tokens.models import Token
+from tokens.tests.factories import TokenFactory
+from tokens.validation import avalidate_pairs, validate_pairs
+
+
+@pytest.fixture(autouse=True)
+def enabled(settings):
+    settings.AUDIT_ENABLED = True
+    settings.AUDIT_SINK = 'database'
+
+
+@pytest.mark.django_db
+class TestAuditLog:
+
+    def test_validations_are_written_in_one_insert(self, django_assert_num_queries):
+        """Test validation outcomes are queued and written by a single bulk insert"""
+        company = CompanyFactory(name='acme')
+        TokenFactory(company=company, token='valid')
+
+        validate_pairs([('valid', 'acme'), ('unknown', 'acme'), ('valid', 'globex')])
+        assert not AuditEvent.objects.exists()
+
+        with django_assert_num_queries(1):
+            assert audit_log.flush() == 3
+
+        events = AuditEvent.objects.order_by('pk')
+        assert [event.outcome for event in events] == ['valid', 'does_not_exist', 'wrong_company']
+        assert bytes(events[0].token_hash) == Token.digest_token('valid')
+        assert {event.kind for event in events} == {AuditEvent.TOKEN_VALIDATED}
+        assert registry.snapshot()[('audit_events_total', ('written',))] == 3
+
+    def test_disabled(self, settings):
+        """Test nothing is queued with AUDIT_ENABLED=False"""
+        settings.AUDIT_ENABLED = False
+
+        validate_pairs([('unknown', 'acme')])
+
+        assert audit_log.stats()['queued'] == 0
+
+    def test_issuances_are_written(self, django_capture_on_commit_callbacks):
+        """Test single, signed and bulk issuances are audited, bulk ones once committed"""
+        company = CompanyFactory()
+        issue_token(company)
+        issue_token(company, 'signed')
+
+        with django_capture_on_commit_callbacks(execute=True):
+            list(issue_tokens(company, 3, chunk_size=2))
+        audit_log.flush()
+
+        assert list(AuditEvent.objects.order_by('pk').values_list('kind', 'outcome')) == [
+            (AuditEvent.TOKEN_ISSUED, 'opaque'),
+            (AuditEvent.TOKEN_ISSUED, 'signed'),
+        ] + [(AuditEvent.TOKEN_ISSUED, 'opaque')] * 3
+
+    def test_flushes_in_batches(self, settings, django_assert_num_queries):
+        """Test a flush writes AUDIT_BATCH_SIZE events per insert"""
+        settings.AUDIT_BATCH_SIZE = 2
+        for _ in range(5):
+            audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'x' * 32)
+
+        assert audit_log._wake.is_set()
+        with django_assert_num_queries(3):
+            assert audit_log.flush() == 5
+
+    def test_full_queue_drops_events(self, settings):
+        """Test events that do not fit the queue are dropped and counted, with either policy"""
+        settings.AUDIT_QUEUE_SIZE = 2
+        for _ in range(3):
+            audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'x' * 32)
+
+        settings.AUDIT_FULL_POLICY = 'block'
+        settings.AUDIT_BLOCK_TIMEOUT = 0.01
+        audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'x' * 32)
+
+        stats = audit_log.stats()
+        assert (stats['queued'], stats['recorded'], stats['dropped']) == (2, 2, 2)
+        assert registry.snapshot()[('audit_events_total', ('dropped',))] == 2
+
+    def test_block_timeout_is_shared_by_a_batch(self, settings, monkeypatch):
+        """Test a batch waits for room at most once, and async validations never wait"""
+        settings.AUDIT_QUEUE_SIZE = 1
+        settings.AUDIT_FULL_POLICY = 'block'
+        settings.AUDIT_BLOCK_TIMEOUT = 0.05
+        audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'x' * 32)
+        timeouts = []
+        put = audit_log._queue.put
+
+        def recording_put(event, block=True, timeout=None):
+            if block:
+                timeouts.append(timeout)
+            put(event, block, timeout)
+
+        monkeypatch.setattr(audit_log._queue, 'put', recording_put)
+        validate_pairs([('one', 'acme'), ('two', 'acme'), ('three', 'acme')])
+        assert sum(timeouts) <= settings.AUDIT_BLOCK_TIMEOUT
+        assert timeouts[-1] == 0
+
+        timeouts.clear()
+        async_to_sync(avalidate_pairs)([('one', 'acme'), ('two', 'acme')])
+        assert timeouts == []
+        assert audit_log.stats()['dropped'] == 5
+
+    def test_failed_writes_are_retried(self, monkeypatch):
+        """Test a batch that fails to write is kept for the next flush"""
+        audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'x' * 32)
+        write = DatabaseSink.write
+
+        def fail(sink, events):
+            raise RuntimeError('database is down')
+
+        monkeypatch.setattr(DatabaseSink, 'write', fail)
+        with pytest.raises(RuntimeError):
+            audit_log.flush()
+        assert audit_log.stats()['retrying'] == 1
+
+        monkeypatch.setattr(DatabaseSink, 'write', write)
+        audit_log.record(AuditEvent.TOKEN_VALIDATED, 'inactive_token', 'acme', b'x' * 32)
+
+        assert audit_log.flush() == 2
+        assert list(AuditEvent.objects.order_by('pk').values_list('outcome', flat=True)) == ['valid', 'inactive_token']
+
+
+class TestFileSink:
+
+    def test_appends_ndjson(self, settings, tmp_path):
+        """Test the file sink appends one JSON line per event across flushes"""
+        settings.AUDIT_SINK = 'file'
+        settings.AUDIT_FILE_PATH = str(tmp_path / 'audit.log')
+
+        audit_log.record(AuditEvent.TOKEN_VALIDATED, 'valid', 'acme', b'\x01' * 32)
+        audit_log.flush()
+        audit_log.record(AuditEvent.TOKEN_ISSUED, 'opaque', 'acme', b'\x02' * 32)
+        audit_log.flush()
+
+        lines = [json.loads(line) for line in (tmp_path / 'audit.log').read_text().splitlines()]
+        assert [(line['kind'], line['outcome']) for line in lines] == [
+            (AuditEvent.TOKEN_VALIDATED, 'valid'), (AuditEvent.TOKEN_ISSUED, 'opaque'),
+        ]
+        assert lines[0]['token_hash'] == '01' * 32
+        assert lines[0]['occurred_at'].endswith('+00:00')
@@ -0,0 +1,101 @@
+"""
+Client-side overhead of token_client against a stub server.
+
+    python -m benchmarks.client --number 2000
+
+The stub answers every validation instantly from a local HTTP/1.1 server, so
+the numbers are the cost the client adds per validation rather than the
+service's. Variants:
+
+- new connection per call (what a naive client does)
+- pooled keep-alive connection
+- cache hit (cache_ttl > 0, no request at all)
+- 50 threads validating concurrently through the micro-batcher
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.utils import measure
+from token_client import TokenClient
+
+BODY = json.dumps({"valid": True}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this Nagle delays the body
+    disable_nagle_algorithm = True
+    requests = 0
+
+    def do_POST(self):
+        StubHandler.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if "tokens" in payload:
+            body = json.dumps({"results": [{"valid": True} for _ in payload["tokens"]]}).encode()
+        else:
+            body = BODY
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def new_connection_per_call(host, port):
+    connection = http.client.HTTPConnection(host, port)
+    body = json.dumps({"token": "token", "company_name": "acme"})
+    connection.request("POST", "/api/tokens/validate/", body=body, headers={"Content-Type": "application/json"})
+    connection.getresponse().read()
+    connection.close()
+
+
+def concurrent(client, number, workers):
+    """Mean wall time per validation with workers threads calling validate() at once"""
+    with ThreadPoolExecutor(workers) as executor:
+        start = time.perf_counter()
+        list(executor.map(lambda index: client.validate(f"token-{index}", "acme"), range(number)))
+        return (time.perf_counter() - start) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    base_url = f"http://{host}:{port}"
+
+    baseline = measure("new connection per call", lambda: new_connection_per_call(host, port), args.number)
+
+    with TokenClient(base_url, batch_window=0) as client:
+        pooled = measure("pooled keep-alive", lambda: client.validate("token", "acme"), args.number)
+
+    with TokenClient(base_url, batch_window=0, cache_ttl=60) as client:
+        measure("cache hit", lambda: client.validate("token", "acme"), args.number)
+
+    for label, window in (("unbatched", 0), ("batched", 0.002)):
+        with TokenClient(base_url, batch_window=window, pool_size=args.workers) as client:
+            StubHandler.requests = 0
+            per_call = concurrent(client, args.number, args.workers)
+            print(
+                f"{f'{args.workers} threads, {label}':<40} {per_call * 1e6:>10.1f} us/op {1 / per_call:>12.0f} ops/s"
+                f" {StubHandler.requests:>6} requests"
+            )
+
+    server.shutdown()
+    print(f"Saved per call by connection reuse: {(baseline - pooled) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
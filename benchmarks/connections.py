@@ -0,0 +1,70 @@
+"""
+Per-request database connection cost with and without connection reuse.
+
+    python -m benchmarks.connections --number 500
+
+Every simulated request runs the connection bookkeeping Django does at the
+start and end of a request around a single query, against the configured
+database. Variants:
+
+- new connection per request (CONN_MAX_AGE=0)
+- persistent connection (CONN_MAX_AGE=60)
+- persistent connection with health checks
+- psycopg 3 pool (PostgreSQL with psycopg[pool] installed only)
+
+The difference to the first line is the connection setup cost saved per request.
+"""
+import argparse
+
+from benchmarks.utils import measure, setup_django
+
+
+def variants(default):
+    yield "new connection per request", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+    yield "persistent connection", {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": False}
+    yield "persistent + health checks", {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True}
+    if default["ENGINE"] == "django.db.backends.postgresql":
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            print("psycopg[pool] is not installed; skipping the pool")
+        else:
+            options = {**default.get("OPTIONS", {}), "pool": {"min_size": 1, "max_size": 2}}
+            yield "psycopg pool", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": options}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import close_old_connections, connections
+
+    default = connections.settings["default"]
+    print(f"{default['ENGINE']} {default.get('HOST') or default['NAME']}")
+    results = []
+    for index, (label, overrides) in enumerate(variants(default)):
+        alias = f"bench_{index}"
+        connections.settings[alias] = {**default, **overrides}
+        connection = connections[alias]
+
+        def request():
+            close_old_connections()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            close_old_connections()
+
+        results.append((label, measure(label, request, args.number)))
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+
+    baseline = results[0][1]
+    for label, seconds in results[1:]:
+        print(f"Saved per request by {label}: {(baseline - seconds) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
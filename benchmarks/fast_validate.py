@@ -0,0 +1,60 @@
+"""
+Per-request CPU time of the DRF validation view vs. the fast path view.
+
+    python -m benchmarks.fast_validate --number 5000
+
+Both views are called through the full Django handler (middleware included)
+and directly, with the validation cache warm so the database is out of the
+picture and only framework overhead is compared.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import measure, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import Client, RequestFactory
+
+    from companies.models import Company
+    from tokens.models import Token
+    from tokens.views import validate_token, validate_token_fast
+
+    with test_database():
+        company, _ = Company.build("bench-company")
+        company.save()
+        raw_token, token = Token.build(company)
+        token.save()
+        body = json.dumps({"token": raw_token, "company_name": company.name})
+
+        client = Client()
+        factory = RequestFactory()
+        cpu = time.process_time
+
+        for label, path, view in (
+            ("DRF api_view", "/api/tokens/validate/", validate_token),
+            ("fast path", "/api/tokens/validate/fast/", validate_token_fast),
+        ):
+            measure(
+                f"{label}, full handler",
+                lambda: client.post(path, body, content_type="application/json"),
+                args.number,
+                clock=cpu,
+            )
+            measure(
+                f"{label}, view only",
+                lambda: view(factory.post(path, body, content_type="application/json")),
+                args.number,
+                clock=cpu,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+HTTP load test comparing the sync and async views of a running server.
+
+Start the server with one of the run profiles from the README, then:
+
+    python -m benchmarks.load --base-url http://localhost:8000 --concurrency 200 --duration 30
+
+A company and a token are registered first; every worker thread then keeps
+one keep-alive connection open and replays the same validation request.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchmarks.utils import percentile
+
+DEFAULT_PATHS = ["/api/tokens/validate/", "/api/tokens/validate/async/"]
+
+
+def post(connection, path, payload):
+    body = json.dumps(payload)
+    connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def connect(base_url):
+    parts = urlsplit(base_url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    return connection_class(parts.hostname, parts.port, timeout=30)
+
+
+def create_token(base_url):
+    connection = connect(base_url)
+    company_name = f"load-{uuid.uuid4().hex[:12]}"
+    _, body = post(connection, "/api/companies/register/", {"company_name": company_name})
+    password = json.loads(body)["password"]
+    _, body = post(connection, "/api/tokens/", {"company_name": company_name, "password": password})
+    connection.close()
+    return {"token": json.loads(body)["token"], "company_name": company_name}
+
+
+def run(base_url, path, payload, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        connection = connect(base_url)
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = post(connection, path, payload)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = connect(base_url)
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - started)
+            if status != 200:
+                local_errors += 1
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{path:<32} {len(latencies) / elapsed:>9.0f} req/s  "
+        f"p50 {percentile(latencies, 0.50) * 1e3:>7.1f} ms  "
+        f"p95 {percentile(latencies, 0.95) * 1e3:>7.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1e3:>7.1f} ms  "
+        f"errors {errors[0]}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per path")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help=f"Validation path to load (repeatable, default: {' and '.join(DEFAULT_PATHS)})")
+    args = parser.parse_args()
+
+    payload = create_token(args.base_url)
+    for path in args.paths or DEFAULT_PATHS:
+        run(args.base_url, path, payload, args.concurrency, args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Startup and per-request middleware cost of the full vs. API-only settings.
+
+    python -m benchmarks.settings_profiles --number 5000
+
+Each profile runs in a fresh interpreter so import time is measured cold.
+Per-request cost is the CPU time of a request that never reaches the
+database (an invalid payload), through the full handler.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+PROFILES = ("core.settings", "core.settings_api")
+
+
+def run_profile(number):
+    """Measure the current DJANGO_SETTINGS_MODULE and print the results as JSON"""
+    start = time.perf_counter()
+
+    import django
+
+    django.setup()
+    from core.wsgi import application  # noqa: F401
+
+    startup = time.perf_counter() - start
+
+    from django.conf import settings
+    from django.test import Client
+
+    client = Client()
+    path = "/api/tokens/validate/"
+
+    def call():
+        client.post(path, "{}", content_type="application/json")
+
+    call()
+    cpu_start = time.process_time()
+    for _ in range(number):
+        call()
+    per_request = (time.process_time() - cpu_start) / number
+
+    print(json.dumps({
+        "startup": startup,
+        "per_request": per_request,
+        "apps": len(settings.INSTALLED_APPS),
+        "middleware": len(settings.MIDDLEWARE),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args.number)
+        return
+
+    for profile in PROFILES:
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+        env.setdefault("SECRET_KEY", "benchmark")
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.settings_profiles",
+             "--number", str(args.number), "--profile", profile],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output)
+        print(
+            f"{profile:<20} {result['apps']:>2} apps {result['middleware']:>2} middleware "
+            f"startup {result['startup'] * 1e3:>7.1f} ms "
+            f"request {result['per_request'] * 1e6:>7.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
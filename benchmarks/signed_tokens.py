@@ -0,0 +1,44 @@
+"""
+Compare validation of signed tokens with the database path.
+
+    python -m benchmarks.signed_tokens --number 5000
+"""
+import argparse
+
+from benchmarks.utils import measure, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test import override_settings
+
+    from companies.models import Company
+    from tokens.models import Token
+    from tokens.signed import sign_token
+    from tokens.validation import validate_pairs
+
+    with test_database():
+        company = Company(name="bench-company")
+        company.set_password("bench")
+        company.save()
+
+        raw_token = Token.generate_token()
+        token = Token(company=company)
+        token.set_token(raw_token)
+        token.save()
+        signed_token, _ = sign_token(company)
+
+        with override_settings(TOKEN_VALIDATION_CACHE_MAX_SIZE=0):
+            measure("opaque token, database lookup", lambda: validate_pairs([(raw_token, company.name)]), args.number)
+        measure("opaque token, validation cache", lambda: validate_pairs([(raw_token, company.name)]), args.number)
+        measure("signed token, in memory", lambda: validate_pairs([(signed_token, company.name)]), args.number)
+        measure("sign_token", lambda: sign_token(company), args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Replayable benchmark suite for the company and token endpoints.
+
+seed() bulk-inserts companies and tokens, then run_suite() replays a mix of
+realistic scenarios through the full Django handler and reports throughput,
+latency percentiles and queries per request for each one. Results are plain
+dicts so they can be saved as JSON and compared between commits with
+compare(). Used by `manage.py bench_tokens`.
+"""
+import json
+import platform
+import random
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass
+
+from benchmarks.utils import percentile
+
+SCENARIOS = (
+    "validate_mostly_valid",
+    "validate_mostly_invalid",
+    "validate_wrong_company",
+    "validate_inactive_company",
+    "generate_burst",
+    "register_company",
+)
+
+
+@dataclass
+class SeededCompany:
+    name: str
+    password: str
+    active: bool
+    tokens: list
+
+
+@dataclass
+class SeedData:
+    prefix: str
+    companies: list
+
+
+def seed(companies, tokens_per_company, inactive_fraction=0.1, chunk_size=1000, prefix=None):
+    """
+    Bulk-insert companies and their tokens.
+
+    Every company name starts with prefix. Returns a SeedData holding one
+    SeededCompany per company with the raw password and tokens, which are
+    only known at creation time.
+    """
+    from django.db import transaction
+
+    from companies.models import Company
+    from tokens.models import Token
+
+    prefix = prefix or f"bench-{uuid.uuid4().hex[:8]}"
+    inactive = int(companies * inactive_fraction)
+    seeded = []
+    with transaction.atomic():
+        built = [
+            Company.build(f"{prefix}-{index}", active=index >= inactive)
+            for index in range(companies)
+        ]
+        Company.objects.bulk_create([company for company, _ in built], batch_size=chunk_size)
+
+        pending = []
+        for company, password in built:
+            raw_tokens = []
+            for _ in range(tokens_per_company):
+                raw_token, token = Token.build(company)
+                raw_tokens.append(raw_token)
+                pending.append(token)
+            seeded.append(SeededCompany(company.name, password, company.active, raw_tokens))
+            if len(pending) >= chunk_size:
+                Token.objects.bulk_create(pending, batch_size=chunk_size)
+                pending = []
+        Token.objects.bulk_create(pending, batch_size=chunk_size)
+    return SeedData(prefix, seeded)
+
+
+def unseed(data):
+    """Delete seeded and benchmark-registered companies; their tokens go with them"""
+    from companies.models import Company
+
+    Company.objects.filter(name__startswith=f"{data.prefix}-").delete()
+
+
+def _validation_payloads(seeded, rng, count, valid_share, wrong_company=False, inactive=False):
+    active = [company for company in seeded if company.active and company.tokens]
+    pool = [company for company in seeded if not company.active and company.tokens] if inactive else active
+    if not pool:
+        raise ValueError("Not enough seeded companies with tokens for this scenario")
+
+    payloads = []
+    for _ in range(count):
+        company = rng.choice(pool)
+        token = rng.choice(company.tokens)
+        company_name = company.name
+        if wrong_company and len(active) > 1:
+            company_name = rng.choice([other for other in active if other is not company]).name
+        elif not inactive and rng.random() >= valid_share:
+            token = str(uuid.UUID(int=rng.getrandbits(128)))
+        payloads.append({"token": token, "company_name": company_name})
+    return payloads
+
+
+def build_requests(scenario, data, count, rng):
+    """Return (url name, payloads) for a scenario"""
+    seeded = data.companies
+    if scenario == "validate_mostly_valid":
+        return "token-validate", _validation_payloads(seeded, rng, count, valid_share=0.9)
+    if scenario == "validate_mostly_invalid":
+        return "token-validate", _validation_payloads(seeded, rng, count, valid_share=0.1)
+    if scenario == "validate_wrong_company":
+        return "token-validate", _validation_payloads(seeded, rng, count, valid_share=1, wrong_company=True)
+    if scenario == "validate_inactive_company":
+        return "token-validate", _validation_payloads(seeded, rng, count, valid_share=1, inactive=True)
+    if scenario == "generate_burst":
+        active = [company for company in seeded if company.active]
+        payloads = []
+        for _ in range(count):
+            company = rng.choice(active)
+            payloads.append({"company_name": company.name, "password": company.password})
+        return "token-generate", payloads
+    if scenario == "register_company":
+        run = uuid.uuid4().hex[:8]
+        return "company-register", [
+            {"company_name": f"{data.prefix}-new-{run}-{index}"} for index in range(count)
+        ]
+    raise ValueError(f"Unknown scenario '{scenario}'")
+
+
+def summarize(latencies, queries, status_codes, elapsed):
+    """Reduce raw per-request measurements to the reported statistics"""
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "mean_ms": sum(ordered) / count * 1e3 if count else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1e3,
+        "p95_ms": percentile(ordered, 0.95) * 1e3,
+        "p99_ms": percentile(ordered, 0.99) * 1e3,
+        "queries_per_request": sum(queries) / count if count else 0.0,
+        "status_codes": {str(code): status_codes.count(code) for code in sorted(set(status_codes))},
+    }
+
+
+def run_scenario(client, url, payloads):
+    """Replay payloads against url one request at a time and summarize them"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    queries = []
+    status_codes = []
+    started = time.perf_counter()
+    for payload in payloads:
+        body = json.dumps(payload)
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = client.post(url, body, content_type="application/json")
+            latencies.append(time.perf_counter() - request_started)
+        queries.append(len(captured))
+        status_codes.append(response.status_code)
+    return summarize(latencies, queries, status_codes, time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(data, requests, scenarios=SCENARIOS, seed_value=0):
+    """Run every scenario against already seeded data and return the results"""
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    rng = random.Random(seed_value)
+    client = Client()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+        for scenario in scenarios:
+            url_name, payloads = build_requests(scenario, data, requests, rng)
+            results[scenario] = run_scenario(client, reverse(url_name), payloads)
+
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "companies": len(data.companies),
+            "tokens": sum(len(company.tokens) for company in data.companies),
+            "requests_per_scenario": requests,
+            "validation_cache": settings.TOKEN_VALIDATION_CACHE_MAX_SIZE > 0,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(baseline, current):
+    """
+    Return per-scenario relative changes of current against baseline.
+    Positive throughput and negative latency changes are improvements.
+    """
+    changes = {}
+    for scenario, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            continue
+        changes[scenario] = {
+            metric: (result[metric] - previous[metric]) / previous[metric] if previous[metric] else None
+            for metric in ("throughput", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+        }
+    return changes
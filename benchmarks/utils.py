@@ -0,0 +1,55 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from the configured
+DATABASES, so they never touch real data. Run them from the project root:
+
+    python -m benchmarks.<name>
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django(settings_module="core.settings"):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Create a throwaway test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(label, func, number, clock=time.perf_counter):
+    """Call func number times and print the mean cost per call"""
+    func()
+    start = clock()
+    for _ in range(number):
+        func()
+    elapsed = clock() - start
+    per_call = elapsed / number
+    print(f"{label:<40} {per_call * 1e6:>10.1f} us/op {1 / per_call:>12.0f} ops/s")
+    return per_call
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
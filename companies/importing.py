@@ -0,0 +1,143 @@
+"""
+Bulk company import from CSV or JSON Lines.
+
+Rows are read lazily, inserted with bulk_create(ignore_conflicts=True) in
+chunks that each commit on their own and reported as one NDJSON line each, so
+memory and lock time stay bounded by the chunk size however long the input is. Duplicate names are left to the unique
+constraint on Company.name: after each chunk a single SELECT tells which
+rows were inserted by comparing the stored password hashes with the ones just
+generated.
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from companies.models import Company
+from companies.serializers import CompanyDetailsSerializer
+
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'jsonl',
+    'application/jsonl': 'jsonl',
+}
+
+
+def read_rows(lines, input_format):
+    """Yield one dict (or the ValueError it raised) per input row from an iterable of text lines"""
+    if input_format == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield exc
+            continue
+        yield row if isinstance(row, dict) else ValueError('Expected a JSON object')
+
+
+def read_byte_rows(stream, input_format):
+    """read_rows() over a binary stream such as an uploaded request body, without a UTF-8 BOM"""
+    return read_rows(codecs.iterdecode(stream, 'utf-8-sig'), input_format)
+
+
+def _validated(row):
+    """Return (validated data, None) or (None, errors) for one input row"""
+    if isinstance(row, ValueError):
+        return None, {'non_field_errors': [f'Invalid row - {row}']}
+    if row.get('token_ttl') == '':
+        # Empty CSV cell
+        row = {**row, 'token_ttl': None}
+    serializer = CompanyDetailsSerializer(data=row)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+def _import_chunk(chunk):
+    """
+    Insert the valid rows of a chunk of (row number, data, errors) in their own
+    transaction and return a result per row, in order
+    """
+    built = {
+        number: Company.build(data['company_name'], token_ttl=data.get('token_ttl'))
+        for number, data, errors in chunk if errors is None
+    }
+    stored = {}
+    if built:
+        with transaction.atomic():
+            Company.objects.bulk_create([company for company, _ in built.values()], ignore_conflicts=True)
+            stored = dict(
+                Company.objects.filter(name__in=[company.name for company, _ in built.values()])
+                .values_list('name', 'password_hash')
+            )
+    results = []
+    for number, _, errors in chunk:
+        if errors is not None:
+            results.append((number, None, None, errors))
+            continue
+        company, password = built[number]
+        if stored.get(company.name) == company.password_hash:
+            results.append((number, company, password, None))
+        else:
+            results.append((number, company, None, {'company_name': ['Company name already exists']}))
+    return results
+
+
+def import_companies(rows, chunk_size=None, max_rows=None):
+    """
+    Register a company for every row, yielding (row number, company, password,
+    errors) in input order, with password None and errors set for rows that
+    were not imported.
+
+    Each chunk commits before its results are yielded, so no transaction
+    stays open while the caller writes them out. Closing the generator early
+    keeps the chunks committed so far; the companies of rows whose results
+    were not read are imported, but their passwords are lost. Rows after
+    max_rows are skipped with a single error.
+    """
+    chunk_size = chunk_size or settings.COMPANY_IMPORT_CHUNK_SIZE
+
+    chunk = []
+    for number, row in enumerate(rows, start=1):
+        if max_rows is not None and number > max_rows:
+            chunk.append((number, None, {'non_field_errors': [f'Imports are limited to {max_rows} rows']}))
+            break
+        chunk.append((number, *_validated(row)))
+        if len(chunk) >= chunk_size:
+            yield from _import_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _import_chunk(chunk)
+
+
+def import_companies_ndjson(rows, chunk_size=None, max_rows=None, counts=None):
+    """
+    Import companies and yield one JSON document per line for each row.
+    counts, if given, is a dict updated with the number of imported and failed rows.
+    """
+    datetime_field = serializers.DateTimeField()
+    counts = {} if counts is None else counts
+    counts.update(imported=0, failed=0)
+    for number, company, password, errors in import_companies(rows, chunk_size, max_rows):
+        if errors is None:
+            counts['imported'] += 1
+            line = {
+                'row': number,
+                'company_name': company.name,
+                'password': password,
+                'created_at': datetime_field.to_representation(company.created_at),
+            }
+        else:
+            counts['failed'] += 1
+            line = {'row': number, 'errors': errors}
+            if company is not None:
+                line['company_name'] = company.name
+        yield json.dumps(line) + '\n'
@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.importing import FORMATS, import_companies_ndjson, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Register companies in bulk from a CSV file (company_name and optional token_ttl "
+        "columns) or JSON Lines, writing each row's credentials or errors as NDJSON. "
+        "Passwords are only ever shown here, so redirect the output somewhere safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="Input format (defaults to the file extension, jsonl for stdin)")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows per INSERT (defaults to COMPANY_IMPORT_CHUNK_SIZE)")
+        parser.add_argument('--output', default=None,
+                            help="File to write to instead of stdout")
+
+    def handle(self, *args, **options):
+        input_format = options['format']
+        if input_format is None:
+            input_format = 'csv' if Path(options['path']).suffix.lower() == '.csv' else 'jsonl'
+
+        if options['path'] == '-':
+            source = sys.stdin
+        else:
+            try:
+                source = open(options['path'], newline='', encoding='utf-8-sig')
+            except OSError as exc:
+                raise CommandError(f"Cannot read {options['path']}: {exc.strerror}")
+
+        counts = {}
+        with source:
+            lines = import_companies_ndjson(read_rows(source, input_format), options['chunk_size'], counts=counts)
+            if options['output']:
+                with open(options['output'], 'w') as output:
+                    output.writelines(lines)
+            else:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+
+        self.stderr.write(f"Imported {counts['imported']} companies, {counts['failed']} rows failed")
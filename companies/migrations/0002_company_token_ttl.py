@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="token_ttl",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Seconds new tokens stay valid; empty means they never expire",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:18
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0002_company_token_ttl"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="company",
+            name="token_ttl",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Seconds new tokens stay valid; empty means they never expire",
+                null=True,
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.utils import timezone
 import hashlib
 import secrets
 
@@ -7,6 +11,10 @@ class Company(models.Model):
     name = models.CharField(max_length=255, unique=True)
     password_hash = models.CharField(max_length=255)
     active = models.BooleanField(default=True)
+    token_ttl = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)],
+        help_text="Seconds new tokens stay valid; empty means they never expire",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -20,6 +28,43 @@ class Company(models.Model):
         """Check if the provided password matches the stored hash"""
         return self.password_hash == hashlib.sha256(raw_password.encode()).hexdigest()
 
+    @classmethod
+    def authenticate(cls, name, raw_password):
+        """Return the active company with these credentials, or None"""
+        company = cls.objects.filter(name=name, active=True).first()
+        if company is None or not company.check_password(raw_password):
+            return None
+        return company
+
+    def deactivate(self):
+        """
+        Deactivate the company with a single UPDATE and tell every listener in
+        this process, inside the same transaction so that what they write
+        commits with it. Returns 1 if the company was active, 0 otherwise.
+        """
+        from companies.signals import company_deactivated
+
+        with transaction.atomic():
+            updated = Company.objects.filter(pk=self.pk, active=True).update(active=False)
+            self.active = False
+            if updated:
+                company_deactivated.send(sender=Company, company_id=self.pk, company_name=self.name)
+        return updated
+
+    def token_expiry(self):
+        """Expiry for a token issued now, or None if tokens never expire"""
+        if self.token_ttl is None:
+            return None
+        return timezone.now() + timedelta(seconds=self.token_ttl)
+
+    @classmethod
+    def build(cls, name, **fields):
+        """Return an unsaved Company with a freshly generated password, and that password"""
+        password = cls.generate_password()
+        company = cls(name=name, **fields)
+        company.set_password(password)
+        return company, password
+
     @classmethod
     def generate_password(cls):
         """Generate a random password for the company"""
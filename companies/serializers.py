@@ -2,8 +2,12 @@ from rest_framework import serializers
 from companies.models import Company
 
 
-class CompanyRegistrationSerializer(serializers.Serializer):
+class CompanyDetailsSerializer(serializers.Serializer):
     company_name = serializers.CharField(max_length=255)
+    token_ttl = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
+class CompanyRegistrationSerializer(CompanyDetailsSerializer):
     
     def validate_company_name(self, value):
         """Check if company name is already taken"""
@@ -13,9 +17,10 @@ class CompanyRegistrationSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         """Create a new company with generated password"""
-        password = Company.generate_password()
-        company = Company(name=validated_data['company_name'])
-        company.set_password(password)
+        company, password = Company.build(
+            validated_data['company_name'],
+            token_ttl=validated_data.get('token_ttl'),
+        )
         company.save()
         
         return {
@@ -24,6 +29,19 @@ class CompanyRegistrationSerializer(serializers.Serializer):
         }
 
 
+class CompanyCredentialsSerializer(serializers.Serializer):
+    company_name = serializers.CharField(max_length=255)
+    password = serializers.CharField(max_length=255, write_only=True)
+
+    def validate(self, data):
+        """Validate company credentials"""
+        company = Company.authenticate(data['company_name'], data['password'])
+        if company is None:
+            raise serializers.ValidationError("Invalid credentials")
+        data['company'] = company
+        return data
+
+
 class CompanyRegistrationResponseSerializer(serializers.Serializer):
     company_name = serializers.CharField()
     password = serializers.CharField()
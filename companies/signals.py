@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with company_id and company_name after Company.deactivate() turned a company off. Set-based
+# updates skip post_save, so caches listen for this instead
+company_deactivated = Signal()
@@ -0,0 +1,109 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from companies.importing import import_companies, read_rows
+from companies.models import Company
+from companies.tests.factories import CompanyFactory
+
+
+@pytest.mark.django_db
+class TestImportCompanies:
+
+    def test_inserts_in_chunks_without_prechecks(self, django_assert_num_queries):
+        """Test each chunk is one INSERT plus one SELECT, whatever the number of rows"""
+        rows = [{'company_name': f'company-{index}'} for index in range(10)]
+
+        # A savepoint, an INSERT, a SELECT and a release per chunk of 5
+        with django_assert_num_queries(8):
+            results = list(import_companies(rows, chunk_size=5))
+
+        assert Company.objects.count() == 10
+        assert [number for number, *_ in results] == list(range(1, 11))
+        for _, company, password, errors in results:
+            assert errors is None
+            assert Company.objects.get(name=company.name).check_password(password)
+
+    def test_conflicts_are_reported_per_row(self):
+        """Test existing and repeated names are reported by the unique constraint"""
+        existing = CompanyFactory(name='taken', password='original')
+        rows = [{'company_name': 'taken'}, {'company_name': 'new'}, {'company_name': 'new'}]
+
+        results = list(import_companies(rows))
+
+        assert [errors for *_, errors in results] == [
+            {'company_name': ['Company name already exists']},
+            None,
+            {'company_name': ['Company name already exists']},
+        ]
+        existing.refresh_from_db()
+        assert existing.check_password('original')
+        assert Company.objects.count() == 2
+
+    def test_invalid_rows_are_reported(self):
+        """Test rows failing validation are skipped with their errors"""
+        lines = ['{"company_name": ""}\n', 'not json\n', '{"company_name": "ok", "token_ttl": 60}\n']
+        rows = read_rows(lines, 'jsonl')
+
+        results = list(import_companies(rows))
+
+        assert 'company_name' in results[0][3]
+        assert 'Invalid row' in results[1][3]['non_field_errors'][0]
+        assert results[2][3] is None
+        assert Company.objects.get().token_ttl == 60
+
+    def test_chunks_commit_before_they_are_yielded(self):
+        """Test an import that is not read to the end keeps the chunks already reported"""
+        results = import_companies([{'company_name': 'a'}, {'company_name': 'b'}], chunk_size=1)
+        next(results)
+        results.close()
+
+        assert list(Company.objects.values_list('name', flat=True)) == ['a']
+
+
+@pytest.mark.django_db
+class TestImportCompaniesCommand:
+
+    def test_imports_csv(self, tmp_path):
+        """Test a CSV file is imported and credentials are written as NDJSON"""
+        CompanyFactory(name='taken')
+        path = tmp_path / 'companies.csv'
+        path.write_text('company_name,token_ttl\nacme,3600\nglobex,\ntaken,\n')
+        out, err = StringIO(), StringIO()
+
+        call_command('import_companies', str(path), chunk_size=2, stdout=out, stderr=err)
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [line['row'] for line in lines] == [1, 2, 3]
+        assert Company.objects.get(name='acme').check_password(lines[0]['password'])
+        assert Company.objects.get(name='acme').token_ttl == 3600
+        assert Company.objects.get(name='globex').token_ttl is None
+        assert lines[2]['errors'] == {'company_name': ['Company name already exists']}
+        assert 'Imported 2 companies, 1 rows failed' in err.getvalue()
+
+    def test_ignores_a_byte_order_mark(self, tmp_path):
+        """Test a CSV saved with a UTF-8 BOM keeps its company_name header"""
+        path = tmp_path / 'companies.csv'
+        path.write_text('company_name\nacme\n', encoding='utf-8-sig')
+
+        call_command('import_companies', str(path), stdout=StringIO(), stderr=StringIO())
+
+        assert Company.objects.filter(name='acme').exists()
+
+    def test_imports_jsonl_to_file(self, tmp_path):
+        """Test JSON Lines input and --output"""
+        path = tmp_path / 'companies.jsonl'
+        path.write_text('{"company_name": "acme"}\n\n{"company_name": "globex"}\n')
+        output = tmp_path / 'credentials.ndjson'
+
+        call_command('import_companies', str(path), output=str(output), stdout=StringIO(), stderr=StringIO())
+
+        assert len(output.read_text().splitlines()) == 2
+        assert Company.objects.count() == 2
+
+    def test_missing_file(self, tmp_path):
+        """Test a missing input file is a command error"""
+        with pytest.raises(CommandError):
+            call_command('import_companies', str(tmp_path / 'missing.csv'), stdout=StringIO())
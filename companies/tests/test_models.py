@@ -1,4 +1,8 @@
+from datetime import timedelta
+
 import pytest
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from companies.models import Company
 from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
 
@@ -32,3 +36,19 @@ class TestCompanyModel:
         """Test inactive company creation"""
         company = InactiveCompanyFactory()
         assert company.active is False
+
+    def test_token_expiry(self):
+        """Test the expiry for new tokens follows the company's token TTL"""
+        assert CompanyFactory().token_expiry() is None
+
+        company = CompanyFactory(token_ttl=60)
+        before = timezone.now()
+        expiry = company.token_expiry()
+        assert before + timedelta(seconds=59) < expiry <= timezone.now() + timedelta(seconds=60)
+
+    def test_zero_token_ttl_is_invalid(self):
+        """Test a company's token TTL must be positive when set"""
+        with pytest.raises(ValidationError) as excinfo:
+            CompanyFactory.build(token_ttl=0).full_clean()
+
+        assert 'token_ttl' in excinfo.value.message_dict
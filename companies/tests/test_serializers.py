@@ -82,3 +82,20 @@ class TestCompanyRegistrationSerializer:
         
         assert company.check_password(password) is True
         assert company.check_password('wrong_password') is False
+
+    def test_token_ttl_is_stored(self):
+        """Test an optional token TTL can be set at registration"""
+        data = {'company_name': 'TTLCompany', 'token_ttl': 3600}
+        serializer = CompanyRegistrationSerializer(data=data)
+
+        assert serializer.is_valid()
+        result = serializer.save()
+        assert result['company'].token_ttl == 3600
+
+    def test_invalid_token_ttl_rejected(self):
+        """Test non-positive token TTLs are rejected"""
+        data = {'company_name': 'TTLCompany', 'token_ttl': 0}
+        serializer = CompanyRegistrationSerializer(data=data)
+
+        assert not serializer.is_valid()
+        assert 'token_ttl' in serializer.errors
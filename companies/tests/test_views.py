@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -85,3 +87,129 @@ class TestCompanyRegistrationView:
             content_type='application/json'
         )
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestAsyncCompanyRegistrationView:
+
+    def setup_method(self):
+        """Set up test client for each test"""
+        self.client = APIClient()
+        self.url = '/api/companies/register/async/'
+
+    def test_successful_company_registration(self):
+        """Test the async view registers a company"""
+        response = self.client.post(self.url, {'company_name': 'AsyncCompany'}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        body = response.json()
+        assert set(body) == {'company_name', 'password', 'created_at', 'message'}
+        company = Company.objects.get(name='AsyncCompany')
+        assert company.check_password(body['password']) is True
+
+    def test_duplicate_company_name_rejected(self):
+        """Test duplicates get the same error as the sync view"""
+        CompanyFactory(name="ExistingCompany")
+        data = {'company_name': 'ExistingCompany'}
+
+        sync_response = self.client.post('/api/companies/register/', data, format='json')
+        async_response = self.client.post(self.url, data, format='json')
+
+        assert async_response.status_code == sync_response.status_code
+        assert async_response.content == sync_response.content
+
+    def test_missing_company_name_rejected(self):
+        """Test field errors match the sync view"""
+        sync_response = self.client.post('/api/companies/register/', {}, format='json')
+        async_response = self.client.post(self.url, {}, format='json')
+
+        assert async_response.status_code == sync_response.status_code
+        assert async_response.content == sync_response.content
+
+
+@pytest.mark.django_db
+class TestCompanyDeactivationView:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = '/api/companies/deactivate/'
+
+    def test_deactivation_rejects_company_tokens(self, django_assert_num_queries):
+        """Test deactivating a company is one UPDATE plus its change log entry and its tokens stop validating at once"""
+        from tokens.signed import sign_token
+        from tokens.tests.factories import TokenFactory
+        from tokens.validation import validate_pairs
+
+        company = CompanyFactory(password='test123')
+        TokenFactory(company=company, token='opaque-token')
+        signed_token, _ = sign_token(company)
+        pairs = [('opaque-token', company.name), (signed_token, company.name)]
+        assert validate_pairs(pairs) == [None, None]
+
+        # The credentials SELECT, then a savepoint around the UPDATE and the change log INSERT
+        with django_assert_num_queries(5):
+            response = self.client.post(self.url, {'company_name': company.name, 'password': 'test123'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'deactivated': 1}
+        company.refresh_from_db()
+        assert company.active is False
+        assert validate_pairs(pairs) == [{'company_name': 'Company is inactive'}] * 2
+
+    def test_invalid_credentials(self):
+        """Test only the company itself can deactivate it"""
+        company = CompanyFactory(password='test123')
+
+        response = self.client.post(self.url, {'company_name': company.name, 'password': 'wrong'}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        company.refresh_from_db()
+        assert company.active is True
+
+
+@pytest.mark.django_db
+class TestCompanyImportView:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = '/api/companies/import/'
+
+    def test_streams_credentials_for_jsonl(self):
+        """Test a JSON Lines body is imported and answered with NDJSON per row"""
+        CompanyFactory(name='taken')
+        body = '{"company_name": "acme"}\n{"company_name": "taken"}\n'
+
+        response = self.client.generic('POST', self.url, body, content_type='application/x-ndjson')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert Company.objects.get(name='acme').check_password(lines[0]['password'])
+        assert lines[1] == {'row': 2, 'company_name': 'taken', 'errors': {'company_name': ['Company name already exists']}}
+
+    def test_csv_body(self):
+        """Test a CSV body is imported, ignoring a UTF-8 BOM"""
+        response = self.client.generic(
+            'POST', self.url, '\ufeffcompany_name\nacme\nglobex\n', content_type='text/csv',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(b''.join(response.streaming_content).splitlines()) == 2
+        assert Company.objects.count() == 2
+
+    def test_row_limit(self, settings):
+        """Test rows beyond COMPANY_IMPORT_MAX_ROWS are not imported"""
+        settings.COMPANY_IMPORT_MAX_ROWS = 1
+        body = '{"company_name": "acme"}\n{"company_name": "globex"}\n'
+
+        response = self.client.generic('POST', self.url, body, content_type='application/x-ndjson')
+
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert 'limited to 1 rows' in lines[1]['errors']['non_field_errors'][0]
+        assert Company.objects.count() == 1
+
+    def test_unsupported_content_type(self):
+        """Test bodies other than CSV or JSON Lines are rejected"""
+        response = self.client.post(self.url, {'company_name': 'acme'}, format='json')
+
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
@@ -1,7 +1,11 @@
 from django.urls import path
-from companies.views import register_company
+from companies.views import (aregister_company, deactivate_company,
+                             import_companies, register_company)
 
 
 urlpatterns = [
     path('register/', register_company, name='company-register'),
+    path('register/async/', aregister_company, name='company-register-async'),
+    path('deactivate/', deactivate_company, name='company-deactivate'),
+    path('import/', import_companies, name='company-import'),
 ]
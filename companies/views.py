@@ -1,7 +1,25 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from companies.serializers import CompanyRegistrationSerializer
+from companies.importing import (CONTENT_TYPES, import_companies_ndjson,
+                                 read_byte_rows)
+from companies.models import Company
+from companies.serializers import (CompanyCredentialsSerializer,
+                                   CompanyDetailsSerializer,
+                                   CompanyRegistrationSerializer)
+from core.http import json_response, method_not_allowed, parse_json_body
+
+
+def registration_response_data(company, password):
+    return {
+        'company_name': company.name,
+        'password': password,
+        'created_at': company.created_at,
+        'message': 'Company registered successfully. Please save your password - it will not be shown again.'
+    }
 
 
 @api_view(['POST'])
@@ -10,19 +28,80 @@ def register_company(request):
     Register a new company and return credentials
     """
     serializer = CompanyRegistrationSerializer(data=request.data)
-    
+
     if serializer.is_valid():
         result = serializer.create(serializer.validated_data)
-        company = result['company']
-        password = result['password']
-        
-        response_data = {
-            'company_name': company.name,
-            'password': password,
-            'created_at': company.created_at,
-            'message': 'Company registered successfully. Please save your password - it will not be shown again.'
-        }
-        
+        response_data = registration_response_data(result['company'], result['password'])
         return Response(response_data, status=status.HTTP_201_CREATED)
-    
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def deactivate_company(request):
+    """
+    Deactivate the authenticated company, rejecting all of its tokens.
+    Reactivating it takes an administrator.
+    """
+    serializer = CompanyCredentialsSerializer(data=request.data)
+
+    if serializer.is_valid():
+        deactivated = serializer.validated_data['company'].deactivate()
+        return Response({'deactivated': deactivated}, status=status.HTTP_200_OK)
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@csrf_exempt
+async def aregister_company(request):
+    """
+    Async version of register_company built on the async ORM
+    """
+    if request.method != 'POST':
+        return method_not_allowed(request)
+
+    data, error_response = parse_json_body(request)
+    if error_response is not None:
+        return error_response
+
+    serializer = CompanyDetailsSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    name = serializer.validated_data['company_name']
+    if await Company.objects.filter(name=name).aexists():
+        return json_response(
+            {'company_name': ['Company name already exists']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    company, password = Company.build(name, token_ttl=serializer.validated_data.get('token_ttl'))
+    await company.asave()
+    return json_response(registration_response_data(company, password), status=status.HTTP_201_CREATED)
+
+
+@csrf_exempt
+def import_companies(request):
+    """
+    Register companies in bulk from a CSV or JSON Lines body, streaming the
+    credentials of each imported row, or its errors, back as NDJSON.
+
+    The body is read line by line while rows are inserted in chunks, so
+    memory use does not grow with the size of the import.
+    """
+    if request.method != 'POST':
+        return method_not_allowed(request)
+
+    input_format = CONTENT_TYPES.get(request.content_type)
+    if input_format is None:
+        content_type = request.META.get('CONTENT_TYPE', '')
+        return json_response(
+            {'detail': f'Unsupported media type "{content_type}" in request.'},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+
+    lines = import_companies_ndjson(
+        read_byte_rows(request, input_format),
+        max_rows=settings.COMPANY_IMPORT_MAX_ROWS,
+    )
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson', status=status.HTTP_200_OK)
@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state(monkeypatch):
+    """Start every test with empty per-process caches"""
+    from audit.log import audit_log
+    from core.metrics import registry
+    from core.ratelimit import memory_limiter
+    from core.routers import replicas
+    from tokens.bloom import token_filter
+    from tokens.cache import validation_cache
+    from tokens.index import token_index
+    from tokens.signed import revocations
+    from tokens.usage import usage_tracker
+
+    validation_cache.clear()
+    revocations.reset()
+    registry.reset()
+    memory_limiter.reset()
+    replicas.reset()
+    token_filter.reset()
+    usage_tracker.reset()
+    token_index.reset()
+    audit_log.reset()
+    # Tests flush usage explicitly instead of racing the background thread
+    monkeypatch.setattr(usage_tracker, 'start', lambda: None)
+    # and refresh the token index explicitly too
+    monkeypatch.setattr(token_index, 'start', lambda: None)
+    # and write audit events explicitly
+    monkeypatch.setattr(audit_log, 'start', lambda: None)
+    yield
+    usage_tracker.reset()
+    audit_log.reset()
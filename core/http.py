@@ -0,0 +1,77 @@
+"""
+Helpers for plain Django views that must answer exactly like the DRF
+``@api_view`` endpoints they mirror.
+"""
+import json
+
+from django.http import HttpResponse
+from rest_framework.metadata import SimpleMetadata
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+renderer = JSONRenderer()
+
+
+def json_response(data, status=200):
+    """Render data the way DRF's JSONRenderer would"""
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+def method_not_allowed(request, allowed=('POST', 'OPTIONS')):
+    response = json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    response['Allow'] = ', '.join(allowed)
+    return response
+
+
+def options_response(request, view, allowed=('POST', 'OPTIONS')):
+    """Answer OPTIONS with the metadata DRF returns for the @api_view view being mirrored"""
+    response = json_response(SimpleMetadata().determine_metadata(request, view.cls()))
+    response['Allow'] = ', '.join(allowed)
+    return response
+
+
+def _reject_constant(value):
+    raise ValueError(f'Out of range float values are not JSON compliant: {value!r}')
+
+
+def json_loads(body):
+    return json.loads(body.decode('utf-8'), parse_constant=_reject_constant)
+
+
+def fast_json_loads(body):
+    """
+    Parse with orjson when it is installed. Invalid documents are parsed
+    again with the standard library so error messages match DRF's.
+    """
+    if orjson is None:
+        return json_loads(body)
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return json_loads(body)
+
+
+def parse_json_body(request, loads=json_loads):
+    """
+    Parse a request body the way DRF's JSONParser does.
+
+    Returns (data, None) on success and (None, error_response) otherwise.
+    Requests without a body parse to an empty dict.
+    """
+    body = request.body
+    if not body:
+        return {}, None
+
+    if request.content_type not in ('application/json', 'application/*', '*/*'):
+        content_type = request.META.get('CONTENT_TYPE', '')
+        error = {'detail': f'Unsupported media type "{content_type}" in request.'}
+        return None, json_response(error, status=415)
+
+    try:
+        return loads(body), None
+    except ValueError as exc:
+        return None, json_response({'detail': f'JSON parse error - {exc}'}, status=400)
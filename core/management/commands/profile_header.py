@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.profiling import profile_header
+
+
+class Command(BaseCommand):
+    help = "Print an X-Profile-Request header value that gets a request profiled."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"X-Profile-Request: {profile_header()}")
+        self.stderr.write(f"Valid for {settings.PROFILING_HEADER_MAX_AGE} seconds")
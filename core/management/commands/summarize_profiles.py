@@ -0,0 +1,59 @@
+import io
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import category_times, load_dumps, query_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the collected request profiles: time by category (serializer "
+        "validation, hashing, ORM, rendering), the hottest functions and the "
+        "most expensive queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help="Directory with the dumps (defaults to PROFILING_DIR)")
+        parser.add_argument('--limit', type=int, default=20,
+                            help="Functions and queries to list")
+        parser.add_argument('--sort', choices=('tottime', 'cumulative', 'calls'), default='tottime')
+        parser.add_argument('--view', default=None,
+                            help="Only include requests to this URL name")
+
+    def handle(self, *args, **options):
+        requests, stats = load_dumps(options['dir'] or settings.PROFILING_DIR, view=options['view'])
+        if not requests:
+            raise CommandError("No profiles found")
+
+        reasons = Counter(request['reason'] for request in requests)
+        views = Counter(request['view'] for request in requests)
+        durations = sorted(request['duration'] for request in requests)
+        self.stdout.write(
+            f"{len(requests)} profiled requests "
+            f"({', '.join(f'{reason}: {count}' for reason, count in reasons.most_common())}), "
+            f"median {durations[len(durations) // 2] * 1e3:.1f} ms, max {durations[-1] * 1e3:.1f} ms"
+        )
+        for view, count in views.most_common():
+            self.stdout.write(f"  {view:<30} {count:>6}")
+
+        self.stdout.write("\nOwn time by category")
+        totals = category_times(stats)
+        overall = sum(totals.values()) or 1
+        for name, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f"  {name:<30} {seconds * 1e3:>10.1f} ms {seconds / overall:>6.1%}")
+
+        self.stdout.write(f"\nHottest functions by {options['sort']}")
+        output = io.StringIO()
+        stats.stream = output
+        stats.files = []
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue().strip('\n'))
+
+        self.stdout.write("\nMost expensive queries")
+        for sql, count, duration in query_totals(requests)[:options['limit']]:
+            self.stdout.write(
+                f"  {duration * 1e3:>10.1f} ms {count:>6}x {duration / count * 1e3:>8.2f} ms/query  {sql}"
+            )
@@ -0,0 +1,219 @@
+"""
+Lock-light Prometheus metrics that aggregate across worker processes.
+
+Every thread records into its own shard, so counting a request never takes a
+lock; a lock is only held when a new thread registers its shard or an exited
+thread's shard is folded into the base shard. A snapshot sums the shards. When METRICS_DIR is set, each worker periodically writes its
+snapshot to <METRICS_DIR>/<pid>.json and /metrics sums every file in the
+directory, so the numbers cover all gunicorn workers whichever one answers.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Metric:
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        registry.metrics[name] = self
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """Values are kept as per-bucket counts followed by the +Inf count, the sum and the total count"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+
+def _merge(total, key, value):
+    if isinstance(value, list):
+        current = total.get(key)
+        total[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+    else:
+        total[key] = total.get(key, 0) + value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Owner:
+    """Held only by a thread's local storage, so it is collected when the thread exits"""
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self._local = threading.local()
+        self._base = {}
+        self._shards = [self._base]
+        # Reentrant: a shard can be retired by garbage collection while the lock is held
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            self._local.owner = _Owner()
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(self._local.owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        """Fold an exited thread's values into the base shard and drop its shard"""
+        with self._lock:
+            if not any(existing is shard for existing in self._shards):
+                return
+            self._shards = [existing for existing in self._shards if existing is not shard]
+            for key, value in shard.items():
+                _merge(self._base, key, value)
+
+    def reset(self):
+        """Drop every recorded value in this process"""
+        with self._lock:
+            for shard in list(self._shards):
+                shard.clear()
+
+    def snapshot(self):
+        """Sum the shards of every thread in this process"""
+        with self._lock:
+            shards = list(self._shards)
+        total = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                _merge(total, key, value)
+        return total
+
+    def _path(self):
+        return Path(settings.METRICS_DIR) / f'{os.getpid()}.json'
+
+    def flush(self):
+        """Write this worker's snapshot to METRICS_DIR, if one is configured"""
+        self._flushed_at = time.monotonic()
+        if not settings.METRICS_DIR or not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            path = self._path()
+            temporary = path.with_suffix('.tmp')
+            temporary.write_text(json.dumps([
+                [name, list(labels), value] for (name, labels), value in self.snapshot().items()
+            ]))
+            os.replace(temporary, path)
+        finally:
+            self._flush_lock.release()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def collect(self):
+        """Sum the snapshots of every worker, using live values for this one"""
+        total = self.snapshot()
+        if not settings.METRICS_DIR:
+            return total
+        own = self._path()
+        for path in Path(settings.METRICS_DIR).glob('*.json'):
+            if path == own:
+                continue
+            try:
+                entries = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in entries:
+                _merge(total, (name, tuple(labels)), value)
+        return total
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        values = self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            samples = sorted(
+                (labels, value) for (name, labels), value in values.items() if name == metric.name
+            )
+            for labels, value in samples:
+                if metric.kind == 'counter':
+                    lines.append(f'{metric.name}{_format_labels(metric.labels, labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, '+Inf'), value):
+                    cumulative += count
+                    bucket_labels = _format_labels(metric.labels, labels, [('le', bound)])
+                    lines.append(f'{metric.name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{metric.name}_sum{_format_labels(metric.labels, labels)} {value[-2]}')
+                lines.append(f'{metric.name}_count{_format_labels(metric.labels, labels)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+requests_total = Counter(
+    registry, 'http_requests_total', 'HTTP responses by URL name, method and status code',
+    labels=('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    registry, 'http_request_duration_seconds', 'Time spent handling a request',
+    labels=('view',),
+)
+request_queries = Histogram(
+    registry, 'http_request_db_queries', 'Database queries run while handling a request',
+    labels=('view',), buckets=QUERY_BUCKETS,
+)
+request_db_duration = Histogram(
+    registry, 'http_request_db_duration_seconds', 'Time spent in database queries while handling a request',
+    labels=('view',),
+)
+token_validations = Counter(
+    registry, 'token_validations_total', 'Token validations by outcome',
+    labels=('outcome',),
+)
@@ -0,0 +1,238 @@
+import cProfile
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+
+from core import metrics, profiling, ratelimit
+
+
+# Observers of the current request; the context is copied into the threads
+# that sync_to_async() runs the ORM in, so they see the same ones
+_observers = ContextVar('query_observers', default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    """Execute wrapper that passes each query through the observers of the current context"""
+    for observer in _observers.get():
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def observe_connections():
+    """
+    Install observe_queries() on this thread's connections, once. It goes
+    first so that execute_wrapper() blocks, which pop the last wrapper, keep
+    working around it.
+    """
+    for connection in connections.all():
+        if observe_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, observe_queries)
+
+
+class QueryObserver:
+    """
+    Database execute wrapper that counts queries and the time spent in them,
+    optionally keeping each query's SQL and duration
+    """
+
+    def __init__(self, record=False):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = [] if record else None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.duration += duration
+            self.count += 1
+            if self.queries is not None:
+                self.queries.append((sql, duration))
+
+    @contextmanager
+    def watch(self):
+        """
+        Observe the queries of the current context in every thread. Under ASGI
+        the ORM runs in another thread, whose connections need
+        observe_connections() called from it.
+        """
+        observe_connections()
+        reset_token = _observers.set((*_observers.get(), self))
+        try:
+            yield self
+        finally:
+            _observers.reset(reset_token)
+
+
+class MetricsMiddleware:
+    """Record latency, status codes and database usage of every request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        observer = QueryObserver()
+        started = time.perf_counter()
+        with observer.watch():
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, observer)
+        return response
+
+    async def __acall__(self, request):
+        observer = QueryObserver()
+        started = time.perf_counter()
+        # The async ORM runs its queries in the request's sync thread
+        await sync_to_async(observe_connections)()
+        with observer.watch():
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, observer)
+        return response
+
+    def record(self, request, response, duration, observer):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        metrics.requests_total.inc(view, request.method, response.status_code)
+        metrics.request_duration.observe(duration, view)
+        metrics.request_queries.observe(observer.count, view)
+        metrics.request_db_duration.observe(observer.duration, view)
+        metrics.registry.maybe_flush()
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that carry a signed X-Profile-Request header and, with
+    PROFILING_ENABLED, a sample of requests or those slower than
+    PROFILING_SLOW_THRESHOLD. Only one request per process is profiled at a
+    time; requests arriving meanwhile run unprofiled. Under ASGI the profile
+    covers the event loop thread and the request's sync thread, where the ORM
+    runs; before Python 3.12 that takes a second profiler in the sync thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        reason = profiling.profiling_reason(request)
+        if reason is None or not profiling.profiler_lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profiler = cProfile.Profile()
+            observer = QueryObserver(record=True)
+            started = time.perf_counter()
+            with observer.watch():
+                try:
+                    profiler.enable()
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            self.save((profiler,), request, response, time.perf_counter() - started, reason, observer)
+        finally:
+            profiling.profiler_lock.release()
+        return response
+
+    async def __acall__(self, request):
+        reason = profiling.profiling_reason(request)
+        if reason is None or not profiling.profiler_lock.acquire(blocking=False):
+            return await self.get_response(request)
+
+        try:
+            # From 3.12 one profiler sees every thread and only one can be
+            # active; before that it only sees the thread that enabled it
+            profilers = [cProfile.Profile()]
+            if sys.version_info < (3, 12):
+                profilers.append(cProfile.Profile())
+            observer = QueryObserver(record=True)
+            started = time.perf_counter()
+            # The async ORM runs its queries in the request's sync thread
+            await sync_to_async(observe_connections)()
+            with observer.watch():
+                response = await self.profile(request, *profilers)
+            self.save(profilers, request, response, time.perf_counter() - started, reason, observer)
+        finally:
+            profiling.profiler_lock.release()
+        return response
+
+    async def profile(self, request, profiler, thread_profiler=None):
+        """Await the response with profiler on the event loop and thread_profiler, if any, in the sync thread"""
+        try:
+            if thread_profiler is not None:
+                await sync_to_async(thread_profiler.enable)()
+            try:
+                profiler.enable()
+                return await self.get_response(request)
+            finally:
+                profiler.disable()
+        finally:
+            if thread_profiler is not None:
+                await sync_to_async(thread_profiler.disable)()
+
+    def save(self, profilers, request, response, duration, reason, observer):
+        if profiling.should_keep(reason, duration):
+            stats = pstats.Stats(*profilers)
+            profiling.write_dump(stats, request, response, duration, reason, observer.queries)
+
+
+class RateLimitMiddleware:
+    """
+    Reject requests to the token and company endpoints that exceed the
+    per-client-IP or per-company rate with a 429, before the view runs
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.RATELIMIT_ENABLED:
+            raise MiddlewareNotUsed
+        self.rates = {}
+        for name in ('RATELIMIT_IP_RATE', 'RATELIMIT_COMPANY_RATE'):
+            try:
+                self.rates[name] = ratelimit.parse_rate(getattr(settings, name))
+            except ValueError as exc:
+                raise ImproperlyConfigured(f'{name}: {exc}')
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Returns the coroutine as is under ASGI; the work happens in process_view
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = request.resolver_match.url_name
+        if not ratelimit.is_limited_view(view):
+            return None
+        exceeded = ratelimit.check_request(
+            request, self.rates['RATELIMIT_IP_RATE'], self.rates['RATELIMIT_COMPANY_RATE'],
+        )
+        if exceeded is None:
+            return None
+        scope, retry_after = exceeded
+        return ratelimit.throttled_response(scope, view, retry_after)
@@ -0,0 +1,145 @@
+"""
+Request profiling: cProfile dumps plus the SQL each profiled request ran.
+
+A request is profiled when it carries a valid signed X-Profile-Request
+header, or, with PROFILING_ENABLED, when it is sampled or turns out slower
+than PROFILING_SLOW_THRESHOLD. Each dump is a <name>.prof pstats file and a
+<name>.json file describing the request and its queries. Only the newest
+PROFILING_MAX_DUMPS dumps are kept.
+"""
+import json
+import pstats
+import random
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = 'HTTP_X_PROFILE_REQUEST'
+SALT = 'core.profiling'
+
+# Where the time goes, by substrings of "<file>:<function>" in the profile
+CATEGORIES = (
+    ('rendering', ('rest_framework/renderers', 'json/encoder', 'orjson', 'core/http')),
+    ('serializer validation', ('rest_framework/serializers', 'rest_framework/fields', 'rest_framework/validators')),
+    ('hashing', ('hashlib', 'sha256', 'django/core/signing', 'hmac')),
+    ('ORM', ('django/db/',)),
+    ('request handling', (
+        'django/core/handlers', 'django/urls', 'django/middleware', 'django/http',
+        'django/utils/deprecation', 'rest_framework/views', 'rest_framework/request',
+    )),
+)
+
+# cProfile can only be active once per process
+profiler_lock = threading.Lock()
+
+
+def profile_header():
+    """Return a value for the X-Profile-Request header"""
+    return signing.dumps('profile', salt=SALT)
+
+
+def has_profile_header(request):
+    value = request.META.get(HEADER)
+    if not value:
+        return False
+    try:
+        return signing.loads(value, salt=SALT, max_age=settings.PROFILING_HEADER_MAX_AGE) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def profiling_reason(request):
+    """Why this request should be profiled from the start, or None"""
+    if has_profile_header(request):
+        return 'header'
+    if settings.PROFILING_ENABLED:
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sampled'
+        if settings.PROFILING_SLOW_THRESHOLD:
+            # Slowness is only known at the end, so these are profiled and then kept only if slow
+            return 'slow'
+    return None
+
+
+def should_keep(reason, duration):
+    return reason != 'slow' or duration >= settings.PROFILING_SLOW_THRESHOLD
+
+
+def write_dump(profiler, request, response, duration, reason, queries):
+    """Save the profile and request details, then rotate old dumps"""
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    match = request.resolver_match
+    view = match.url_name if match is not None and match.url_name else 'unmatched'
+    name = f'{time.time_ns()}-{view}-{duration * 1e3:.0f}ms'
+
+    profiler.dump_stats(directory / f'{name}.prof')
+    (directory / f'{name}.json').write_text(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': response.status_code,
+        'duration': duration,
+        'reason': reason,
+        'queries': [{'sql': sql, 'duration': query_duration} for sql, query_duration in queries],
+    }, indent=2))
+    rotate(directory)
+
+
+def rotate(directory):
+    dumps = sorted(Path(directory).glob('*.json'))
+    for stale in dumps[:max(0, len(dumps) - settings.PROFILING_MAX_DUMPS)]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def load_dumps(directory, view=None):
+    """Return the request details and the combined pstats of every dump, or only those for one view"""
+    requests = []
+    stats = None
+    for details in sorted(Path(directory).glob('*.json')):
+        profile = details.with_suffix('.prof')
+        try:
+            request = json.loads(details.read_text())
+            if view is not None and request['view'] != view:
+                continue
+            if stats is None:
+                stats = pstats.Stats(str(profile))
+            else:
+                stats.add(str(profile))
+        except (OSError, ValueError, TypeError, EOFError):
+            continue
+        requests.append(request)
+    return requests, stats
+
+
+def category_times(stats):
+    """Sum the own time of every profiled function by category"""
+    totals = {name: 0.0 for name, _ in CATEGORIES}
+    totals['other'] = 0.0
+    for (filename, _, function), (_, _, own_time, _, _) in stats.stats.items():
+        location = f'{filename}:{function}'
+        for name, patterns in CATEGORIES:
+            if any(pattern in location for pattern in patterns):
+                totals[name] += own_time
+                break
+        else:
+            totals['other'] += own_time
+    return totals
+
+
+def query_totals(requests):
+    """Aggregate queries by SQL text: (sql, count, total duration), slowest first"""
+    totals = {}
+    for request in requests:
+        for query in request['queries']:
+            count, duration = totals.get(query['sql'], (0, 0.0))
+            totals[query['sql']] = (count + 1, duration + query['duration'])
+    return sorted(
+        ((sql, count, duration) for sql, (count, duration) in totals.items()),
+        key=lambda item: item[2],
+        reverse=True,
+    )
@@ -0,0 +1,185 @@
+"""
+Per-company and per-client-IP rate limits for the token and company endpoints.
+
+Limits are checked by RateLimitMiddleware once the URL is resolved and before
+the view runs, so a rejected request never reaches the ORM. Rates are written
+like DRF throttle rates: "<requests>/<period>" with the period in seconds,
+minutes, hours or days ("20/s", "600/m"). An empty rate disables that scope.
+Rates are parsed once when the middleware is loaded, and a malformed one
+stops the server from starting.
+
+The memory backend keeps a token bucket per key in each worker, so with N
+workers a client can get up to N times the rate. The cache backend keeps a
+sliding-window counter in a Django cache shared by every worker.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import RequestDataTooBig
+
+from core.http import fast_json_loads, json_response
+from core.metrics import Counter, registry
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+rejections = Counter(
+    registry, 'ratelimit_rejections_total', 'Requests rejected by the rate limiter',
+    labels=('scope', 'view'),
+)
+
+
+def parse_rate(rate):
+    """
+    Return (requests, period in seconds) for a rate string, or None when it
+    is empty; raises ValueError if it is malformed
+    """
+    if not rate:
+        return None
+    count, _, period = rate.partition('/')
+    if not count.isdigit() or int(count) == 0 or period[:1] not in PERIODS:
+        raise ValueError(f'Invalid rate "{rate}", expected "<requests>/<s|m|h|d>" with at least 1 request')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucketLimiter:
+    """
+    In-memory token buckets, refilled continuously at requests/period and
+    holding at most one period's worth of requests. Only the
+    RATELIMIT_MAX_KEYS most recently seen keys are kept; a key that is dropped
+    starts again with a full bucket.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = OrderedDict()
+
+    def hit(self, key, requests, period):
+        """Take one request from a bucket; return 0 if allowed, else seconds until it would be"""
+        now = time.monotonic()
+        refill = requests / period
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(requests), now]
+                while len(self._buckets) > settings.RATELIMIT_MAX_KEYS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(requests, bucket[0] + (now - bucket[1]) * refill)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / refill
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'max_keys': settings.RATELIMIT_MAX_KEYS}
+
+
+class CacheLimiter:
+    """
+    Sliding-window counters in a shared Django cache: the count of the
+    current window plus the previous one weighted by how much of it still
+    overlaps the last period. Concurrent requests can overshoot the limit by
+    the number of workers checking at the same moment.
+    """
+
+    def hit(self, key, requests, period):
+        cache = caches[settings.RATELIMIT_CACHE_ALIAS]
+        now = time.time()
+        window = int(now // period)
+        # Company names may contain characters memcached does not accept in keys
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        current_key = f'ratelimit:{digest}:{period}:{window}'
+        previous_key = f'ratelimit:{digest}:{period}:{window - 1}'
+        counts = cache.get_many([current_key, previous_key])
+        elapsed = now / period - window
+        estimate = counts.get(previous_key, 0) * (1 - elapsed) + counts.get(current_key, 0)
+        if estimate >= requests:
+            return (1 - elapsed) * period
+        if not cache.add(current_key, 1, timeout=2 * period):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current_key, 1, timeout=2 * period)
+        return 0
+
+
+memory_limiter = TokenBucketLimiter()
+cache_limiter = CacheLimiter()
+
+
+def get_limiter():
+    return cache_limiter if settings.RATELIMIT_BACKEND == 'cache' else memory_limiter
+
+
+def is_limited_view(url_name):
+    return bool(url_name) and url_name.startswith(tuple(settings.RATELIMIT_VIEW_PREFIXES))
+
+
+def client_ip(request):
+    value = request.META.get(settings.RATELIMIT_IP_HEADER, '')
+    # The right-most X-Forwarded-For entry is the one added by our own proxy
+    return value.rsplit(',', 1)[-1].strip() or request.META.get('REMOTE_ADDR', '')
+
+
+def company_names(request):
+    """Company names named by a JSON request body or a company query parameter, without touching the database"""
+    if request.method == 'GET':
+        name = request.GET.get('company')
+        return {name} if name else set()
+    if request.content_type != 'application/json':
+        # Leave other bodies, such as streamed imports, unread
+        return set()
+    try:
+        data = fast_json_loads(request.body) if request.body else None
+    except (ValueError, RequestDataTooBig):
+        return set()
+    if not isinstance(data, dict):
+        return set()
+    items = data.get('tokens') if isinstance(data.get('tokens'), list) else [data]
+    return {
+        item['company_name'] for item in items
+        if isinstance(item, dict) and isinstance(item.get('company_name'), str)
+    }
+
+
+def check_request(request, ip_rate, company_rate):
+    """
+    Return (scope, retry_after) for the first limit the request exceeds, or
+    None, given the parsed rates of each scope
+    """
+    limiter = get_limiter()
+    if ip_rate is not None:
+        retry_after = limiter.hit(f'ip:{client_ip(request)}', *ip_rate)
+        if retry_after:
+            return 'ip', retry_after
+
+    if company_rate is not None:
+        for name in sorted(company_names(request)):
+            retry_after = limiter.hit(f'company:{name}', *company_rate)
+            if retry_after:
+                return 'company', retry_after
+    return None
+
+
+def throttled_response(scope, view, retry_after):
+    rejections.inc(scope, view)
+    seconds = max(1, math.ceil(retry_after))
+    response = json_response(
+        {'detail': f'Request was throttled. Expected available in {seconds} seconds.'},
+        status=429,
+    )
+    response['Retry-After'] = str(seconds)
+    return response
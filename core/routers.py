@@ -0,0 +1,136 @@
+"""
+Read replicas for validation traffic.
+
+Reads made inside replica_reads() go to one replica picked for the block;
+every other query, and every write, goes to the primary. Only read-only
+paths opt in, so read-after-write paths such as token generation and company
+registration never see replication lag.
+
+Replicas come from DATABASE_REPLICA_URLS and are picked round-robin or by
+least recent failure (DATABASE_REPLICA_SELECTION). A replica that fails is
+skipped for DATABASE_REPLICA_FAILURE_COOLDOWN seconds, and the read is
+retried on the primary.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+class ReplicaSet:
+    """Picks the replica for a block of reads and remembers which ones failed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._next = 0
+            self._failed_at = {}
+
+    def _healthy(self, now):
+        cooldown = settings.DATABASE_REPLICA_FAILURE_COOLDOWN
+        return [
+            alias for alias in settings.DATABASE_REPLICAS
+            if now - self._failed_at.get(alias, float('-inf')) >= cooldown
+        ]
+
+    def choose(self):
+        """Return the replica alias to read from, or None for the primary"""
+        if not settings.DATABASE_REPLICAS:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            healthy = self._healthy(now)
+            if not healthy:
+                return None
+            if settings.DATABASE_REPLICA_SELECTION == 'least_recently_failed':
+                oldest = min(self._failed_at.get(alias, float('-inf')) for alias in healthy)
+                healthy = [alias for alias in healthy if self._failed_at.get(alias, float('-inf')) == oldest]
+            alias = healthy[self._next % len(healthy)]
+            self._next += 1
+            return alias
+
+    def mark_failed(self, alias):
+        with self._lock:
+            self._failed_at[alias] = time.monotonic()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'replicas': list(settings.DATABASE_REPLICAS),
+                'healthy': self._healthy(now),
+                'failed_ages': {alias: now - failed_at for alias, failed_at in self._failed_at.items()},
+            }
+
+
+replicas = ReplicaSet()
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """Route the reads of the block to a replica (chosen unless given); yields the alias or None"""
+    if alias is None:
+        alias = replicas.choose()
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def _failed(alias):
+    replicas.mark_failed(alias)
+    logger.warning('Read from replica %s failed; retrying on the primary', alias, exc_info=True)
+
+
+def read_from_replica(read):
+    """
+    Call read() with its queries on a replica, falling back to the primary
+    if the replica fails. Returns the result and the replica alias it came
+    from, None for the primary.
+    """
+    with replica_reads() as alias:
+        if alias is None:
+            return read(), None
+        try:
+            return read(), alias
+        except DatabaseError:
+            _failed(alias)
+    return read(), None
+
+
+async def aread_from_replica(read):
+    """Async version of read_from_replica() for a coroutine function"""
+    with replica_reads() as alias:
+        if alias is None:
+            return await read(), None
+        try:
+            return await read(), alias
+        except DatabaseError:
+            _failed(alias)
+    return await read(), None
+
+
+class ReplicaRouter:
+    """Database router that sends reads made inside replica_reads() to the chosen replica"""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
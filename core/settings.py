@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env(
     DEBUG=(bool, False),
@@ -24,11 +25,16 @@ INSTALLED_APPS = [
     # third-party apps
     "rest_framework",
     # Custom apps
+    "core",
     "companies",
     "tokens",
+    "audit",
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ProfilingMiddleware",
+    "core.middleware.RateLimitMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,6 +75,48 @@ else:
         }
     }
 
+# Persistent connections: seconds a connection is reused across requests
+# (0 closes it after every request). Health checks replace a reused
+# connection that has gone away instead of failing the request with it.
+# They default to off with the uvicorn worker (GUNICORN_WORKER_CLASS), where
+# the async ORM's threads would each keep connections open past the request
+ASGI_WORKER = 'uvicorn' in env('GUNICORN_WORKER_CLASS', default='sync').lower()
+DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0 if ASGI_WORKER else 60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+
+# PostgreSQL connection pool shared by the threads of a worker, instead of one
+# persistent connection per thread. Needs psycopg 3: pip install "psycopg[binary,pool]"
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=0)
+if DB_POOL_MAX_SIZE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=1),
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),
+    }
+
+# Read replicas for validation lookups (see core/routers.py). Each URL becomes
+# a replica_<n> alias with the primary's connection settings
+DATABASE_REPLICA_URLS = env.list('DATABASE_REPLICA_URLS', default=[])
+DATABASE_REPLICA_SELECTION = env('DATABASE_REPLICA_SELECTION', default='round_robin')
+DATABASE_REPLICA_FAILURE_COOLDOWN = env.float('DATABASE_REPLICA_FAILURE_COOLDOWN', default=30.0)
+# Tokens a replica does not have yet are looked up again on the primary, so
+# tokens issued within the replication lag still validate
+DATABASE_REPLICA_RECHECK_MISSING = env.bool('DATABASE_REPLICA_RECHECK_MISSING', default=True)
+DATABASE_REPLICAS = []
+for index, url in enumerate(DATABASE_REPLICA_URLS):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **env.db_url_config(url),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+        # Tests read the replica through the primary's test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -100,3 +148,129 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Per-worker cache of successful token validations; set either value to 0 to disable.
+# Revocations only evict entries in the worker that made them, so a token revoked
+# elsewhere can validate for up to TOKEN_VALIDATION_CACHE_TTL seconds.
+TOKEN_VALIDATION_CACHE_MAX_SIZE = env.int('TOKEN_VALIDATION_CACHE_MAX_SIZE', default=10000)
+TOKEN_VALIDATION_CACHE_TTL = env.float('TOKEN_VALIDATION_CACHE_TTL', default=30.0)
+
+# Maximum number of token/company pairs accepted by /api/tokens/validate/batch/
+TOKEN_VALIDATION_BATCH_MAX_SIZE = env.int('TOKEN_VALIDATION_BATCH_MAX_SIZE', default=100)
+
+# Bulk company import through /api/companies/import/ and `manage.py import_companies`
+COMPANY_IMPORT_CHUNK_SIZE = env.int('COMPANY_IMPORT_CHUNK_SIZE', default=1000)
+COMPANY_IMPORT_MAX_ROWS = env.int('COMPANY_IMPORT_MAX_ROWS', default=10000)
+
+# Maximum number of tokens revoked by one /api/tokens/revoke/batch/ request
+TOKEN_REVOCATION_BATCH_MAX_SIZE = env.int('TOKEN_REVOCATION_BATCH_MAX_SIZE', default=1000)
+
+# Bulk issuance through /api/tokens/bulk/ and `manage.py issue_tokens`
+TOKEN_BULK_MAX_COUNT = env.int('TOKEN_BULK_MAX_COUNT', default=10000)
+TOKEN_BULK_CHUNK_SIZE = env.int('TOKEN_BULK_CHUNK_SIZE', default=1000)
+
+# Token listing at GET /api/tokens/ and the NDJSON export at /api/tokens/export/
+TOKEN_LIST_PAGE_SIZE = env.int('TOKEN_LIST_PAGE_SIZE', default=100)
+TOKEN_LIST_MAX_PAGE_SIZE = env.int('TOKEN_LIST_MAX_PAGE_SIZE', default=1000)
+TOKEN_EXPORT_CHUNK_SIZE = env.int('TOKEN_EXPORT_CHUNK_SIZE', default=2000)
+
+# Signed tokens are validated without a database lookup; revocations and
+# company deactivations reach other workers within the refresh interval
+TOKEN_SIGNING_KEY = env('TOKEN_SIGNING_KEY', default=SECRET_KEY)
+TOKEN_SIGNED_TTL = env.int('TOKEN_SIGNED_TTL', default=3600)
+if TOKEN_SIGNED_TTL <= 0:
+    raise ImproperlyConfigured('TOKEN_SIGNED_TTL must be a positive number of seconds')
+TOKEN_SIGNED_REVOCATION_REFRESH = env.float('TOKEN_SIGNED_REVOCATION_REFRESH', default=5.0)
+
+# Serve /api/tokens/validate/ with the DRF-free fast path view
+TOKEN_VALIDATE_FAST_PATH = env.bool('TOKEN_VALIDATE_FAST_PATH', default=False)
+
+# Prometheus metrics served at /metrics. With several workers, point
+# METRICS_DIR at a directory they share (emptied on deploy) so every worker's
+# numbers are included whichever one answers the scrape. Only peers in
+# METRICS_ALLOWED_IPS (addresses or networks) may scrape; behind a proxy that is
+# the proxy's address, so keep /metrics off the public interface there too
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+METRICS_DIR = env('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=1.0)
+
+# Request profiling. A signed X-Profile-Request header (`manage.py profile_header`)
+# always profiles its request; PROFILING_ENABLED adds sampled and slow requests.
+# A slow threshold profiles every request and keeps only the slow ones
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=False)
+PROFILING_SAMPLE_RATE = env.float('PROFILING_SAMPLE_RATE', default=0.0)
+PROFILING_SLOW_THRESHOLD = env.float('PROFILING_SLOW_THRESHOLD', default=0.0)
+PROFILING_DIR = env('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_DUMPS = env.int('PROFILING_MAX_DUMPS', default=200)
+PROFILING_HEADER_MAX_AGE = env.int('PROFILING_HEADER_MAX_AGE', default=3600)
+
+# Per-worker Bloom filter over all token hashes that rejects unknown tokens
+# without the validation lookup. Tokens issued by other workers are picked up
+# within TOKEN_BLOOM_SYNC_INTERVAL seconds; until then a miss checks the rows
+# inserted over the last TOKEN_BLOOM_SYNC_OVERLAP seconds
+TOKEN_BLOOM_ENABLED = env.bool('TOKEN_BLOOM_ENABLED', default=False)
+TOKEN_BLOOM_FALSE_POSITIVE_RATE = env.float('TOKEN_BLOOM_FALSE_POSITIVE_RATE', default=0.01)
+TOKEN_BLOOM_MAX_MEMORY = env.int('TOKEN_BLOOM_MAX_MEMORY', default=64 * 1024 * 1024)
+TOKEN_BLOOM_HEADROOM = env.float('TOKEN_BLOOM_HEADROOM', default=1.5)
+TOKEN_BLOOM_SYNC_INTERVAL = env.float('TOKEN_BLOOM_SYNC_INTERVAL', default=1.0)
+TOKEN_BLOOM_SYNC_OVERLAP = env.float('TOKEN_BLOOM_SYNC_OVERLAP', default=30.0)
+TOKEN_BLOOM_REBUILD_INTERVAL = env.float('TOKEN_BLOOM_REBUILD_INTERVAL', default=3600.0)
+
+# Write-behind token usage tracking: each worker counts uses in memory and a
+# background thread writes last_used_at/use_count in batched UPDATEs
+TOKEN_USAGE_TRACKING_ENABLED = env.bool('TOKEN_USAGE_TRACKING_ENABLED', default=True)
+TOKEN_USAGE_FLUSH_INTERVAL = env.float('TOKEN_USAGE_FLUSH_INTERVAL', default=10.0)
+TOKEN_USAGE_FLUSH_BATCH_SIZE = env.int('TOKEN_USAGE_FLUSH_BATCH_SIZE', default=500)
+TOKEN_USAGE_MAX_PENDING = env.int('TOKEN_USAGE_MAX_PENDING', default=100000)
+
+# Rate limits on the token and company endpoints, checked before the view runs.
+# Rates look like "20/s" or "600/m"; an empty rate disables that scope. The
+# memory backend limits each worker separately, the cache backend shares
+# counters through the RATELIMIT_CACHE_ALIAS cache. Behind a proxy, set
+# RATELIMIT_IP_HEADER=HTTP_X_FORWARDED_FOR
+RATELIMIT_ENABLED = env.bool('RATELIMIT_ENABLED', default=False)
+RATELIMIT_IP_RATE = env('RATELIMIT_IP_RATE', default='100/s')
+RATELIMIT_COMPANY_RATE = env('RATELIMIT_COMPANY_RATE', default='50/s')
+RATELIMIT_BACKEND = env('RATELIMIT_BACKEND', default='memory')
+RATELIMIT_CACHE_ALIAS = env('RATELIMIT_CACHE_ALIAS', default='default')
+RATELIMIT_MAX_KEYS = env.int('RATELIMIT_MAX_KEYS', default=100000)
+RATELIMIT_IP_HEADER = env('RATELIMIT_IP_HEADER', default='REMOTE_ADDR')
+RATELIMIT_VIEW_PREFIXES = env.list('RATELIMIT_VIEW_PREFIXES', default=['token-', 'company-'])
+
+# Memory-mapped token index written by `manage.py build_token_index`. Every
+# worker maps TOKEN_INDEX_PATH read-only, remaps it when it is replaced and
+# overlays tokens changed since the build every TOKEN_INDEX_REFRESH_INTERVAL
+# seconds. An empty path disables the index
+TOKEN_INDEX_PATH = env('TOKEN_INDEX_PATH', default='')
+TOKEN_INDEX_REFRESH_INTERVAL = env.float('TOKEN_INDEX_REFRESH_INTERVAL', default=1.0)
+TOKEN_INDEX_OVERLAP = env.float('TOKEN_INDEX_OVERLAP', default=30.0)
+
+# Token change feed at /api/tokens/changes/ for downstream caches. Readers
+# authenticate with `Authorization: Bearer <TOKEN_CHANGES_KEY>`; an empty key
+# disables reading. Entries older than TOKEN_CHANGES_RETENTION_DAYS are removed
+# by `manage.py compact_token_changes`
+TOKEN_CHANGES_ENABLED = env.bool('TOKEN_CHANGES_ENABLED', default=True)
+TOKEN_CHANGES_KEY = env('TOKEN_CHANGES_KEY', default='')
+TOKEN_CHANGES_PAGE_SIZE = env.int('TOKEN_CHANGES_PAGE_SIZE', default=1000)
+TOKEN_CHANGES_GAP_TIMEOUT = env.float('TOKEN_CHANGES_GAP_TIMEOUT', default=5.0)
+TOKEN_CHANGES_RETENTION_DAYS = env.int('TOKEN_CHANGES_RETENTION_DAYS', default=7)
+TOKEN_CHANGES_STREAM_POLL_INTERVAL = env.float('TOKEN_CHANGES_STREAM_POLL_INTERVAL', default=1.0)
+TOKEN_CHANGES_STREAM_HEARTBEAT = env.float('TOKEN_CHANGES_STREAM_HEARTBEAT', default=15.0)
+TOKEN_CHANGES_STREAM_MAX_AGE = env.float('TOKEN_CHANGES_STREAM_MAX_AGE', default=300.0)
+TOKEN_CHANGES_STREAM_RETRY = env.float('TOKEN_CHANGES_STREAM_RETRY', default=1.0)
+
+# Audit log of token validations and issuances. Events are queued in memory
+# and written by a background thread every AUDIT_FLUSH_INTERVAL seconds or
+# once AUDIT_BATCH_SIZE are waiting, to the database ('database') or appended
+# to AUDIT_FILE_PATH as NDJSON ('file'). With a full queue AUDIT_FULL_POLICY
+# 'drop' drops new events and 'block' waits up to AUDIT_BLOCK_TIMEOUT seconds per
+# request (never on the event loop of async endpoints)
+AUDIT_ENABLED = env.bool('AUDIT_ENABLED', default=False)
+AUDIT_SINK = env('AUDIT_SINK', default='database')
+AUDIT_FILE_PATH = env('AUDIT_FILE_PATH', default=str(BASE_DIR / 'audit.log'))
+AUDIT_QUEUE_SIZE = env.int('AUDIT_QUEUE_SIZE', default=10000)
+AUDIT_BATCH_SIZE = env.int('AUDIT_BATCH_SIZE', default=500)
+AUDIT_FLUSH_INTERVAL = env.float('AUDIT_FLUSH_INTERVAL', default=1.0)
+AUDIT_FULL_POLICY = env('AUDIT_FULL_POLICY', default='drop')
+AUDIT_BLOCK_TIMEOUT = env.float('AUDIT_BLOCK_TIMEOUT', default=0.1)
@@ -0,0 +1,56 @@
+import multiprocessing
+import runpy
+from pathlib import Path
+
+CONFIG = str(Path(__file__).resolve().parent.parent.parent / 'gunicorn.conf.py')
+SETTINGS = str(Path(__file__).resolve().parent.parent / 'settings.py')
+
+
+class TestGunicornConfig:
+
+    def test_defaults_follow_worker_class(self, monkeypatch):
+        """Test worker, thread and app defaults depend on the worker class"""
+        monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: 4)
+
+        sync = runpy.run_path(CONFIG)
+        monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'gthread')
+        gthread = runpy.run_path(CONFIG)
+        monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+        uvicorn = runpy.run_path(CONFIG)
+
+        assert (sync['workers'], sync['threads'], sync['wsgi_app']) == (9, 1, 'core.wsgi:application')
+        assert (gthread['workers'], gthread['threads']) == (5, 4)
+        assert (uvicorn['workers'], uvicorn['wsgi_app']) == (4, 'core.asgi:application')
+
+    def test_uvicorn_worker_disables_persistent_connections(self, monkeypatch):
+        """Test DB_CONN_MAX_AGE defaults to 0 with the uvicorn worker unless set"""
+        monkeypatch.delenv('DB_CONN_MAX_AGE', raising=False)
+        monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+        sync = runpy.run_path(SETTINGS)
+        monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+        uvicorn = runpy.run_path(SETTINGS)
+        monkeypatch.setenv('DB_CONN_MAX_AGE', '30')
+        overridden = runpy.run_path(SETTINGS)
+
+        assert sync['DATABASES']['default']['CONN_MAX_AGE'] == 60
+        assert uvicorn['DATABASES']['default']['CONN_MAX_AGE'] == 0
+        assert overridden['DATABASES']['default']['CONN_MAX_AGE'] == 30
+
+    def test_environment_overrides(self, monkeypatch):
+        """Test explicit worker and thread counts win over the defaults"""
+        monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'gthread')
+        monkeypatch.setenv('GUNICORN_WORKERS', '2')
+        monkeypatch.setenv('GUNICORN_THREADS', '16')
+
+        config = runpy.run_path(CONFIG)
+
+        assert (config['workers'], config['threads']) == (2, 16)
+
+    def test_stale_metrics_are_cleared_on_start(self, monkeypatch, tmp_path):
+        """Test metrics from a previous run are removed when the arbiter starts"""
+        (tmp_path / '123.json').write_text('[]')
+        monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+
+        runpy.run_path(CONFIG)['on_starting'](server=None)
+
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,167 @@
+import gc
+import json
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client, override_settings
+
+from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
+from core.metrics import Counter, Histogram, Registry
+from tokens.tests.factories import TokenFactory
+
+
+def post(client, url, payload):
+    return client.post(url, json.dumps(payload), content_type='application/json')
+
+
+class TestRegistry:
+
+    def setup_method(self):
+        self.registry = Registry()
+        self.counter = Counter(self.registry, 'things_total', 'Things', labels=('kind',))
+        self.histogram = Histogram(self.registry, 'thing_seconds', 'Thing time', buckets=(0.1, 1.0))
+
+    def test_counts_from_every_thread_are_summed(self):
+        """Test each thread records into its own shard and snapshots add them up"""
+        def work():
+            for _ in range(1000):
+                self.counter.inc('a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.counter.inc('b', amount=2)
+
+        assert self.registry.snapshot() == {
+            ('things_total', ('a',)): 4000,
+            ('things_total', ('b',)): 2,
+        }
+
+    def test_exited_threads_are_folded_into_the_base_shard(self):
+        """Test shards of finished threads are dropped without losing their values"""
+        def work():
+            self.counter.inc('a')
+            self.histogram.observe(0.5)
+
+        for _ in range(50):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+        gc.collect()
+
+        assert len(self.registry._shards) == 1
+        snapshot = self.registry.snapshot()
+        assert snapshot[('things_total', ('a',))] == 50
+        assert snapshot[('thing_seconds', ())] == [0, 50, 0, 25.0, 50]
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histograms render cumulative buckets, sum and count"""
+        for value in (0.05, 0.1, 0.5, 3):
+            self.histogram.observe(value)
+
+        output = self.registry.render()
+
+        assert '# TYPE thing_seconds histogram' in output
+        assert 'thing_seconds_bucket{le="0.1"} 2' in output
+        assert 'thing_seconds_bucket{le="1.0"} 3' in output
+        assert 'thing_seconds_bucket{le="+Inf"} 4' in output
+        assert 'thing_seconds_sum 3.65' in output
+        assert 'thing_seconds_count 4' in output
+
+    def test_workers_are_aggregated_through_metrics_dir(self, tmp_path):
+        """Test snapshots written by other workers are added to this one's"""
+        other_worker = [
+            ['things_total', ['a'], 5],
+            ['thing_seconds', [], [1, 0, 0, 0.05, 1]],
+        ]
+        (tmp_path / '1.json').write_text(json.dumps(other_worker))
+        (tmp_path / '2.json').write_text('not json')
+        self.counter.inc('a', amount=2)
+        self.histogram.observe(0.5)
+
+        with override_settings(METRICS_DIR=str(tmp_path)):
+            self.registry.flush()
+            output = self.registry.render()
+
+        assert 'things_total{kind="a"} 7' in output
+        assert 'thing_seconds_bucket{le="0.1"} 1' in output
+        assert 'thing_seconds_count 2' in output
+        assert len(list(tmp_path.glob('*.json'))) == 3
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+
+    def setup_method(self):
+        self.client = Client()
+
+    def test_requests_and_outcomes_are_exposed(self):
+        """Test status codes, latency, queries and validation outcomes are reported"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid-token')
+        TokenFactory(company=InactiveCompanyFactory(), token='inactive-company-token')
+        other = CompanyFactory()
+        post(self.client, '/api/tokens/validate/', {'token': 'valid-token', 'company_name': company.name})
+        post(self.client, '/api/tokens/validate/', {'token': 'missing', 'company_name': company.name})
+        post(self.client, '/api/tokens/validate/', {'token': 'valid-token', 'company_name': other.name})
+
+        response = self.client.get('/metrics')
+
+        output = response.content.decode()
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert 'http_requests_total{view="token-validate",method="POST",status="200"} 1' in output
+        assert 'http_requests_total{view="token-validate",method="POST",status="400"} 2' in output
+        assert 'http_request_duration_seconds_count{view="token-validate"} 3' in output
+        assert 'http_request_db_queries_sum{view="token-validate"} 3' in output
+        assert 'http_request_db_duration_seconds_count{view="token-validate"} 3' in output
+        assert 'token_validations_total{outcome="valid"} 1' in output
+        assert 'token_validations_total{outcome="does_not_exist"} 1' in output
+        assert 'token_validations_total{outcome="wrong_company"} 1' in output
+
+    def test_async_requests_are_recorded(self):
+        """Test the async views are timed and their queries counted"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid-token')
+        post(self.client, '/api/tokens/validate/async/', {'token': 'valid-token', 'company_name': company.name})
+
+        output = self.client.get('/metrics').content.decode()
+
+        assert 'http_requests_total{view="token-validate-async",method="POST",status="200"} 1' in output
+        assert 'http_request_db_queries_sum{view="token-validate-async"} 1' in output
+
+    def test_asgi_requests_count_queries_of_the_sync_thread(self):
+        """Test queries the async ORM runs outside the event loop thread are counted under ASGI"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid-token')
+        payload = json.dumps({'token': 'valid-token', 'company_name': company.name})
+
+        async def validate():
+            await AsyncClient().post('/api/tokens/validate/async/', payload, content_type='application/json')
+
+        async_to_sync(validate)()
+        output = self.client.get('/metrics').content.decode()
+
+        assert 'http_request_db_queries_sum{view="token-validate-async"} 1' in output
+        assert 'http_request_db_duration_seconds_count{view="token-validate-async"} 1' in output
+
+    def test_unmatched_urls_share_a_label(self):
+        """Test 404s do not create one series per path"""
+        self.client.get('/does-not-exist/')
+
+        output = self.client.get('/metrics').content.decode()
+
+        assert 'http_requests_total{view="unmatched",method="GET",status="404"} 1' in output
+
+    def test_other_addresses_are_forbidden(self):
+        """Test only peers in METRICS_ALLOWED_IPS can scrape, whatever they forward"""
+        outside = Client(REMOTE_ADDR='203.0.113.7', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        internal = Client(REMOTE_ADDR='10.1.2.3')
+
+        assert outside.get('/metrics').status_code == 403
+        assert internal.get('/metrics').status_code == 403
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            assert internal.get('/metrics').status_code == 200
@@ -0,0 +1,157 @@
+import json
+import pstats
+import sys
+from io import StringIO
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+
+from companies.models import Company
+from companies.tests.factories import CompanyFactory
+from core.middleware import ProfilingMiddleware
+from core.profiling import profile_header
+from tokens.tests.factories import TokenFactory
+
+
+def profiling_active():
+    """Whether a profiler is still enabled, process-wide from 3.12 and in this thread before"""
+    if sys.version_info >= (3, 12):
+        return sys.monitoring.get_tool(sys.monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+
+    @pytest.fixture(autouse=True)
+    def profiling_dir(self, tmp_path):
+        self.dir = tmp_path
+        with override_settings(PROFILING_DIR=str(tmp_path)):
+            yield
+
+    def setup_method(self):
+        self.client = Client()
+        self.company = CompanyFactory()
+        TokenFactory(company=self.company, token='valid-token')
+
+    def validate(self, url='/api/tokens/validate/', **headers):
+        payload = {'token': 'valid-token', 'company_name': self.company.name}
+        return self.client.post(url, json.dumps(payload), content_type='application/json', headers=headers)
+
+    def dumps(self):
+        return [json.loads(path.read_text()) for path in sorted(self.dir.glob('*.json'))]
+
+    def test_signed_header_profiles_request(self):
+        """Test a signed header gets a request profiled with its SQL"""
+        self.validate(**{'X-Profile-Request': profile_header()})
+
+        (dump,) = self.dumps()
+        assert dump['view'] == 'token-validate'
+        assert dump['reason'] == 'header'
+        assert dump['status'] == 200
+        assert len(dump['queries']) == 1
+        assert 'tokens_token' in dump['queries'][0]['sql']
+        assert len(list(self.dir.glob('*.prof'))) == 1
+
+    def test_forged_header_ignored(self):
+        """Test a header with a bad signature is not honoured"""
+        self.validate(**{'X-Profile-Request': 'profile:forged'})
+
+        assert self.dumps() == []
+
+    def test_sampling_needs_profiling_enabled(self):
+        """Test the sample rate only applies when profiling is enabled"""
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            self.validate()
+        assert self.dumps() == []
+
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0):
+            self.validate()
+        assert [dump['reason'] for dump in self.dumps()] == ['sampled']
+
+    def test_only_slow_requests_are_kept(self):
+        """Test the slow threshold keeps only requests that exceed it"""
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_THRESHOLD=60.0):
+            self.validate()
+        assert self.dumps() == []
+
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_THRESHOLD=1e-9):
+            self.validate()
+        assert [dump['reason'] for dump in self.dumps()] == ['slow']
+
+    def test_async_requests_are_profiled(self):
+        """Test async views are profiled with their queries"""
+        self.validate('/api/tokens/validate/async/', **{'X-Profile-Request': profile_header()})
+
+        (dump,) = self.dumps()
+        assert dump['view'] == 'token-validate-async'
+        assert len(dump['queries']) == 1
+
+    def test_asgi_requests_profile_the_sync_thread(self):
+        """Test the ORM work the async view runs outside the event loop is in the profile under ASGI"""
+        payload = json.dumps({'token': 'valid-token', 'company_name': self.company.name})
+
+        async def validate():
+            await AsyncClient().post(
+                '/api/tokens/validate/async/', payload, content_type='application/json',
+                headers={'X-Profile-Request': profile_header()},
+            )
+
+        async_to_sync(validate)()
+
+        (dump,) = self.dumps()
+        assert len(dump['queries']) == 1
+        stats = pstats.Stats(str(next(self.dir.glob('*.prof'))))
+        assert any('django/db/models/sql/compiler.py' in path for path, _, _ in stats.stats)
+
+    def test_acall_leaves_no_profiler_active(self):
+        """Test ProfilingMiddleware.__acall__ with profiling on answers and disables every profiler it enabled"""
+        async def view(request):
+            await Company.objects.acount()
+            return HttpResponse('ok')
+
+        middleware = ProfilingMiddleware(view)
+
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0):
+            response = async_to_sync(middleware)(RequestFactory().get('/'))
+
+        assert response.status_code == 200
+        assert not profiling_active()
+        (dump,) = self.dumps()
+        assert dump['reason'] == 'sampled'
+        assert len(dump['queries']) == 1
+
+    def test_old_dumps_are_rotated(self):
+        """Test only the newest PROFILING_MAX_DUMPS dumps are kept"""
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_DUMPS=2):
+            for _ in range(3):
+                self.validate()
+
+        assert len(self.dumps()) == 2
+        assert len(list(self.dir.glob('*.prof'))) == 2
+
+    def test_summary_command(self):
+        """Test the summary reports categories, functions and queries"""
+        with override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, TOKEN_VALIDATION_CACHE_MAX_SIZE=0
+        ):
+            self.validate()
+            self.validate()
+        out = StringIO()
+
+        call_command('summarize_profiles', stdout=out)
+
+        output = out.getvalue()
+        assert '2 profiled requests (sampled: 2)' in output
+        assert 'ORM' in output
+        assert 'serializer validation' in output
+        assert 'Hottest functions by tottime' in output
+        assert '2x' in output and 'tokens_token' in output
+
+    def test_summary_without_dumps(self):
+        """Test the summary fails clearly when nothing was collected"""
+        with pytest.raises(CommandError):
+            call_command('summarize_profiles', stdout=StringIO())
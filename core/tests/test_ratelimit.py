@@ -0,0 +1,184 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncClient, Client
+
+from companies.tests.factories import CompanyFactory
+from core.metrics import registry
+from core.ratelimit import CacheLimiter, TokenBucketLimiter, parse_rate
+from tokens.tests.factories import TokenFactory
+
+
+def post(client, url, payload, **extra):
+    return client.post(url, json.dumps(payload), content_type='application/json', **extra)
+
+
+class TestLimiters:
+
+    def test_parse_rate(self):
+        """Test rates are parsed like DRF throttle rates"""
+        assert parse_rate('20/s') == (20, 1)
+        assert parse_rate('600/minute') == (600, 60)
+        assert parse_rate('') is None
+        for rate in ('20', '20/', 'x/s', '0/s', '-1/s', '20/w'):
+            with pytest.raises(ValueError):
+                parse_rate(rate)
+
+    def test_token_bucket_refills_over_time(self, settings, monkeypatch):
+        """Test a bucket allows a burst of one period and then refills at the rate"""
+        settings.RATELIMIT_MAX_KEYS = 10
+        now = [1000.0]
+        monkeypatch.setattr('core.ratelimit.time.monotonic', lambda: now[0])
+        limiter = TokenBucketLimiter()
+
+        assert [limiter.hit('a', 2, 1) for _ in range(2)] == [0, 0]
+        assert limiter.hit('a', 2, 1) == pytest.approx(0.5)
+        assert limiter.hit('b', 2, 1) == 0
+
+        now[0] += 0.5
+        assert limiter.hit('a', 2, 1) == 0
+        assert limiter.hit('a', 2, 1) > 0
+
+    def test_token_bucket_keys_are_bounded(self, settings):
+        """Test only the most recently seen keys are kept"""
+        settings.RATELIMIT_MAX_KEYS = 2
+        limiter = TokenBucketLimiter()
+        for key in ('a', 'b', 'c'):
+            limiter.hit(key, 1, 60)
+
+        assert limiter.stats()['keys'] == 2
+        assert limiter.hit('a', 1, 60) == 0
+        assert limiter.hit('c', 1, 60) > 0
+
+    def test_cache_sliding_window(self, settings, monkeypatch):
+        """Test the shared counter weighs the previous window by its remaining overlap"""
+        settings.RATELIMIT_CACHE_ALIAS = 'default'
+        cache.clear()
+        now = [6000.0]
+        monkeypatch.setattr('core.ratelimit.time.time', lambda: now[0])
+        limiter = CacheLimiter()
+
+        assert [limiter.hit('a', 4, 60) for _ in range(4)] == [0, 0, 0, 0]
+        assert limiter.hit('a', 4, 60) == pytest.approx(60)
+
+        # Halfway through the next window half of the previous count still applies
+        now[0] += 90
+        assert [limiter.hit('a', 4, 60) for _ in range(2)] == [0, 0]
+        assert limiter.hit('a', 4, 60) == pytest.approx(30)
+
+
+@pytest.mark.django_db
+class TestRateLimitMiddleware:
+
+    @pytest.fixture(autouse=True)
+    def limits(self, settings):
+        settings.RATELIMIT_ENABLED = True
+        settings.RATELIMIT_BACKEND = 'memory'
+        settings.RATELIMIT_IP_RATE = '3/m'
+        settings.RATELIMIT_COMPANY_RATE = '2/m'
+
+    def test_company_over_limit_is_rejected_without_queries(self, django_assert_num_queries):
+        """Test a company over its rate gets a 429 before the view touches the database"""
+        company = CompanyFactory(password='test123')
+        client = Client()
+        payload = {'company_name': company.name, 'password': 'test123'}
+        for _ in range(2):
+            assert post(client, '/api/tokens/', payload).status_code == 201
+
+        with django_assert_num_queries(0):
+            response = post(client, '/api/tokens/', payload)
+
+        assert response.status_code == 429
+        assert int(response['Retry-After']) == 30
+        assert registry.snapshot()[('ratelimit_rejections_total', ('company', 'token-generate'))] == 1
+
+    def test_listings_are_limited_by_the_company_query_parameter(self):
+        """Test GET requests count against the company they name in the query string"""
+        company = CompanyFactory(password='test123')
+        client = Client()
+        for index in range(2):
+            client.get('/api/tokens/', {'company': company.name}, REMOTE_ADDR=f'10.0.0.{index}')
+
+        response = client.get('/api/tokens/export/', {'company': company.name}, REMOTE_ADDR='10.0.0.9')
+
+        assert response.status_code == 429
+        assert registry.snapshot()[('ratelimit_rejections_total', ('company', 'token-export'))] == 1
+
+    def test_companies_are_limited_separately(self):
+        """Test one noisy company does not use up another company's rate"""
+        noisy, quiet = TokenFactory(), TokenFactory()
+        client = Client()
+        for index in range(2):
+            post(client, '/api/tokens/validate/', {'token': 'x', 'company_name': noisy.company.name},
+                 REMOTE_ADDR=f'10.0.0.{index}')
+
+        noisy_response = post(client, '/api/tokens/validate/', {'token': 'x', 'company_name': noisy.company.name},
+                              REMOTE_ADDR='10.0.0.9')
+        quiet_response = post(client, '/api/tokens/validate/', {'token': 'x', 'company_name': quiet.company.name},
+                              REMOTE_ADDR='10.0.0.9')
+
+        assert noisy_response.status_code == 429
+        assert quiet_response.status_code == 400
+
+    def test_client_ip_over_limit_is_rejected(self):
+        """Test one client cannot get around the company rate by naming other companies"""
+        client = Client()
+        statuses = [
+            post(client, '/api/companies/register/', {'company_name': f'company-{index}'}).status_code
+            for index in range(4)
+        ]
+
+        assert statuses == [201, 201, 201, 429]
+        assert registry.snapshot()[('ratelimit_rejections_total', ('ip', 'company-register'))] == 1
+
+    def test_batch_items_count_against_their_companies(self):
+        """Test every company named in a batch is charged"""
+        token = TokenFactory()
+        client = Client()
+        batch = {'tokens': [{'token': 'x', 'company_name': token.company.name}]}
+        post(client, '/api/tokens/validate/batch/', batch)
+        post(client, '/api/tokens/validate/batch/', batch)
+
+        response = post(client, '/api/tokens/validate/', {'token': 'x', 'company_name': token.company.name})
+
+        assert response.status_code == 429
+
+    def test_other_views_are_not_limited(self):
+        """Test only the token and company endpoints are limited"""
+        client = Client()
+
+        assert all(client.get('/metrics').status_code == 200 for _ in range(5))
+
+    def test_async_views_are_limited(self):
+        """Test async endpoints are limited under the async request handler"""
+        client = AsyncClient()
+        payload = json.dumps({'token': 'x', 'company_name': 'acme'})
+
+        async def statuses():
+            return [
+                (await client.post('/api/tokens/validate/async/', payload, content_type='application/json')).status_code
+                for _ in range(3)
+            ]
+
+        assert async_to_sync(statuses)() == [400, 400, 429]
+
+    def test_disabled(self, settings):
+        """Test RATELIMIT_ENABLED=False removes the middleware"""
+        settings.RATELIMIT_ENABLED = False
+        client = Client()
+        statuses = {
+            post(client, '/api/companies/register/', {'company_name': f'company-{index}'}).status_code
+            for index in range(4)
+        }
+
+        assert statuses == {201}
+
+    def test_malformed_rate_is_rejected_at_startup(self, settings):
+        """Test a malformed rate fails when the middleware is loaded rather than on each request"""
+        settings.RATELIMIT_COMPANY_RATE = '20/week'
+
+        with pytest.raises(ImproperlyConfigured, match='RATELIMIT_COMPANY_RATE'):
+            Client().get('/api/companies/register/')
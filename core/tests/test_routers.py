@@ -0,0 +1,176 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from django.db import OperationalError
+
+from core.routers import (ReplicaRouter, ReplicaSet, read_from_replica,
+                          replica_reads, replicas)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Validates tokens that exist on only one of two SQLite files
+REPLICA_SCRIPT = """
+import json
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+for alias in connections:
+    call_command('migrate', database=alias, verbosity=0)
+
+from companies.models import Company
+from tokens.models import Token
+
+def add_token(alias, company, raw_token):
+    token = Token(company_id=company.pk)
+    token.set_token(raw_token)
+    token.save(using=alias)
+
+company, password = Company.build('acme')
+company.save()
+company.save(using='replica_0', force_insert=True)
+add_token('replica_0', company, 'replica-only')
+add_token('default', company, 'primary-only')
+
+client = Client()
+def validate(raw_token):
+    return client.post(
+        '/api/tokens/validate/', {'token': raw_token, 'company_name': 'acme'}, content_type='application/json'
+    ).status_code
+
+generated = client.post(
+    '/api/tokens/', {'company_name': 'acme', 'password': password}, content_type='application/json'
+)
+print(json.dumps({
+    'replica_only': validate('replica-only'),
+    'primary_only': validate('primary-only'),
+    'generated': generated.status_code,
+    'primary_tokens': Token.objects.using('default').count(),
+    'replica_tokens': Token.objects.using('replica_0').count(),
+}))
+"""
+
+
+def run_with_replica(tmp_path, replica_url, **env):
+    env = {
+        **os.environ,
+        'DATABASE_URL': f'sqlite:///{tmp_path / "primary.sqlite3"}',
+        'DATABASE_REPLICA_URLS': replica_url,
+        'TOKEN_VALIDATION_CACHE_MAX_SIZE': '0',
+        **env,
+    }
+    env.setdefault('SECRET_KEY', 'test')
+    return subprocess.run(
+        [sys.executable, '-c', REPLICA_SCRIPT], cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+
+
+class TestReplicaSet:
+
+    @pytest.fixture(autouse=True)
+    def two_replicas(self, settings):
+        settings.DATABASE_REPLICAS = ['replica_0', 'replica_1']
+        settings.DATABASE_REPLICA_FAILURE_COOLDOWN = 30
+
+    def test_round_robin(self):
+        """Test replicas take turns"""
+        replica_set = ReplicaSet()
+
+        assert [replica_set.choose() for _ in range(4)] == ['replica_0', 'replica_1', 'replica_0', 'replica_1']
+
+    def test_failed_replica_is_skipped_until_cooldown_ends(self, monkeypatch):
+        """Test a failed replica gets no reads for the cooldown, and then the primary takes over"""
+        now = [1000.0]
+        monkeypatch.setattr('core.routers.time.monotonic', lambda: now[0])
+        replica_set = ReplicaSet()
+        replica_set.mark_failed('replica_0')
+
+        assert {replica_set.choose() for _ in range(3)} == {'replica_1'}
+        replica_set.mark_failed('replica_1')
+        assert replica_set.choose() is None
+
+        now[0] += 31
+        assert replica_set.choose() is not None
+
+    def test_least_recently_failed(self, settings, monkeypatch):
+        """Test the replica whose last failure is oldest is preferred"""
+        settings.DATABASE_REPLICA_SELECTION = 'least_recently_failed'
+        now = [1000.0]
+        monkeypatch.setattr('core.routers.time.monotonic', lambda: now[0])
+        replica_set = ReplicaSet()
+        replica_set.mark_failed('replica_1')
+        now[0] += 10
+        replica_set.mark_failed('replica_0')
+        now[0] += 40
+
+        assert [replica_set.choose() for _ in range(2)] == ['replica_1', 'replica_1']
+
+    def test_no_replicas(self, settings):
+        """Test every read uses the primary without replicas"""
+        settings.DATABASE_REPLICAS = []
+
+        assert ReplicaSet().choose() is None
+
+
+class TestReplicaRouter:
+
+    def test_only_reads_inside_replica_reads_are_routed(self):
+        """Test reads default to the primary and writes always go there"""
+        router = ReplicaRouter()
+
+        assert router.db_for_read(None) is None
+        with replica_reads('replica_0'):
+            assert router.db_for_read(None) == 'replica_0'
+            assert router.db_for_write(None) == 'default'
+        assert router.db_for_read(None) is None
+
+    def test_without_replicas_reads_use_the_primary(self):
+        """Test read_from_replica reports the primary when no replica is configured"""
+        assert read_from_replica(lambda: 'rows') == ('rows', None)
+
+    def test_failed_read_is_retried_on_the_primary(self, settings):
+        """Test a replica error marks the replica failed and the read runs again on the primary"""
+        settings.DATABASE_REPLICAS = ['replica_0']
+        router = ReplicaRouter()
+
+        def read():
+            if router.db_for_read(None) == 'replica_0':
+                raise OperationalError('replica is down')
+            return 'rows'
+
+        assert read_from_replica(read) == ('rows', None)
+        assert replicas.stats()['healthy'] == []
+
+
+class TestReplicaDatabases:
+
+    def test_validation_reads_from_the_replica(self, tmp_path):
+        """Test validation reads the replica, rechecks misses on the primary and writes stay on the primary"""
+        result = run_with_replica(tmp_path, f'sqlite:///{tmp_path / "replica.sqlite3"}')
+        assert result.returncode == 0, result.stderr
+
+        assert json.loads(result.stdout) == {
+            'replica_only': 200,
+            'primary_only': 200,
+            'generated': 201,
+            'primary_tokens': 2,
+            'replica_tokens': 1,
+        }
+
+    def test_misses_are_trusted_without_recheck(self, tmp_path):
+        """Test DATABASE_REPLICA_RECHECK_MISSING=False answers from the replica alone"""
+        result = run_with_replica(
+            tmp_path, f'sqlite:///{tmp_path / "replica.sqlite3"}', DATABASE_REPLICA_RECHECK_MISSING='false'
+        )
+        assert result.returncode == 0, result.stderr
+
+        output = json.loads(result.stdout)
+        assert output['replica_only'] == 200
+        assert output['primary_only'] == 400
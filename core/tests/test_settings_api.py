@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+REQUEST_SCRIPT = """
+import json
+import django
+django.setup()
+from django.conf import settings
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+response = Client().post('/api/tokens/validate/', {}, content_type='application/json')
+admin = Client().get('/admin/')
+print(json.dumps({
+    'status_code': response.status_code,
+    'body': json.loads(response.content),
+    'admin_status_code': admin.status_code,
+    'sessions_installed': 'django.contrib.sessions' in settings.INSTALLED_APPS,
+    'ratelimit_installed': 'core.middleware.RateLimitMiddleware' in settings.MIDDLEWARE,
+}))
+"""
+
+
+def run_with_api_profile(*args):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'core.settings_api'}
+    env.setdefault('SECRET_KEY', 'test')
+    return subprocess.run(
+        [sys.executable, *args], cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+
+
+class TestApiSettingsProfile:
+
+    def test_system_checks_pass(self):
+        """Test the trimmed profile passes Django's system checks"""
+        result = run_with_api_profile('manage.py', 'check')
+        assert result.returncode == 0, result.stderr
+
+    def test_api_served_without_admin(self):
+        """Test API endpoints answer while the admin and sessions are gone"""
+        result = run_with_api_profile('-c', REQUEST_SCRIPT)
+        assert result.returncode == 0, result.stderr
+
+        output = json.loads(result.stdout)
+        assert output['status_code'] == 400
+        assert output['body'] == {'valid': False, 'message': 'Token is invalid or inactive'}
+        assert output['admin_status_code'] == 404
+        assert output['sessions_installed'] is False
+        assert output['ratelimit_installed'] is True
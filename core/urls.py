@@ -1,9 +1,10 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path
+
+from core.urls_api import urlpatterns as api_urlpatterns
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/companies/", include("companies.urls")),
-    path('api/tokens/', include('tokens.urls')),
+    *api_urlpatterns,
 ]
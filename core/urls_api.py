@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.urls import path, include
+
+from core.views import metrics
+
+
+urlpatterns = [
+    path("api/companies/", include("companies.urls")),
+    path('api/tokens/', include('tokens.urls')),
+]
+
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics, name='metrics'))
@@ -0,0 +1,23 @@
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.metrics import registry
+
+
+def is_internal(address):
+    """Return whether an address falls in METRICS_ALLOWED_IPS"""
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics(request):
+    """Expose the metrics of every worker in the Prometheus text format"""
+    # The socket peer, not a forwarded header a client could set
+    if not is_internal(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
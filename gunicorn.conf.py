@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration read from the environment.
+
+    gunicorn -c gunicorn.conf.py
+
+GUNICORN_WORKER_CLASS picks the worker model and the defaults follow it:
+
+- sync (default): one request per worker, 2 * CPUs + 1 workers
+- gthread: GUNICORN_THREADS requests per worker, CPUs + 1 workers, 4 threads
+- uvicorn.workers.UvicornWorker: serves core.asgi, one worker per CPU
+
+Every worker holds its own database connections: one per thread with
+persistent connections, or up to DB_POOL_MAX_SIZE with the pool. Keep
+workers * connections below the database's max_connections. The settings
+read GUNICORN_WORKER_CLASS too: with the uvicorn worker, DB_CONN_MAX_AGE
+defaults to 0 instead of 60.
+"""
+import multiprocessing
+import os
+from pathlib import Path
+
+cpus = multiprocessing.cpu_count()
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+asgi = 'uvicorn' in worker_class.lower()
+
+if asgi:
+    default_workers, default_threads = cpus, 1
+elif worker_class == 'gthread':
+    default_workers, default_threads = cpus + 1, 4
+else:
+    default_workers, default_threads = 2 * cpus + 1, 1
+
+wsgi_app = os.environ.get('GUNICORN_APP', 'core.asgi:application' if asgi else 'core.wsgi:application')
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', default_threads))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    """Drop metrics left behind by the workers of a previous run"""
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+        for path in Path(metrics_dir).glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def post_worker_init(worker):
+    """Build the token Bloom filter and map the token index as soon as a worker starts instead of on its first request"""
+    from tokens.bloom import token_filter
+    from tokens.index import token_index
+
+    if token_filter.enabled:
+        token_filter.start()
+    if token_index.enabled:
+        token_index.start()
+
+
+def worker_exit(server, worker):
+    """Write the token uses and audit events a worker still holds before it goes away"""
+    from audit.log import audit_log
+    from tokens.usage import usage_tracker
+
+    usage_tracker.flush()
+    audit_log.flush()
@@ -0,0 +1,7 @@
+"""
+Python client for the token service, using only the standard library.
+"""
+from token_client.cache import ValidationCache
+from token_client.client import AsyncTokenClient, TokenClient, TokenServiceError
+
+__all__ = ['AsyncTokenClient', 'TokenClient', 'TokenServiceError', 'ValidationCache']
@@ -0,0 +1,117 @@
+"""
+Micro-batching of concurrent validations.
+
+Validations that arrive within `window` seconds of the first one in a batch,
+up to max_size of them, are sent together as one call to the batch endpoint.
+A caller on its own pays at most the window in added latency; callers under
+load share one round trip and one database query on the server.
+"""
+import asyncio
+import threading
+
+
+class _Batch:
+
+    def __init__(self):
+        self.pairs = []
+        self.results = None
+        self.error = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class ValidationBatcher:
+    """
+    Thread-based batcher: the first thread to arrive waits for the window,
+    then sends the batch for everyone while the others wait for its results.
+    """
+
+    def __init__(self, send, window, max_size):
+        self.send = send
+        self.window = window
+        self.max_size = max_size
+        self._open = None
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def validate(self, pair):
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.pairs)
+            batch.pairs.append(pair)
+            if len(batch.pairs) >= self.max_size:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self.batches += 1
+            try:
+                batch.results = self.send(batch.pairs)
+            except Exception as exc:
+                batch.error = exc
+            batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+
+class _AsyncBatch:
+
+    def __init__(self, future):
+        self.pairs = []
+        self.future = future
+        self.handle = None
+
+
+class AsyncValidationBatcher:
+    """asyncio batcher: a timer closes each batch and a task sends it"""
+
+    def __init__(self, send, window, max_size):
+        self.send = send
+        self.window = window
+        self.max_size = max_size
+        self._open = None
+        self._tasks = set()
+        self.batches = 0
+
+    async def validate(self, pair):
+        batch = self._open
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = self._open = _AsyncBatch(loop.create_future())
+            batch.handle = loop.call_later(self.window, self._close, batch)
+        index = len(batch.pairs)
+        batch.pairs.append(pair)
+        if len(batch.pairs) >= self.max_size:
+            self._close(batch)
+        # Shielded so that one cancelled caller does not fail the whole batch
+        results = await asyncio.shield(batch.future)
+        return results[index]
+
+    def _close(self, batch):
+        if self._open is not batch:
+            return
+        self._open = None
+        batch.handle.cancel()
+        self.batches += 1
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            results = await self.send(batch.pairs)
+        except Exception as exc:
+            batch.future.set_exception(exc)
+        else:
+            batch.future.set_result(results)
@@ -0,0 +1,64 @@
+"""
+Client-side cache of positive validation results.
+
+Only successful validations are cached, each for at most the configured TTL.
+A token revoked on the server keeps validating from the cache until its entry
+expires, so pick a TTL no longer than the staleness callers can accept.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ValidationCache:
+    """Thread-safe LRU of (token, company_name) pairs known to be valid"""
+
+    def __init__(self, ttl, max_size=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, token, company_name):
+        """True when the pair validated less than ttl seconds ago, None otherwise"""
+        if not self.enabled:
+            return None
+        key = (token, company_name)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if expires is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, token, company_name):
+        if not self.enabled:
+            return
+        key = (token, company_name)
+        with self._lock:
+            self._entries[key] = self._clock() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token, company_name):
+        with self._lock:
+            self._entries.pop((token, company_name), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
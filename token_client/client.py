@@ -0,0 +1,255 @@
+"""
+Sync and asyncio clients for the token service.
+
+    with TokenClient('http://tokens.internal:8000') as client:
+        company = client.register_company('acme')
+        token = client.generate_token('acme', company['password'])['token']
+        client.validate(token, 'acme')
+
+Both clients keep connections alive in a pool, merge concurrent validate()
+calls into one batch request and can cache positive results for cache_ttl
+seconds (off by default).
+"""
+from token_client.batching import AsyncValidationBatcher, ValidationBatcher
+from token_client.cache import ValidationCache
+from token_client.http import AsyncConnectionPool, ConnectionPool
+
+REGISTER_PATH = '/api/companies/register/'
+GENERATE_PATH = '/api/tokens/'
+VALIDATE_PATH = '/api/tokens/validate/'
+VALIDATE_BATCH_PATH = '/api/tokens/validate/batch/'
+
+# Mirrors the service's CharField(max_length=255)
+MAX_FIELD_LENGTH = 255
+
+
+class TokenServiceError(Exception):
+    """The service answered with an unexpected status; data holds its JSON body, if any"""
+
+    def __init__(self, status, data, retry_after=None):
+        super().__init__(f'Token service responded with {status}: {data}')
+        self.status = status
+        self.data = data
+        self.retry_after = retry_after
+
+
+def _error(response):
+    try:
+        data = response.json()
+    except ValueError:
+        data = response.body.decode('utf-8', 'replace')
+    retry_after = response.headers.get('retry-after')
+    return TokenServiceError(response.status, data, retry_after=None if retry_after is None else float(retry_after))
+
+
+def _is_well_formed(value):
+    return isinstance(value, str) and bool(value.strip()) and len(value.strip()) <= MAX_FIELD_LENGTH
+
+
+def _single_result(response):
+    """True for 200, False for the 400 of an invalid token"""
+    if response.status in (200, 400):
+        return response.status == 200
+    raise _error(response)
+
+
+def _created(response):
+    if response.status != 201:
+        raise _error(response)
+    return response.json()
+
+
+def _registration_payload(company_name, token_ttl):
+    payload = {'company_name': company_name}
+    if token_ttl is not None:
+        payload['token_ttl'] = token_ttl
+    return payload
+
+
+class _BaseClient:
+    """Configuration and the validation bookkeeping shared by both clients"""
+    pool_class = None
+    batcher_class = None
+
+    def __init__(self, base_url, pool_size=10, timeout=5.0, batch_window=0.002, max_batch_size=100,
+                 cache_ttl=0.0, cache_max_size=10000, ssl_context=None):
+        self.base_url = base_url
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.pool = self.pool_class(base_url, max_size=pool_size, timeout=timeout, ssl_context=ssl_context)
+        self.batcher = self.batcher_class(self._send_batch, batch_window, max_batch_size)
+        self.cache = ValidationCache(cache_ttl, cache_max_size)
+        self.requests = 0
+
+    def _known(self, pairs):
+        """
+        Split pairs into {index: result} answered locally - from the cache or
+        because the service would reject them outright - and the rest.
+        """
+        known, pending = {}, {}
+        for index, (token, company_name) in enumerate(pairs):
+            if not (_is_well_formed(token) and _is_well_formed(company_name)):
+                known[index] = False
+            elif self.cache.get(token, company_name):
+                known[index] = True
+            else:
+                pending[index] = (token, company_name)
+        return known, pending
+
+    def _remember(self, pairs, results):
+        for (token, company_name), valid in zip(pairs, results):
+            if valid:
+                self.cache.set(token, company_name)
+
+    def _chunks(self, pairs):
+        for start in range(0, len(pairs), self.max_batch_size):
+            yield pairs[start:start + self.max_batch_size]
+
+    @staticmethod
+    def _merge(size, known, pending, results):
+        merged = [None] * size
+        for index, valid in known.items():
+            merged[index] = valid
+        for index, valid in zip(pending, results):
+            merged[index] = valid
+        return merged
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'connections': self.pool.created,
+            'batches': self.batcher.batches,
+            'cache': self.cache.stats(),
+        }
+
+
+class TokenClient(_BaseClient):
+    """Thread-safe client; share one instance across the threads of a process"""
+    pool_class = ConnectionPool
+    batcher_class = ValidationBatcher
+
+    def _post(self, path, payload, retry=False):
+        self.requests += 1
+        return self.pool.request('POST', path, payload, retry=retry)
+
+    def register_company(self, company_name, token_ttl=None):
+        """Register a company and return the response data, including its one-time password"""
+        return _created(self._post(REGISTER_PATH, _registration_payload(company_name, token_ttl)))
+
+    def generate_token(self, company_name, password, token_format='opaque'):
+        """Issue a token and return the response data, including the raw token"""
+        payload = {'company_name': company_name, 'password': password, 'format': token_format}
+        return _created(self._post(GENERATE_PATH, payload))
+
+    def _validate_one(self, pair):
+        token, company_name = pair
+        return _single_result(self._post(VALIDATE_PATH, {'token': token, 'company_name': company_name}, retry=True))
+
+    def _send_batch(self, pairs):
+        """Validate pairs with one request; a rejected batch is retried one pair at a time"""
+        if len(pairs) == 1:
+            return [self._validate_one(pairs[0])]
+        payload = {'tokens': [{'token': token, 'company_name': company_name} for token, company_name in pairs]}
+        response = self._post(VALIDATE_BATCH_PATH, payload, retry=True)
+        if response.status == 200:
+            return [result['valid'] for result in response.json()['results']]
+        if response.status == 400:
+            return [self._validate_one(pair) for pair in pairs]
+        raise _error(response)
+
+    def validate(self, token, company_name):
+        """Whether the token is valid for the company; concurrent calls share one request"""
+        known, pending = self._known([(token, company_name)])
+        if known:
+            return known[0]
+        if self.batch_window > 0:
+            valid = self.batcher.validate((token, company_name))
+        else:
+            valid = self._validate_one((token, company_name))
+        self._remember([(token, company_name)], [valid])
+        return valid
+
+    def validate_many(self, pairs):
+        """Validate (token, company_name) pairs with one request per max_batch_size of them"""
+        pairs = list(pairs)
+        known, pending = self._known(pairs)
+        remaining = list(pending.values())
+        results = [valid for chunk in self._chunks(remaining) for valid in self._send_batch(chunk)]
+        self._remember(remaining, results)
+        return self._merge(len(pairs), known, pending, results)
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncTokenClient(_BaseClient):
+    """asyncio client; use one instance per event loop"""
+    pool_class = AsyncConnectionPool
+    batcher_class = AsyncValidationBatcher
+
+    async def _post(self, path, payload, retry=False):
+        self.requests += 1
+        return await self.pool.request('POST', path, payload, retry=retry)
+
+    async def register_company(self, company_name, token_ttl=None):
+        """Async version of TokenClient.register_company()"""
+        return _created(await self._post(REGISTER_PATH, _registration_payload(company_name, token_ttl)))
+
+    async def generate_token(self, company_name, password, token_format='opaque'):
+        """Async version of TokenClient.generate_token()"""
+        payload = {'company_name': company_name, 'password': password, 'format': token_format}
+        return _created(await self._post(GENERATE_PATH, payload))
+
+    async def _validate_one(self, pair):
+        token, company_name = pair
+        payload = {'token': token, 'company_name': company_name}
+        return _single_result(await self._post(VALIDATE_PATH, payload, retry=True))
+
+    async def _send_batch(self, pairs):
+        if len(pairs) == 1:
+            return [await self._validate_one(pairs[0])]
+        payload = {'tokens': [{'token': token, 'company_name': company_name} for token, company_name in pairs]}
+        response = await self._post(VALIDATE_BATCH_PATH, payload, retry=True)
+        if response.status == 200:
+            return [result['valid'] for result in response.json()['results']]
+        if response.status == 400:
+            return [await self._validate_one(pair) for pair in pairs]
+        raise _error(response)
+
+    async def validate(self, token, company_name):
+        """Async version of TokenClient.validate()"""
+        known, pending = self._known([(token, company_name)])
+        if known:
+            return known[0]
+        if self.batch_window > 0:
+            valid = await self.batcher.validate((token, company_name))
+        else:
+            valid = await self._validate_one((token, company_name))
+        self._remember([(token, company_name)], [valid])
+        return valid
+
+    async def validate_many(self, pairs):
+        """Async version of TokenClient.validate_many()"""
+        pairs = list(pairs)
+        known, pending = self._known(pairs)
+        remaining = list(pending.values())
+        results = []
+        for chunk in self._chunks(remaining):
+            results += await self._send_batch(chunk)
+        self._remember(remaining, results)
+        return self._merge(len(pairs), known, pending, results)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,241 @@
+"""
+Keep-alive HTTP/1.1 connection pools built on the standard library.
+
+Each pool talks to one scheme://host:port and keeps idle connections for
+reuse, most recently used first, with at most max_size open at a time. A
+request that fails on a reused connection, which the server may have closed
+while it sat idle, is retried once on a new connection when it is safe to
+send twice.
+"""
+import asyncio
+import http.client
+import json
+import ssl
+import threading
+from urllib.parse import urlsplit
+
+USER_AGENT = 'token-client/0.1'
+
+# Errors raised when a kept-alive connection was closed by the server
+STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class Response:
+    """Status, lower-cased headers and body of a response read to the end"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+def split_url(base_url):
+    """Return (scheme, host, port, path prefix) for a base URL"""
+    parts = urlsplit(base_url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f'Expected an http:// or https:// URL, got {base_url!r}')
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return parts.scheme, parts.hostname, port, parts.path.rstrip('/')
+
+
+def encode_request(method, host, path, body):
+    """Serialize an HTTP/1.1 request with a JSON body"""
+    lines = [
+        f'{method} {path} HTTP/1.1',
+        f'Host: {host}',
+        f'User-Agent: {USER_AGENT}',
+        'Accept: application/json',
+        'Connection: keep-alive',
+    ]
+    if body is not None:
+        lines += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+
+class ConnectionPool:
+    """Thread-safe pool of http.client connections"""
+
+    def __init__(self, base_url, max_size=10, timeout=5.0, ssl_context=None):
+        self.scheme, self.host, self.port, self.prefix = split_url(base_url)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.created = 0
+
+    def _connect(self):
+        self.created += 1
+        if self.scheme == 'https':
+            context = self.ssl_context or ssl.create_default_context()
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def request(self, method, path, payload=None, retry=False):
+        """Send a JSON request and return the Response; retry allows a second attempt on a stale connection"""
+        body = None if payload is None else json.dumps(payload).encode()
+        headers = {'Accept': 'application/json', 'User-Agent': USER_AGENT}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        with self._slots:
+            while True:
+                connection, reused = self._acquire()
+                try:
+                    connection.request(method, self.prefix + path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except STALE_ERRORS:
+                    connection.close()
+                    if reused and retry:
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._release(connection)
+                response_headers = {name.lower(): value for name, value in response.getheaders()}
+                return Response(response.status, response_headers, data)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class AsyncConnection:
+    """One HTTP/1.1 connection over asyncio streams"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def is_closed(self):
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    async def _read_headers(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected('Remote end closed connection without response')
+        status = int(status_line.split(maxsplit=2)[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return status, headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Trailers end with an empty line
+                while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    async def send(self, request):
+        """Send a serialized request and return (Response, whether the connection can be reused)"""
+        self.writer.write(request)
+        await self.writer.drain()
+        status, headers = await self._read_headers()
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b''
+        else:
+            body = await self.reader.read()
+            keep_alive = False
+        return Response(status, headers, body), keep_alive
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool:
+    """Pool of AsyncConnections for use from a single event loop"""
+
+    def __init__(self, base_url, max_size=10, timeout=5.0, ssl_context=None):
+        self.scheme, self.host, self.port, self.prefix = split_url(base_url)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._slots = None
+        self.created = 0
+
+    async def _connect(self):
+        self.created += 1
+        context = None
+        if self.scheme == 'https':
+            context = self.ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        return AsyncConnection(reader, writer)
+
+    async def _acquire(self):
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.is_closed:
+                return connection, True
+            connection.close()
+        return await self._connect(), False
+
+    async def request(self, method, path, payload=None, retry=False):
+        """Async version of ConnectionPool.request()"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        body = None if payload is None else json.dumps(payload).encode()
+        host = self.host if self.port in (80, 443) else f'{self.host}:{self.port}'
+        request = encode_request(method, host, self.prefix + path, body)
+        async with self._slots:
+            while True:
+                connection, reused = await asyncio.wait_for(self._acquire(), self.timeout)
+                try:
+                    response, keep_alive = await asyncio.wait_for(connection.send(request), self.timeout)
+                except (*STALE_ERRORS, asyncio.IncompleteReadError):
+                    connection.close()
+                    if reused and retry:
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    connection.close()
+                return response
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+            try:
+                await connection.writer.wait_closed()
+            except OSError:
+                pass
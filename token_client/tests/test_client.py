@@ -0,0 +1,165 @@
+import asyncio
+import threading
+
+import pytest
+
+from companies.tests.factories import CompanyFactory
+from token_client import AsyncTokenClient, TokenClient, TokenServiceError
+from token_client.cache import ValidationCache
+from tokens.tests.factories import TokenFactory
+
+
+class TestValidationCache:
+
+    def test_entries_expire(self):
+        """Test cached pairs are only valid for the TTL"""
+        now = [0.0]
+        cache = ValidationCache(ttl=10, clock=lambda: now[0])
+        cache.set('token', 'acme')
+
+        assert cache.get('token', 'acme') is True
+        now[0] = 11
+        assert cache.get('token', 'acme') is None
+        assert cache.stats() == {'size': 0, 'hits': 1, 'misses': 1}
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """Test the cache never holds more than max_size pairs"""
+        cache = ValidationCache(ttl=10, max_size=2)
+        cache.set('a', 'acme')
+        cache.set('b', 'acme')
+        cache.get('a', 'acme')
+        cache.set('c', 'acme')
+
+        assert cache.get('b', 'acme') is None
+        assert cache.get('a', 'acme') is True
+
+    def test_disabled_by_default_ttl(self):
+        """Test a zero TTL caches nothing"""
+        cache = ValidationCache(ttl=0)
+        cache.set('token', 'acme')
+
+        assert cache.get('token', 'acme') is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTokenClient:
+
+    @pytest.fixture(autouse=True)
+    def client(self, live_server):
+        self.client = TokenClient(live_server.url, batch_window=0)
+        yield
+        self.client.close()
+
+    def test_register_generate_and_validate(self):
+        """Test the full workflow over one kept-alive connection"""
+        company = self.client.register_company('acme', token_ttl=3600)
+        token = self.client.generate_token('acme', company['password'])
+
+        assert company['company_name'] == 'acme'
+        assert token['company_name'] == 'acme'
+        assert self.client.validate(token['token'], 'acme') is True
+        assert self.client.validate(token['token'], 'globex') is False
+        assert self.client.validate('unknown', 'acme') is False
+        assert self.client.stats()['connections'] == 1
+
+    def test_errors_raise(self):
+        """Test unexpected statuses raise TokenServiceError with the response body"""
+        self.client.register_company('acme')
+
+        with pytest.raises(TokenServiceError) as error:
+            self.client.register_company('acme')
+
+        assert error.value.status == 400
+        assert 'company_name' in error.value.data
+
+    def test_malformed_pairs_are_rejected_locally(self):
+        """Test pairs the service would reject never leave the process"""
+        assert self.client.validate('', 'acme') is False
+        assert self.client.validate('token', 'x' * 256) is False
+        assert self.client.stats()['requests'] == 0
+
+    def test_validate_many_uses_one_request_per_batch(self):
+        """Test many pairs are validated with one batch request, falling back per pair on a rejected batch"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid')
+        pairs = [('valid', company.name), ('unknown', company.name), ('', company.name)]
+
+        assert self.client.validate_many(pairs) == [True, False, False]
+        assert self.client.stats()['requests'] == 1
+
+        # A NUL byte passes the local checks but fails the whole batch on the service
+        assert self.client.validate_many([('valid', company.name), ('bad\x00', company.name)]) == [True, False]
+        assert self.client.stats()['requests'] == 4
+
+    def test_positive_results_are_cached(self, live_server):
+        """Test valid pairs are answered from the cache and invalid ones are asked again"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid')
+        client = TokenClient(live_server.url, batch_window=0, cache_ttl=60)
+
+        for _ in range(3):
+            assert client.validate('valid', company.name) is True
+            assert client.validate('unknown', company.name) is False
+
+        assert client.stats()['requests'] == 4
+        assert client.stats()['cache']['hits'] == 2
+        client.close()
+
+    def test_concurrent_validations_are_batched(self, live_server):
+        """Test validations from many threads share batch requests"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='valid')
+        client = TokenClient(live_server.url, batch_window=0.2)
+        results = [None] * 10
+        barrier = threading.Barrier(10)
+
+        def validate(index):
+            barrier.wait()
+            results[index] = client.validate('valid' if index % 2 else 'unknown', company.name)
+
+        threads = [threading.Thread(target=validate, args=(index,)) for index in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [False, True] * 5
+        assert client.stats()['requests'] < 10
+        client.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncTokenClient:
+
+    def test_workflow_and_batching(self, live_server):
+        """Test the asyncio client and that concurrent validations share one request"""
+
+        async def scenario():
+            async with AsyncTokenClient(live_server.url, batch_window=0.05) as client:
+                company = await client.register_company('acme')
+                token = (await client.generate_token('acme', company['password']))['token']
+                requests = client.requests
+                results = await asyncio.gather(*(
+                    client.validate(token if index % 2 else 'unknown', 'acme') for index in range(10)
+                ))
+                many = await client.validate_many([(token, 'acme'), ('unknown', 'acme')])
+                return results, client.requests - requests, many, client.stats()
+
+        results, requests, many, stats = asyncio.run(scenario())
+
+        assert results == [False, True] * 5
+        assert requests == 2
+        assert many == [True, False]
+        assert stats['connections'] == 1
+
+    def test_errors_raise(self, live_server):
+        """Test unexpected statuses raise TokenServiceError"""
+
+        async def scenario():
+            async with AsyncTokenClient(live_server.url) as client:
+                await client.generate_token('nobody', 'wrong')
+
+        with pytest.raises(TokenServiceError) as error:
+            asyncio.run(scenario())
+
+        assert error.value.status == 400
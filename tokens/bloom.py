@@ -0,0 +1,274 @@
+import logging
+import math
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.metrics import Counter, registry
+from tokens.models import Token
+
+logger = logging.getLogger(__name__)
+
+bloom_checks = Counter(
+    registry, 'token_bloom_checks_total', 'Token hashes checked against the Bloom filter',
+    labels=('result',),
+)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over token hashes.
+
+    Token hashes are SHA-256 digests, so the bit positions are derived from the
+    digest itself with double hashing instead of hashing it again.
+    """
+
+    def __init__(self, capacity, false_positive_rate, max_bytes):
+        bits = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.bits = max(8, min(bits, max_bytes * 8))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.items = 0
+        self._array = bytearray((self.bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, token_hash):
+        first = int.from_bytes(token_hash[:8], 'little')
+        second = int.from_bytes(token_hash[8:16], 'little') | 1
+        return [(first + index * second) % self.bits for index in range(self.hashes)]
+
+    def add(self, token_hash, new=True):
+        """Set the bits of a hash; new=False for hashes that may already be counted"""
+        positions = self._positions(token_hash)
+        with self._lock:
+            for position in positions:
+                self._array[position >> 3] |= 1 << (position & 7)
+            if new:
+                self.items += 1
+
+    def __contains__(self, token_hash):
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(token_hash))
+
+    def fill_ratio(self):
+        return int.from_bytes(self._array, 'little').bit_count() / self.bits
+
+
+class TokenFilter:
+    """
+    Per-process Bloom filter over every known token hash, used to answer
+    "Token does not exist" without the validation lookup.
+
+    A background thread builds the filter, adds tokens inserted by any process
+    every sync interval and rebuilds it from scratch every rebuild interval,
+    which also drops deleted tokens and resizes the filter. Tokens saved by
+    this process are added immediately. Until the first build finishes every
+    hash is reported as possibly present, so validation falls back to the
+    database.
+
+    Each sync re-reads the rows inserted over the last TOKEN_BLOOM_SYNC_OVERLAP
+    seconds, which also picks up rows from transactions that committed after
+    rows with higher ids. Tokens issued by another worker since then are not
+    in the filter yet, so a miss is only final once recent_hashes() has
+    checked those rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self.reset()
+
+    def reset(self):
+        """Forget the filter; hashes are reported as possibly present until the next build"""
+        with self._lock:
+            self._filter = None
+            self._pending = None
+            self._checkpoints = []
+            self._resize = False
+            self.built_at = None
+            self.synced_at = None
+            self.rejected = 0
+            self.passed = 0
+
+    @property
+    def enabled(self):
+        return settings.TOKEN_BLOOM_ENABLED
+
+    def start(self):
+        """Start the background thread of this process, once"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name='token-bloom-filter', daemon=True).start()
+
+    def _run(self):
+        while self.enabled:
+            try:
+                if (
+                    self.built_at is None
+                    or self._resize
+                    or time.monotonic() - self.built_at >= settings.TOKEN_BLOOM_REBUILD_INTERVAL
+                ):
+                    self.rebuild()
+                else:
+                    self.sync()
+            except Exception:
+                logger.exception('Token Bloom filter update failed')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+            time.sleep(settings.TOKEN_BLOOM_SYNC_INTERVAL)
+        with self._lock:
+            self._started_pid = None
+
+    def might_contain(self, token_hash):
+        """False only when the token hash is certainly not in the database"""
+        if not self.enabled:
+            return True
+        current = self._filter
+        if current is None:
+            self.start()
+            return True
+        if token_hash in current:
+            self.passed += 1
+            bloom_checks.inc('passed')
+            return True
+        self.rejected += 1
+        bloom_checks.inc('rejected')
+        return False
+
+    def _recent_rows(self, token_hashes):
+        # Read from the primary, where a token issued elsewhere is visible at once
+        return Token.objects.filter(pk__gt=self._sync_start(), token_hash__in=token_hashes).values_list(
+            'token_hash', flat=True,
+        ).order_by()
+
+    def recent_hashes(self, token_hashes):
+        """
+        Return those of the hashes the filter missed that belong to tokens
+        inserted since its overlap window started, which it may not hold yet.
+        The query only covers the rows the next sync would read.
+        """
+        return {bytes(token_hash) for token_hash in self._recent_rows(token_hashes)}
+
+    async def arecent_hashes(self, token_hashes):
+        """Async version of recent_hashes()"""
+        return {bytes(token_hash) async for token_hash in self._recent_rows(token_hashes)}
+
+    def add(self, token_hash):
+        """Record a token saved by this process"""
+        with self._lock:
+            current = self._filter
+            if self._pending is not None:
+                self._pending.append(token_hash)
+        if current is not None:
+            current.add(token_hash)
+
+    def _checkpoint(self, high_water):
+        """Remember the highest id seen now, dropping checkpoints older than the overlap window"""
+        now = time.monotonic()
+        self._checkpoints.append((now, high_water))
+        cutoff = now - settings.TOKEN_BLOOM_SYNC_OVERLAP
+        while len(self._checkpoints) > 1 and self._checkpoints[1][0] <= cutoff:
+            self._checkpoints.pop(0)
+
+    def _sync_start(self):
+        return self._checkpoints[0][1] if self._checkpoints else 0
+
+    def _settled_high_water(self):
+        """Highest id inserted before the overlap window, below which no commit is expected"""
+        cutoff = timezone.now() - timedelta(seconds=settings.TOKEN_BLOOM_SYNC_OVERLAP)
+        return Token.objects.filter(created_at__lt=cutoff).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def rebuild(self):
+        """Build a new, correctly sized filter from every token and swap it in"""
+        with self._lock:
+            self._pending = []
+        try:
+            settled = self._settled_high_water()
+            count = Token.objects.count()
+            rebuilt = BloomFilter(
+                capacity=max(1024, math.ceil(count * settings.TOKEN_BLOOM_HEADROOM)),
+                false_positive_rate=settings.TOKEN_BLOOM_FALSE_POSITIVE_RATE,
+                max_bytes=settings.TOKEN_BLOOM_MAX_MEMORY,
+            )
+            high_water = 0
+            rows = Token.objects.values_list('pk', 'token_hash').order_by()
+            for pk, token_hash in rows.iterator(chunk_size=10000):
+                rebuilt.add(bytes(token_hash))
+                high_water = max(high_water, pk)
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+
+        with self._lock:
+            for token_hash in pending:
+                rebuilt.add(token_hash)
+            self._filter = rebuilt
+            self._resize = False
+            # Rows that commit late are found by the next sync: keep older
+            # checkpoints, or start from the rows that settled before the window
+            if not self._checkpoints:
+                self._checkpoints.append((time.monotonic() - settings.TOKEN_BLOOM_SYNC_OVERLAP, settled))
+            self._checkpoint(high_water)
+            self.built_at = self.synced_at = time.monotonic()
+
+    def sync(self):
+        """Add tokens inserted since the overlap window started"""
+        current = self._filter
+        if current is None:
+            return self.rebuild()
+
+        latest = self._checkpoints[-1][1] if self._checkpoints else 0
+        high_water = latest
+        rows = Token.objects.filter(pk__gt=self._sync_start()).values_list('pk', 'token_hash').order_by()
+        for pk, token_hash in rows.iterator(chunk_size=10000):
+            current.add(bytes(token_hash), new=pk > latest)
+            high_water = max(high_water, pk)
+        with self._lock:
+            self._checkpoint(high_water)
+            self.synced_at = time.monotonic()
+        if current.items > current.capacity:
+            # Past its capacity the false positive rate climbs; resize on the next run
+            self._resize = True
+
+    def stats(self):
+        """Return the counters used to size the filter"""
+        current = self._filter
+        now = time.monotonic()
+        stats = {
+            'enabled': self.enabled,
+            'built': current is not None,
+            'rejected': self.rejected,
+            'passed': self.passed,
+            'built_age': None if self.built_at is None else now - self.built_at,
+            'synced_age': None if self.synced_at is None else now - self.synced_at,
+        }
+        if current is not None:
+            fill_ratio = current.fill_ratio()
+            stats.update({
+                'items': current.items,
+                'capacity': current.capacity,
+                'bits': current.bits,
+                'hashes': current.hashes,
+                'memory_bytes': len(current._array),
+                'fill_ratio': fill_ratio,
+                'estimated_false_positive_rate': fill_ratio ** current.hashes,
+            })
+        return stats
+
+
+token_filter = TokenFilter()
+
+
+@receiver(setting_changed)
+def reset_token_filter(setting, **kwargs):
+    if setting.startswith('TOKEN_BLOOM_'):
+        token_filter.reset()
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class ValidationCache:
+    """
+    Per-process LRU cache of successful token validations.
+
+    Entries are keyed by token hash and only match when the requested company
+    name is the one stored with the entry, so a lookup behaves as if it were
+    keyed by (token_hash, company_name). Only positive results are cached;
+    every failure path still goes to the database. Invalidations only reach
+    the cache of the process that makes them; other workers keep an entry
+    until its TTL runs out.
+    """
+
+    def __init__(self, max_size=10000, ttl=30.0):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.configure(max_size, ttl)
+
+    def configure(self, max_size, ttl):
+        """Resize the cache and drop every entry"""
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, token_hash, company_name):
+        """Return the cached value for a token/company pair or None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[0] != company_name:
+                self.misses += 1
+                return None
+
+            if entry[2] <= time.monotonic():
+                del self._entries[token_hash]
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return entry[3]
+
+    def set(self, token_hash, company_name, company_id, value=True, valid_for=None):
+        """
+        Remember a successful validation for the configured TTL, or for
+        valid_for seconds if the token expires sooner than that
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.ttl if valid_for is None else min(self.ttl, valid_for)
+        expires = time.monotonic() + ttl
+        with self._lock:
+            self._entries[token_hash] = (company_name, company_id, expires, value)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_token(self, token_hash):
+        """Drop the entry for a single token hash"""
+        with self._lock:
+            if self._entries.pop(token_hash, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_company(self, company_id):
+        """Drop every entry that belongs to a company"""
+        with self._lock:
+            stale = [
+                token_hash for token_hash, entry in self._entries.items()
+                if entry[1] == company_id
+            ]
+            for token_hash in stale:
+                del self._entries[token_hash]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the counters used to size the cache"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+validation_cache = ValidationCache(
+    settings.TOKEN_VALIDATION_CACHE_MAX_SIZE,
+    settings.TOKEN_VALIDATION_CACHE_TTL,
+)
+
+
+@receiver(setting_changed)
+def reconfigure_validation_cache(setting, **kwargs):
+    if setting in ('TOKEN_VALIDATION_CACHE_MAX_SIZE', 'TOKEN_VALIDATION_CACHE_TTL'):
+        validation_cache.configure(
+            settings.TOKEN_VALIDATION_CACHE_MAX_SIZE,
+            settings.TOKEN_VALIDATION_CACHE_TTL,
+        )
@@ -0,0 +1,269 @@
+"""
+Change feed over the TokenChange log.
+
+Token creations and every change to the active state of a token or company
+append an entry whose id is its sequence number. Consumers such as edge
+gateways read the entries after the last sequence they applied, either in
+pages from /api/tokens/changes/ or pushed as Server-Sent Events, and keep
+their own caches in step instead of polling validation.
+
+Ids are allocated on insert but entries become visible on commit, so a
+lower id can appear after a higher one. Reads stop before a gap in the ids
+until the entry after it is TOKEN_CHANGES_GAP_TIMEOUT seconds old; a gap that
+old is taken to be a rolled back transaction. An entry whose transaction
+stays open longer than that can be skipped; every writer commits within one
+chunk of rows, bulk issuance included, so none runs transactions that long.
+"""
+import asyncio
+import hmac
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import serializers
+
+from companies.models import Company
+from core.metrics import Counter, registry
+from tokens.models import TokenChange
+
+changes_served = Counter(
+    registry, 'token_changes_served_total', 'Change feed entries sent to consumers',
+    labels=('transport',),
+)
+
+
+def token_change(kind, company_id, company_name, token_hash=None, jti=''):
+    """An unsaved change log entry"""
+    return TokenChange(kind=kind, company_id=company_id, company_name=company_name,
+                       token_hash=token_hash, jti=jti)
+
+
+# Entries buffered by collect_changes(), or None outside of it
+_collected = ContextVar('collected_changes', default=None)
+
+
+def _fill_company_names(changes):
+    """Set the company names left as None with one query"""
+    missing = {change.company_id for change in changes if change.company_name is None}
+    if missing:
+        names = dict(Company.objects.filter(pk__in=missing).values_list('pk', 'name'))
+        for change in changes:
+            if change.company_name is None:
+                change.company_name = names.get(change.company_id, '')
+
+
+def record_changes(changes):
+    """
+    Append entries to the change log in one INSERT, or buffer them inside
+    collect_changes(). Entries may leave company_name as None to have it
+    looked up.
+    """
+    if not settings.TOKEN_CHANGES_ENABLED or not changes:
+        return
+    collected = _collected.get()
+    if collected is not None:
+        collected.extend(changes)
+        return
+    _fill_company_names(changes)
+    TokenChange.objects.bulk_create(changes)
+
+
+@contextmanager
+def collect_changes():
+    """
+    Buffer the entries recorded in the block, for example by the post_delete
+    receivers of a queryset delete, and write them with one INSERT when it
+    ends. Nested blocks share the outermost buffer.
+    """
+    if _collected.get() is not None:
+        yield
+        return
+    collected = []
+    reset_token = _collected.set(collected)
+    try:
+        yield
+    finally:
+        _collected.reset(reset_token)
+    record_changes(collected)
+
+
+def is_authorized(request):
+    """Whether the request carries TOKEN_CHANGES_KEY as a bearer token; an empty key disables the feed"""
+    key = settings.TOKEN_CHANGES_KEY
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(key) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), key.encode())
+
+
+def change_data(change):
+    token_hash = change.token_hash
+    return {
+        'seq': change.pk,
+        'kind': change.kind,
+        'company_name': change.company_name,
+        'token_hash': None if token_hash is None else bytes(token_hash).hex(),
+        'jti': change.jti or None,
+        'created_at': serializers.DateTimeField().to_representation(change.created_at),
+    }
+
+
+def _page_queryset(since, limit):
+    return TokenChange.objects.filter(pk__gt=since).order_by('pk')[:limit]
+
+
+def _oldest_queryset():
+    return TokenChange.objects.order_by('pk').values_list('pk', flat=True)
+
+
+def _settled(since, rows):
+    """The rows up to the first gap in the ids that may still be filled by an open transaction"""
+    cutoff = timezone.now() - timedelta(seconds=settings.TOKEN_CHANGES_GAP_TIMEOUT)
+    expected = since + 1
+    settled = []
+    for row in rows:
+        if row.pk != expected and row.created_at > cutoff:
+            break
+        settled.append(row)
+        expected = row.pk + 1
+    return settled
+
+
+def _starts_with_gap(since, rows):
+    return since > 0 and (not rows or rows[0].pk != since + 1)
+
+
+def _is_compacted(since, oldest):
+    """Whether entries after since were removed by compaction"""
+    return oldest is not None and since < oldest - 1
+
+
+def read_changes(since, limit):
+    """
+    Return (entries, has_more) for the entries after since, or None when some
+    of them were compacted away and the consumer must start over from 0.
+    has_more is only set when a full page was returned, so readers stopped
+    by a gap wait before asking again.
+    """
+    rows = list(_page_queryset(since, limit))
+    if _starts_with_gap(since, rows) and _is_compacted(since, _oldest_queryset().first()):
+        return None
+    settled = _settled(since, rows)
+    return settled, len(settled) == limit
+
+
+async def aread_changes(since, limit):
+    """Async version of read_changes()"""
+    rows = [row async for row in _page_queryset(since, limit)]
+    if _starts_with_gap(since, rows) and _is_compacted(since, await _oldest_queryset().afirst()):
+        return None
+    settled = _settled(since, rows)
+    return settled, len(settled) == limit
+
+
+def changes_page(since, limit):
+    """Response data for one page of the change feed, or None when since was compacted away"""
+    result = read_changes(since, limit)
+    if result is None:
+        return None
+    rows, has_more = result
+    changes_served.inc('page', amount=len(rows))
+    return {
+        'changes': [change_data(row) for row in rows],
+        'next': rows[-1].pk if rows else since,
+        'has_more': has_more,
+    }
+
+
+def sse_event(event, data, event_id=None):
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+RESET_EVENT = sse_event('reset', {'detail': 'Changes were compacted; drop cached state and reconnect from 0'})
+KEEPALIVE = b': keepalive\n\n'
+
+
+class ChangeStream:
+    """
+    State of one Server-Sent Events connection. Each pass sends the settled
+    entries after the cursor, a keepalive comment when nothing was sent for
+    TOKEN_CHANGES_STREAM_HEARTBEAT seconds, and tells whether to stop.
+    Streams end after TOKEN_CHANGES_STREAM_MAX_AGE seconds so that workers
+    are not held forever; clients reconnect with Last-Event-ID.
+    """
+
+    def __init__(self, since):
+        self.since = since
+        self.started = self.last_sent = time.monotonic()
+
+    def opening(self):
+        return f'retry: {int(settings.TOKEN_CHANGES_STREAM_RETRY * 1000)}\n\n'.encode()
+
+    def events(self, result):
+        """Return (chunks to send, whether to poll again right away, whether the stream is over)"""
+        now = time.monotonic()
+        if result is None:
+            return [RESET_EVENT], False, True
+        rows, has_more = result
+        chunks = [sse_event(row.kind, change_data(row), event_id=row.pk) for row in rows]
+        if rows:
+            self.since = rows[-1].pk
+            self.last_sent = now
+            changes_served.inc('stream', amount=len(rows))
+        elif now - self.last_sent >= settings.TOKEN_CHANGES_STREAM_HEARTBEAT:
+            chunks.append(KEEPALIVE)
+            self.last_sent = now
+        return chunks, has_more, now - self.started >= settings.TOKEN_CHANGES_STREAM_MAX_AGE
+
+
+def change_stream(since):
+    """Server-Sent Events for the entries after since, polling the log"""
+    stream = ChangeStream(since)
+    yield stream.opening()
+    while True:
+        chunks, has_more, done = stream.events(read_changes(stream.since, settings.TOKEN_CHANGES_PAGE_SIZE))
+        yield from chunks
+        if done:
+            return
+        if not has_more:
+            time.sleep(settings.TOKEN_CHANGES_STREAM_POLL_INTERVAL)
+
+
+async def achange_stream(since):
+    """Async version of change_stream() for ASGI servers"""
+    stream = ChangeStream(since)
+    yield stream.opening()
+    while True:
+        result = await aread_changes(stream.since, settings.TOKEN_CHANGES_PAGE_SIZE)
+        chunks, has_more, done = stream.events(result)
+        for chunk in chunks:
+            yield chunk
+        if done:
+            return
+        if not has_more:
+            await asyncio.sleep(settings.TOKEN_CHANGES_STREAM_POLL_INTERVAL)
+
+
+def compact_changes(before, batch_size=1000):
+    """
+    Delete entries created before the given time in primary-key batches,
+    always keeping the newest entry so consumers behind it can be told they
+    missed some. Returns the number of entries deleted.
+    """
+    newest = TokenChange.objects.aggregate(newest=Max('pk'))['newest']
+    if newest is None:
+        return 0
+    deleted = 0
+    while True:
+        batch = list(
+            TokenChange.objects.filter(created_at__lt=before, pk__lt=newest)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return deleted
+        deleted += TokenChange.objects.filter(pk__in=batch).delete()[0]
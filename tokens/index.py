@@ -0,0 +1,307 @@
+"""
+Memory-mapped token index shared by every worker on a host.
+
+`manage.py build_token_index` writes every token to TOKEN_INDEX_PATH as a
+sorted array of fixed-size records and atomically replaces the previous
+file. Each worker maps the file read-only and binary-searches it, so the
+index costs one copy of the file in the page cache however many workers read
+it. A background thread in each worker remaps the file when it is replaced
+and keeps a small overlay of tokens created or changed since it was built,
+read from Token.updated_at, and of tokens and companies deleted since then,
+read from the token change log.
+
+File layout, little-endian:
+
+    header   magic b'TKIX', version, record count, built_at (microseconds
+             since the epoch), highest token id; padded to 64 bytes
+    records  token_hash (32 bytes), token id, company id, expires_at
+             (microseconds since the epoch, 0 for never), flags; 64 bytes
+             each, sorted by token_hash
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.metrics import Counter, registry
+from tokens.models import Token, TokenChange
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TKIX'
+VERSION = 1
+HEADER = struct.Struct('<4sIQqq')
+HEADER_SIZE = 64
+RECORD = struct.Struct('<32sqqqI4x')
+FLAG_ACTIVE = 1
+MISSING = object()
+
+index_lookups = Counter(
+    registry, 'token_index_lookups_total', 'Token hashes looked up in the memory-mapped token index',
+    labels=('result',),
+)
+
+
+def to_micros(value):
+    return 0 if value is None else int(value.timestamp() * 1_000_000)
+
+
+def from_micros(value):
+    return None if value == 0 else datetime.fromtimestamp(value / 1_000_000, dt_timezone.utc)
+
+
+def build_index(path, chunk_size=10000):
+    """
+    Write every token to a new index file and atomically swap it in at path.
+    Rows are streamed in token_hash order, so memory use does not depend on
+    the number of tokens. Returns the number of tokens written.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    # Changes from here on are found by the overlay of every worker
+    built_at = timezone.now()
+    count = high_water = 0
+    previous = b''
+    rows = Token.objects.values_list('token_hash', 'id', 'company_id', 'expires_at', 'active').order_by('token_hash')
+    try:
+        with open(temporary, 'wb') as output:
+            output.write(bytes(HEADER_SIZE))
+            for token_hash, token_id, company_id, expires_at, active in rows.iterator(chunk_size=chunk_size):
+                token_hash = bytes(token_hash)
+                if token_hash <= previous:
+                    raise ValueError('The database did not return token hashes in byte order')
+                previous = token_hash
+                output.write(RECORD.pack(
+                    token_hash, token_id, company_id, to_micros(expires_at), FLAG_ACTIVE if active else 0
+                ))
+                count += 1
+                high_water = max(high_water, token_id)
+            output.seek(0)
+            output.write(HEADER.pack(MAGIC, VERSION, count, to_micros(built_at), high_water))
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return count
+
+
+class IndexFile:
+    """A mapped index file; lookups slice 32-byte keys straight out of the mapping"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            stat = os.fstat(source.fileno())
+            self.mapping = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        magic, version, self.count, built_at, self.high_water = HEADER.unpack_from(self.mapping)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} token index')
+        if len(self.mapping) != HEADER_SIZE + self.count * RECORD.size:
+            raise ValueError(f'{path} is truncated')
+        self.built_at = from_micros(built_at)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        offset = HEADER_SIZE + position * RECORD.size
+        return self.mapping[offset:offset + 32]
+
+    def get(self, token_hash):
+        """Return (token id, company id, expires_at, active) or None"""
+        position = bisect_left(self, token_hash)
+        if position == self.count or self[position] != token_hash:
+            return None
+        _, token_id, company_id, expires_at, flags = RECORD.unpack_from(
+            self.mapping, HEADER_SIZE + position * RECORD.size
+        )
+        return token_id, company_id, from_micros(expires_at), bool(flags & FLAG_ACTIVE)
+
+
+class TokenIndex:
+    """
+    Per-process view of the shared index file plus an overlay of tokens
+    created or changed since it was built.
+
+    A token found in neither is looked up in the database, so tokens issued
+    after the last refresh still validate. Changes made by this process are
+    applied right away; a revocation or deletion made elsewhere takes up to
+    TOKEN_INDEX_REFRESH_INTERVAL to be seen, like a cached validation.
+    Deletions are only seen through the change log, so with
+    TOKEN_CHANGES_ENABLED=False those made elsewhere last until the next
+    build. Changes committed more than TOKEN_INDEX_OVERLAP seconds after they
+    were made can be missed until the next build.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self.reset()
+
+    def reset(self):
+        """Unmap the index and forget the overlay; lookups miss until the next refresh"""
+        with self._lock:
+            self._file = None
+            # token_hash -> record, or None for tokens to look up in the database
+            self._overlay = {}
+            # company_id -> when its tokens were revoked, until the overlay has caught up
+            self._stale_companies = {}
+            # token_hash -> when it was forgotten, likewise
+            self._forgotten = {}
+            # Companies deleted since the build, whose records are all stale
+            self._deleted_companies = frozenset()
+            self._synced_from = None
+            self.refreshed_at = None
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def enabled(self):
+        return bool(settings.TOKEN_INDEX_PATH)
+
+    def start(self):
+        """Start the background refresh thread of this process, once"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name='token-index', daemon=True).start()
+
+    def _run(self):
+        while self.enabled:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Token index refresh failed')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+            time.sleep(settings.TOKEN_INDEX_REFRESH_INTERVAL)
+        with self._lock:
+            self._started_pid = None
+
+    def refresh(self):
+        """Map a replaced index file, then add tokens changed since the last refresh to the overlay"""
+        path = settings.TOKEN_INDEX_PATH
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return
+        current = self._file
+        if current is None or current.identity != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            replacement = IndexFile(path)
+            with self._lock:
+                self._file = replacement
+                # The new file may predate a change this process has made since
+                self._overlay = dict.fromkeys(self._forgotten)
+                self._deleted_companies = frozenset()
+                self._synced_from = replacement.built_at
+        self._sync_overlay()
+        self.refreshed_at = time.monotonic()
+
+    def _sync_overlay(self):
+        started = timezone.now()
+        sync_started = time.monotonic()
+        since = self._synced_from - timedelta(seconds=settings.TOKEN_INDEX_OVERLAP)
+        rows = Token.objects.filter(updated_at__gte=since).values_list(
+            'token_hash', 'id', 'company_id', 'expires_at', 'active'
+        ).order_by()
+        changes = {
+            bytes(token_hash): (token_id, company_id, expires_at, active)
+            for token_hash, token_id, company_id, expires_at, active in rows.iterator(chunk_size=10000)
+        }
+        # Deleted rows leave nothing in Token to read, so take them from the change log
+        deletions = TokenChange.objects.filter(
+            created_at__gte=since, kind__in=[TokenChange.TOKEN_DELETED, TokenChange.COMPANY_DELETED],
+        ).values_list('kind', 'company_id', 'token_hash').order_by()
+        deleted_companies = set()
+        for kind, company_id, token_hash in deletions.iterator(chunk_size=10000):
+            if kind == TokenChange.COMPANY_DELETED:
+                deleted_companies.add(company_id)
+            else:
+                changes[bytes(token_hash)] = None
+        with self._lock:
+            # Rows read before a token was forgotten may hold its old state
+            for token_hash, marked in self._forgotten.items():
+                if marked >= sync_started:
+                    changes.pop(token_hash, None)
+            self._overlay.update(changes)
+            self._deleted_companies |= deleted_companies
+            self._synced_from = started
+            self._stale_companies = {
+                company_id: marked for company_id, marked in self._stale_companies.items() if marked >= sync_started
+            }
+            self._forgotten = {
+                token_hash: marked for token_hash, marked in self._forgotten.items() if marked >= sync_started
+            }
+
+    def forget(self, token_hashes):
+        """Look these tokens up in the database until an overlay sync that starts later"""
+        marked = time.monotonic()
+        with self._lock:
+            for token_hash in token_hashes:
+                self._overlay[token_hash] = None
+                self._forgotten[token_hash] = marked
+
+    def forget_company(self, company_id):
+        """Look every token of the company up in the database until the next overlay sync"""
+        with self._lock:
+            self._stale_companies[company_id] = time.monotonic()
+
+    def get(self, token_hash):
+        """Return (token id, company id, expires_at, active) for a known token, or None"""
+        current = self._file
+        if current is None:
+            if self.enabled:
+                self.start()
+            return None
+        # The overlay is replaced wholesale on remap; read it once without the lock
+        overlay = self._overlay
+        record = overlay.get(token_hash, MISSING)
+        if record is MISSING:
+            record = current.get(token_hash)
+        if record is not None and (record[1] in self._stale_companies or record[1] in self._deleted_companies):
+            record = None
+        if record is None:
+            self.misses += 1
+            index_lookups.inc('miss')
+        else:
+            self.hits += 1
+            index_lookups.inc('hit')
+        return record
+
+    def stats(self):
+        current = self._file
+        return {
+            'enabled': self.enabled,
+            'mapped': current is not None,
+            'tokens': 0 if current is None else current.count,
+            'file_bytes': 0 if current is None else len(current.mapping),
+            'built_at': None if current is None else current.built_at,
+            'overlay': len(self._overlay),
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshed_age': None if self.refreshed_at is None else time.monotonic() - self.refreshed_at,
+        }
+
+
+token_index = TokenIndex()
+
+
+@receiver(setting_changed)
+def reset_token_index(setting, **kwargs):
+    if setting.startswith('TOKEN_INDEX_'):
+        token_index.reset()
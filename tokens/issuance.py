@@ -0,0 +1,107 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from audit.log import audit_log
+from audit.models import AuditEvent
+from tokens.bloom import token_filter
+from tokens.changes import record_changes, token_change
+from tokens.models import Token, TokenChange
+from tokens.signed import claim_datetime, sign_token
+
+
+def audit_issued(company, token_format, token_hashes, block=True):
+    audit_log.record_many(
+        [(AuditEvent.TOKEN_ISSUED, token_format, company.name, token_hash) for token_hash in token_hashes],
+        block=block,
+    )
+
+
+def _signed_result(company, block=True):
+    raw_token, claims = sign_token(company)
+    audit_issued(company, 'signed', [Token.digest_token(raw_token)], block=block)
+    return {
+        'token': raw_token,
+        'token_obj': None,
+        'company': company,
+        'created_at': claim_datetime(claims, 'iat'),
+        'expires_at': claim_datetime(claims, 'exp'),
+    }
+
+
+def _opaque_result(company, raw_token, token):
+    return {
+        'token': raw_token,
+        'token_obj': token,
+        'company': company,
+        'created_at': token.created_at,
+    }
+
+
+def issue_token(company, token_format='opaque'):
+    """Issue one token of the requested format for an authenticated company"""
+    if token_format == 'signed':
+        return _signed_result(company)
+
+    raw_token, token = Token.build(company)
+    token.save()
+    audit_issued(company, 'opaque', [token.token_hash])
+    return _opaque_result(company, raw_token, token)
+
+
+async def aissue_token(company, token_format='opaque'):
+    """Async version of issue_token()"""
+    if token_format == 'signed':
+        return _signed_result(company, block=False)
+
+    raw_token, token = Token.build(company)
+    await token.asave()
+    # Never wait for room in the audit queue on the event loop
+    audit_issued(company, 'opaque', [token.token_hash], block=False)
+    return _opaque_result(company, raw_token, token)
+
+
+def issue_tokens(company, count, chunk_size=None):
+    """
+    Generate and insert count tokens for a company, yielding (raw_token, token).
+
+    Rows are inserted with bulk_create in chunks of chunk_size, each in its
+    own transaction that commits before any of its tokens is yielded. So only
+    one chunk of raw tokens is held in memory, and no transaction or row lock
+    is held while the caller is slow to consume them. A token handed out is
+    never rolled back. Closing the generator early stops issuing, but it
+    leaves the tokens of the current chunk that were not yielded yet
+    committed. Nobody ever sees their raw values, so they are harmless and
+    can be revoked or purged like any other token.
+    """
+    chunk_size = chunk_size or settings.TOKEN_BULK_CHUNK_SIZE
+
+    remaining = count
+    while remaining > 0:
+        chunk = [Token.build(company) for _ in range(min(chunk_size, remaining))]
+        with transaction.atomic():
+            Token.objects.bulk_create([token for _, token in chunk])
+            record_changes([
+                token_change(TokenChange.TOKEN_CREATED, company.pk, company.name, token_hash=token.token_hash)
+                for _, token in chunk
+            ])
+        # bulk_create sends no post_save signals
+        for _, token in chunk:
+            token_filter.add(bytes(token.token_hash))
+        audit_issued(company, 'opaque', [token.token_hash for _, token in chunk])
+        yield from chunk
+        remaining -= len(chunk)
+
+
+def issue_tokens_ndjson(company, count, chunk_size=None):
+    """Issue tokens and yield one JSON document per line for each of them"""
+    datetime_field = serializers.DateTimeField()
+    for raw_token, token in issue_tokens(company, count, chunk_size):
+        yield json.dumps({
+            'token': raw_token,
+            'company_name': company.name,
+            'created_at': datetime_field.to_representation(token.created_at),
+            'expires_at': datetime_field.to_representation(token.expires_at),
+        }) + '\n'
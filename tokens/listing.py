@@ -0,0 +1,85 @@
+"""
+Listing and exporting a company's tokens.
+
+Pages are keyset-paginated on (created_at, id), newest first, so the cost of
+a page does not grow with its depth the way OFFSET does; token_company_created_idx
+serves both the filter and the order. The cursor is the position of the last
+row of the previous page, base64-encoded so clients treat it as opaque.
+
+The export streams every token of a company as NDJSON from a values_list()
+iterator, in chunks of TOKEN_EXPORT_CHUNK_SIZE rows without building model
+instances. On PostgreSQL the iterator reads through a server-side cursor, so
+memory stays flat however many tokens the company has.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from tokens.models import Token
+
+FIELDS = ('id', 'token_hash', 'active', 'created_at', 'expires_at', 'last_used_at', 'use_count')
+
+
+def encode_cursor(created_at, pk):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) a cursor points at; raises ValueError if it is malformed"""
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = datetime.fromisoformat(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError) as error:
+        raise ValueError('Invalid cursor.') from error
+    if timezone.is_naive(created_at):
+        raise ValueError('Invalid cursor.')
+    return created_at, pk
+
+
+def company_tokens(company):
+    return Token.objects.filter(company=company)
+
+
+def token_data(values):
+    data = dict(zip(FIELDS, values))
+    data['token_hash'] = bytes(data['token_hash']).hex()
+    return data
+
+
+def tokens_page(company, cursor=None, limit=100):
+    """
+    Return up to limit of the company's tokens after cursor, newest first,
+    with the cursor of the next page (None on the last one).
+    """
+    tokens = company_tokens(company).order_by('-created_at', '-pk')
+    if cursor is not None:
+        created_at, pk = cursor
+        # The created_at__lte bound gives the planner an index range to start from
+        tokens = tokens.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk),
+            created_at__lte=created_at,
+        )
+    rows = [token_data(values) for values in tokens.values_list(*FIELDS)[:limit + 1]]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return {'tokens': rows, 'next': next_cursor}
+
+
+def export_tokens_ndjson(company, chunk_size=None):
+    """Yield one JSON document per line for every token of a company, oldest first"""
+    datetime_field = serializers.DateTimeField()
+    tokens = company_tokens(company).order_by('created_at', 'pk').values_list(*FIELDS)
+    for values in tokens.iterator(chunk_size=chunk_size or settings.TOKEN_EXPORT_CHUNK_SIZE):
+        data = token_data(values)
+        for field in ('created_at', 'expires_at', 'last_used_at'):
+            data[field] = datetime_field.to_representation(data[field])
+        yield json.dumps(data) + '\n'
@@ -0,0 +1,102 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from benchmarks.suite import SCENARIOS, compare, run_suite, seed, unseed
+from benchmarks.utils import test_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed companies and tokens in bulk, replay realistic request mixes against "
+        "the validation, generation and registration endpoints, and report throughput, "
+        "latency percentiles and queries per request. Runs in a throwaway test database "
+        "unless --in-place is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=100)
+        parser.add_argument('--tokens-per-company', type=int, default=10)
+        parser.add_argument('--inactive-fraction', type=float, default=0.1,
+                            help="Share of seeded companies that are inactive")
+        parser.add_argument('--requests', type=int, default=1000,
+                            help="Requests replayed per scenario")
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS, dest='scenarios',
+                            help="Scenario to run; repeat for several (defaults to all)")
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Random seed for the request mix")
+        parser.add_argument('--no-cache', action='store_true',
+                            help="Disable the validation cache for the run")
+        parser.add_argument('--in-place', action='store_true',
+                            help="Use the configured database and delete the seeded rows afterwards")
+        parser.add_argument('--output', default=None,
+                            help="File to save the results to as JSON")
+        parser.add_argument('--compare', default=None,
+                            help="Results file from an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        if options['companies'] < 2 or options['tokens_per_company'] < 1 or options['requests'] < 1:
+            raise CommandError("Need at least 2 companies, 1 token per company and 1 request")
+        inactive = int(options['companies'] * options['inactive_fraction'])
+        if inactive < 1 or options['companies'] - inactive < 2:
+            raise CommandError("--inactive-fraction must leave at least one inactive and two active companies")
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read {options['compare']}: {error}")
+
+        database = nullcontext() if options['in_place'] else test_database()
+        cache = override_settings(TOKEN_VALIDATION_CACHE_MAX_SIZE=0) if options['no_cache'] else nullcontext()
+        with database, cache:
+            data = seed(
+                options['companies'],
+                options['tokens_per_company'],
+                inactive_fraction=options['inactive_fraction'],
+            )
+            try:
+                results = run_suite(
+                    data,
+                    options['requests'],
+                    scenarios=options['scenarios'] or SCENARIOS,
+                    seed_value=options['seed'],
+                )
+            finally:
+                if options['in_place']:
+                    unseed(data)
+
+        self.report(results, compare(baseline, results) if baseline else None)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results saved to {options['output']}")
+
+    def report(self, results, changes):
+        self.stdout.write(
+            f"{'scenario':<28} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        )
+        for scenario, result in results['scenarios'].items():
+            self.stdout.write(
+                f"{scenario:<28} {result['throughput']:>9.0f} {result['p50_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['queries_per_request']:>8.2f}"
+            )
+            change = (changes or {}).get(scenario)
+            if change:
+                self.stdout.write(
+                    f"{'  vs. baseline':<28} "
+                    + " ".join(
+                        f"{self.format_change(change[metric]):>{width}}"
+                        for metric, width in (
+                            ('throughput', 9), ('p50_ms', 8), ('p95_ms', 8),
+                            ('p99_ms', 8), ('queries_per_request', 8),
+                        )
+                    )
+                )
+
+    def format_change(self, change):
+        return 'n/a' if change is None else f"{change:+.0%}"
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tokens.index import build_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every token to the memory-mapped token index and atomically "
+        "replace the previous file. Workers pick it up on their next refresh."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None,
+                            help="Index file to write, TOKEN_INDEX_PATH by default")
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="Rows fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.TOKEN_INDEX_PATH
+        if not path:
+            raise CommandError("Set TOKEN_INDEX_PATH or pass --path")
+
+        started = time.monotonic()
+        try:
+            count = build_index(path, chunk_size=options['chunk_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not build the token index - {exc}") from exc
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} tokens into {path} in {elapsed:.2f}s"))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tokens.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete token change log entries older than the retention period in "
+        "primary-key batches. The newest entry is always kept; consumers whose "
+        "cursor is older than what remains must start over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=None,
+                            help="Days of entries to keep, TOKEN_CHANGES_RETENTION_DAYS by default")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Entries removed by each DELETE")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.TOKEN_CHANGES_RETENTION_DAYS
+        before = timezone.now() - timedelta(days=days)
+        deleted = compact_changes(before, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change log entries older than {days:g} days"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from companies.models import Company
+from tokens.issuance import issue_tokens_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue tokens for an active company in bulk and write them as NDJSON. "
+        "The raw tokens are only ever shown here, so redirect the output somewhere safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_name')
+        parser.add_argument('--count', type=int, required=True)
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Rows per INSERT (defaults to TOKEN_BULK_CHUNK_SIZE)")
+        parser.add_argument('--output', default=None,
+                            help="File to write to instead of stdout")
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError("--count must be at least 1")
+
+        try:
+            company = Company.objects.get(name=options['company_name'], active=True)
+        except Company.DoesNotExist:
+            raise CommandError(f"Active company '{options['company_name']}' not found")
+
+        lines = issue_tokens_ndjson(company, options['count'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
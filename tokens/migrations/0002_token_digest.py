@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="token_digest",
+            field=models.BinaryField(max_length=32, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="token",
+            name="token_hash",
+            field=models.CharField(max_length=255, null=True, unique=True),
+        ),
+    ]
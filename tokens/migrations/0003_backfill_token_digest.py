@@ -0,0 +1,54 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def hex_to_digest(apps, schema_editor):
+    """Convert hex token hashes to raw digests, one primary-key batch at a time"""
+    Token = apps.get_model("tokens", "Token")
+    last_pk = 0
+    while True:
+        batch = list(
+            Token.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "token_hash")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        Token.objects.bulk_update(
+            [Token(pk=pk, token_digest=bytes.fromhex(token_hash)) for pk, token_hash in batch],
+            ["token_digest"],
+        )
+        last_pk = batch[-1][0]
+
+
+def digest_to_hex(apps, schema_editor):
+    """Restore hex token hashes from raw digests, one primary-key batch at a time"""
+    Token = apps.get_model("tokens", "Token")
+    last_pk = 0
+    while True:
+        batch = list(
+            Token.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "token_digest")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        Token.objects.bulk_update(
+            [Token(pk=pk, token_hash=bytes(digest).hex()) for pk, digest in batch],
+            ["token_hash"],
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    # Commit each batch on its own instead of holding every row locked in one transaction
+    atomic = False
+
+    dependencies = [
+        ("tokens", "0002_token_digest"),
+    ]
+
+    operations = [
+        migrations.RunPython(hex_to_digest, digest_to_hex),
+    ]
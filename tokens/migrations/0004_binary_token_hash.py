@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0003_backfill_token_digest"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="token",
+            name="token_hash",
+        ),
+        migrations.RenameField(
+            model_name="token",
+            old_name="token_digest",
+            new_name="token_hash",
+        ),
+        migrations.AlterField(
+            model_name="token",
+            name="token_hash",
+            field=models.BinaryField(max_length=32, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="token",
+            index=models.Index(
+                condition=models.Q(("active", True)),
+                fields=["token_hash"],
+                name="token_active_hash_idx",
+            ),
+        ),
+    ]
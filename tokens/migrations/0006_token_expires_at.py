@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0005_signed_token_revocation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
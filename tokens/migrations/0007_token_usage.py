@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0006_token_expires_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="last_used_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="token",
+            name="use_count",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
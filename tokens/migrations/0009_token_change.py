@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0008_token_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("token_created", "Token created"),
+                            ("token_activated", "Token activated"),
+                            ("token_deactivated", "Token deactivated"),
+                            ("token_deleted", "Token deleted"),
+                            ("signed_token_revoked", "Signed token revoked"),
+                            (
+                                "company_tokens_deactivated",
+                                "Every token of the company deactivated",
+                            ),
+                            ("company_activated", "Company activated"),
+                            ("company_deactivated", "Company deactivated"),
+                            ("company_deleted", "Company deleted"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("company_id", models.BigIntegerField()),
+                ("company_name", models.CharField(max_length=255)),
+                (
+                    "token_hash",
+                    models.BinaryField(blank=True, max_length=32, null=True),
+                ),
+                ("jti", models.CharField(blank=True, default="", max_length=32)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0002_company_token_ttl"),
+        ("tokens", "0009_token_change"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="token",
+            index=models.Index(
+                fields=["company", "created_at", "id"], name="token_company_created_idx"
+            ),
+        ),
+    ]
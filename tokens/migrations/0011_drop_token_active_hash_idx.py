@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tokens", "0010_token_company_created_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="token",
+            name="token_active_hash_idx",
+        ),
+    ]
@@ -1,21 +1,52 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 import hashlib
 import uuid
 from companies.models import Company
 
 
+class TokenQuerySet(models.QuerySet):
+
+    def delete(self):
+        """
+        Delete the tokens with their change log entries, which the post_delete
+        receivers collect and write with one INSERT in the same transaction.
+        """
+        from tokens.changes import collect_changes
+
+        with transaction.atomic(using=self.db), collect_changes():
+            return super().delete()
+
+
 class Token(models.Model):
-    token_hash = models.CharField(max_length=255, unique=True)
+    token_hash = models.BinaryField(max_length=32, unique=True)
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='tokens')
     active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Written in batches by tokens.usage, so they lag real use by up to one flush interval
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    use_count = models.PositiveBigIntegerField(default=0)
+    # Set on insert and by every change to active, including set-based
+    # revocations; the token index overlay reads changes by it
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = TokenQuerySet.as_manager()
 
     def __str__(self):
         return f"Token for {self.company.name}"
 
     def set_token(self, raw_token):
         """Hash and set the token"""
-        self.token_hash = hashlib.sha256(raw_token.encode()).hexdigest()
+        self.token_hash = self.digest_token(raw_token)
+
+    @classmethod
+    def build(cls, company):
+        """Return a new raw token and the unsaved Token that stores its hash"""
+        raw_token = cls.generate_token()
+        token = cls(company=company, expires_at=company.token_expiry())
+        token.set_token(raw_token)
+        return raw_token, token
 
     @classmethod
     def generate_token(cls):
@@ -24,12 +55,75 @@ class Token(models.Model):
 
     @classmethod
     def hash_token(cls, raw_token):
-        """Helper method to hash a token for lookups"""
+        """Hex SHA-256 of a token, for display and logging"""
         return hashlib.sha256(raw_token.encode()).hexdigest()
 
+    @classmethod
+    def digest_token(cls, raw_token):
+        """Raw 32-byte SHA-256 of a token, as stored in token_hash and used for lookups"""
+        return hashlib.sha256(raw_token.encode()).digest()
+
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
     def is_valid(self):
-        """Check if token is active and company is active"""
-        return self.active and self.company.active
+        """Check if token is active, not expired and company is active"""
+        return self.active and not self.is_expired() and self.company.active
 
     class Meta:
         ordering = ['-created_at']
+        # Validation also reads inactive tokens, to report them as such, so the
+        # unique index on token_hash serves it and a partial one would not
+        indexes = [
+            # Keyset pagination and export of a company's tokens (tokens.listing)
+            models.Index(fields=['company', 'created_at', 'id'], name='token_company_created_idx'),
+        ]
+
+
+class SignedTokenRevocation(models.Model):
+    """Revoked signed token, kept until the token would have expired anyway"""
+    jti = models.CharField(max_length=32, unique=True)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='signed_token_revocations')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Revoked signed token {self.jti}"
+
+
+class TokenChange(models.Model):
+    """
+    Append-only log of token and company state changes read by the change
+    feed; the primary key is the feed's sequence number. Companies and tokens
+    are referenced by value so entries outlive the rows they describe.
+    """
+    TOKEN_CREATED = 'token_created'
+    TOKEN_ACTIVATED = 'token_activated'
+    TOKEN_DEACTIVATED = 'token_deactivated'
+    TOKEN_DELETED = 'token_deleted'
+    SIGNED_TOKEN_REVOKED = 'signed_token_revoked'
+    COMPANY_TOKENS_DEACTIVATED = 'company_tokens_deactivated'
+    COMPANY_ACTIVATED = 'company_activated'
+    COMPANY_DEACTIVATED = 'company_deactivated'
+    COMPANY_DELETED = 'company_deleted'
+    KINDS = [
+        (TOKEN_CREATED, 'Token created'),
+        (TOKEN_ACTIVATED, 'Token activated'),
+        (TOKEN_DEACTIVATED, 'Token deactivated'),
+        (TOKEN_DELETED, 'Token deleted'),
+        (SIGNED_TOKEN_REVOKED, 'Signed token revoked'),
+        (COMPANY_TOKENS_DEACTIVATED, 'Every token of the company deactivated'),
+        (COMPANY_ACTIVATED, 'Company activated'),
+        (COMPANY_DEACTIVATED, 'Company deactivated'),
+        (COMPANY_DELETED, 'Company deleted'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KINDS)
+    company_id = models.BigIntegerField()
+    company_name = models.CharField(max_length=255)
+    token_hash = models.BinaryField(max_length=32, null=True, blank=True)
+    jti = models.CharField(max_length=32, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.pk} {self.kind} {self.company_name}"
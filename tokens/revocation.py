@@ -0,0 +1,84 @@
+"""
+Set-based token revocation.
+
+Each function runs a fixed number of queries however many tokens it affects,
+records the revocations in the change log in the same transaction, returns
+how many tokens it revoked and sends tokens_revoked so every cache in this
+process drops them at once. Other workers drop their cached validations
+within TOKEN_VALIDATION_CACHE_TTL and reload signed token revocations within
+TOKEN_SIGNED_REVOCATION_REFRESH.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from tokens.changes import record_changes, token_change
+from tokens.models import SignedTokenRevocation, Token, TokenChange
+from tokens.signals import tokens_revoked
+from tokens.signed import (claim_datetime, is_signed_token, read_token,
+                           revocations)
+
+
+def _revoke_signed(company, raw_tokens):
+    """Record revocations for the company's signed tokens among raw_tokens"""
+    claims = {}
+    for raw_token in raw_tokens:
+        token_claims = read_token(raw_token)
+        if token_claims is not None and token_claims['c'] == company.pk:
+            claims[token_claims['jti']] = token_claims
+    if not claims:
+        return 0
+
+    revoked = set(SignedTokenRevocation.objects.filter(jti__in=claims).values_list('jti', flat=True))
+    SignedTokenRevocation.objects.bulk_create(
+        [
+            SignedTokenRevocation(jti=jti, company=company, expires_at=claim_datetime(token_claims, 'exp'))
+            for jti, token_claims in claims.items() if jti not in revoked
+        ],
+        ignore_conflicts=True,
+    )
+    record_changes([
+        token_change(TokenChange.SIGNED_TOKEN_REVOKED, company.pk, company.name, jti=jti)
+        for jti in claims.keys() - revoked
+    ])
+    for jti in claims:
+        revocations.revoke(jti)
+    return len(claims.keys() - revoked)
+
+
+def revoke_tokens(company, raw_tokens):
+    """Revoke the company's tokens among raw_tokens; tokens of other companies are ignored"""
+    signed = [raw_token for raw_token in raw_tokens if is_signed_token(raw_token)]
+    token_hashes = {Token.digest_token(raw_token) for raw_token in raw_tokens if not is_signed_token(raw_token)}
+
+    with transaction.atomic():
+        count = _revoke_signed(company, signed) if signed else 0
+        if token_hashes:
+            # Locked so concurrent revocations of the same tokens log them once
+            active = dict(
+                Token.objects.select_for_update()
+                .filter(company=company, token_hash__in=token_hashes, active=True)
+                .values_list('pk', 'token_hash')
+            )
+            if active:
+                count += Token.objects.filter(pk__in=active).update(active=False, updated_at=timezone.now())
+                record_changes([
+                    token_change(TokenChange.TOKEN_DEACTIVATED, company.pk, company.name, token_hash=token_hash)
+                    for token_hash in active.values()
+                ])
+    if token_hashes:
+        tokens_revoked.send(sender=Token, company_id=company.pk, token_hashes=token_hashes)
+    return count
+
+
+def revoke_company_tokens(company):
+    """
+    Revoke every stored token of the company. Signed tokens cannot be listed;
+    deactivate the company to reject those too.
+    """
+    with transaction.atomic():
+        count = Token.objects.filter(company=company, active=True).update(active=False, updated_at=timezone.now())
+        if count:
+            # One entry for the whole company instead of one per token
+            record_changes([token_change(TokenChange.COMPANY_TOKENS_DEACTIVATED, company.pk, company.name)])
+    tokens_revoked.send(sender=Token, company_id=company.pk, token_hashes=None)
+    return count
@@ -1,24 +1,24 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from companies.models import Company
-from tokens.models import Token
+from tokens.issuance import issue_token
+from tokens.listing import decode_cursor
+from tokens.validation import validate_pairs
 
 
-class TokenGenerationSerializer(serializers.Serializer):
+class TokenCredentialsSerializer(serializers.Serializer):
     company_name = serializers.CharField(max_length=255)
     password = serializers.CharField(max_length=255, write_only=True)
+    format = serializers.ChoiceField(choices=['opaque', 'signed'], default='opaque')
+
+
+class TokenGenerationSerializer(TokenCredentialsSerializer):
 
     def validate(self, data):
         """Validate company credentials"""
-        try:
-            company = Company.objects.get(
-                name=data['company_name'],
-                active=True
-            )
-        except Company.DoesNotExist:
-            raise serializers.ValidationError("Invalid credentials")
-
-        if not company.check_password(data['password']):
+        company = Company.authenticate(data['company_name'], data['password'])
+        if company is None:
             raise serializers.ValidationError("Invalid credentials")
 
         data['company'] = company
@@ -26,50 +26,124 @@ class TokenGenerationSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         """Create a new token for the authenticated company"""
-        company = validated_data['company']
-        raw_token = Token.generate_token()
-        
-        token = Token(company=company)
-        token.set_token(raw_token)
-        token.save()
-        
-        return {
-            'token': raw_token,
-            'token_obj': token
-        }
-
-
-class TokenValidationSerializer(serializers.Serializer):
+        return issue_token(validated_data['company'], validated_data.get('format'))
+
+
+class TokenBulkGenerationSerializer(TokenGenerationSerializer):
+    format = None
+    count = serializers.IntegerField(min_value=1)
+
+    def validate_count(self, value):
+        """Cap the number of tokens issued by a single request"""
+        max_count = settings.TOKEN_BULK_MAX_COUNT
+        if value > max_count:
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to {max_count}."
+            )
+        return value
+
+
+class TokenUsageSerializer(TokenGenerationSerializer):
+    format = None
+    unused_days = serializers.IntegerField(min_value=1, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class TokenRevocationSerializer(TokenGenerationSerializer):
+    format = None
+    token = serializers.CharField(max_length=255)
+
+
+class TokenBatchRevocationSerializer(TokenGenerationSerializer):
+    format = None
+    tokens = serializers.ListField(child=serializers.CharField(max_length=255), allow_empty=False)
+
+    def validate_tokens(self, value):
+        """Cap the number of tokens revoked by a single request"""
+        max_size = settings.TOKEN_REVOCATION_BATCH_MAX_SIZE
+        if len(value) > max_size:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {max_size} elements."
+            )
+        return value
+
+
+class TokenChangesSerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, value):
+        """Cap the page size at TOKEN_CHANGES_PAGE_SIZE"""
+        max_size = settings.TOKEN_CHANGES_PAGE_SIZE
+        if value > max_size:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {max_size}.")
+        return value
+
+
+class TokenExportSerializer(serializers.Serializer):
+    company = serializers.CharField(max_length=255)
+    password = serializers.CharField(max_length=255, write_only=True)
+
+    def validate(self, data):
+        """Validate company credentials"""
+        company = Company.authenticate(data['company'], data['password'])
+        if company is None:
+            raise serializers.ValidationError("Invalid credentials")
+        data['company'] = company
+        return data
+
+
+class TokenListSerializer(TokenExportSerializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_cursor(self, value):
+        """Decode the cursor into the (created_at, id) of the last row seen"""
+        try:
+            return decode_cursor(value)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+
+    def validate_limit(self, value):
+        """Cap the page size at TOKEN_LIST_MAX_PAGE_SIZE"""
+        max_size = settings.TOKEN_LIST_MAX_PAGE_SIZE
+        if value > max_size:
+            raise serializers.ValidationError(f"Ensure this value is less than or equal to {max_size}.")
+        return value
+
+
+class TokenPairSerializer(serializers.Serializer):
     token = serializers.CharField(max_length=255)
     company_name = serializers.CharField(max_length=255)
-    
+
+
+class TokenValidationSerializer(TokenPairSerializer):
+
     def validate(self, data):
         """Validate token exists, is active, and belongs to the company"""
-        token_hash = Token.hash_token(data['token'])
-        
-        try:
-            token = Token.objects.get(token_hash=token_hash, company__name=data['company_name'])
-        except Token.DoesNotExist:
-            token_exists = Token.objects.filter(token_hash=token_hash).exists()
-            if not token_exists:
-                raise serializers.ValidationError({
-                    'token': 'Token does not exist'
-                })
-            else:
-                raise serializers.ValidationError({
-                    'company_name': 'Token does not belong to this company'
-                })
-                
-        if not token.is_valid():
-            if not token.active:
-                raise serializers.ValidationError({
-                    'token': 'Token is inactive'
-                })
-            elif not token.company.active:
-                raise serializers.ValidationError({
-                    'company_name': 'Company is inactive'
-                })
-                
+        error = validate_pairs([(data['token'], data['company_name'])])[0]
+        if error is not None:
+            raise serializers.ValidationError(error)
+        return data
+
+
+class TokenBatchValidationSerializer(serializers.Serializer):
+    tokens = TokenPairSerializer(many=True, allow_empty=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['tokens'].max_length = settings.TOKEN_VALIDATION_BATCH_MAX_SIZE
+
+    def validate(self, data):
+        """Validate every token/company pair, keeping a result per item"""
+        pairs = [(item['token'], item['company_name']) for item in data['tokens']]
+        data['results'] = [
+            {'valid': True} if error is None else {
+                'valid': False,
+                'errors': {field: [message] for field, message in error.items()},
+            }
+            for error in validate_pairs(pairs)
+        ]
         return data
 
 
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from companies.models import Company
+from companies.signals import company_deactivated
+from tokens.bloom import token_filter
+from tokens.cache import validation_cache
+from tokens.changes import record_changes, token_change
+from tokens.index import token_index
+from tokens.models import Token, TokenChange
+from tokens.signed import revocations
+
+# Sent with company_id and token_hashes (None for all of the company's tokens)
+# after a set-based revocation, which post_save does not see
+tokens_revoked = Signal()
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def evict_token(sender, instance, created=False, **kwargs):
+    """Drop cached validations and indexed records as soon as a token changes or disappears"""
+    if not created:
+        validation_cache.invalidate_token(bytes(instance.token_hash))
+        token_index.forget([bytes(instance.token_hash)])
+
+
+@receiver(post_save, sender=Token)
+def remember_token(sender, instance, **kwargs):
+    """Make tokens saved by this process known to its Bloom filter right away"""
+    token_filter.add(bytes(instance.token_hash))
+
+
+@receiver(post_save, sender=Company)
+def company_saved(sender, instance, created, **kwargs):
+    """Drop cached validations for every token of a changed company"""
+    if not created:
+        validation_cache.invalidate_company(instance.pk)
+        revocations.set_company_active(instance.pk, instance.active)
+
+
+@receiver(post_delete, sender=Company)
+def company_deleted(sender, instance, **kwargs):
+    """Forget everything this process knows about a deleted company"""
+    validation_cache.invalidate_company(instance.pk)
+    revocations.forget_company(instance.pk)
+
+
+@receiver(tokens_revoked)
+def evict_revoked_tokens(sender, company_id, token_hashes, **kwargs):
+    """Drop cached validations and indexed records of revoked tokens"""
+    if token_hashes is None:
+        validation_cache.invalidate_company(company_id)
+        token_index.forget_company(company_id)
+    else:
+        for token_hash in token_hashes:
+            validation_cache.invalidate_token(token_hash)
+        token_index.forget(token_hashes)
+
+
+@receiver(company_deactivated)
+def evict_deactivated_company(sender, company_id, **kwargs):
+    """Reject every token of a deactivated company in this process right away"""
+    validation_cache.invalidate_company(company_id)
+    revocations.set_company_active(company_id, False)
+
+
+@receiver(pre_save, sender=Token)
+@receiver(pre_save, sender=Company)
+def remember_active(sender, instance, update_fields=None, **kwargs):
+    """Read the stored active state before a save that may change it, so the change is logged"""
+    instance._stored_active = None
+    if not settings.TOKEN_CHANGES_ENABLED or instance._state.adding:
+        return
+    if update_fields is None or 'active' in update_fields:
+        instance._stored_active = sender._base_manager.filter(pk=instance.pk).values_list('active', flat=True).first()
+
+
+def _active_changed(instance):
+    stored = getattr(instance, '_stored_active', None)
+    return stored is not None and stored != instance.active
+
+
+@receiver(post_save, sender=Token)
+def log_token_saved(sender, instance, created, **kwargs):
+    """Log created tokens and saves that change active"""
+    if created:
+        kind = TokenChange.TOKEN_CREATED
+    elif _active_changed(instance):
+        kind = TokenChange.TOKEN_ACTIVATED if instance.active else TokenChange.TOKEN_DEACTIVATED
+    else:
+        return
+    record_changes([
+        token_change(kind, instance.company_id, instance.company.name, token_hash=bytes(instance.token_hash))
+    ])
+
+
+@receiver(post_delete, sender=Token)
+def log_token_deleted(sender, instance, origin=None, **kwargs):
+    """Log deleted tokens, except those removed with their company, which is logged once"""
+    if not isinstance(origin, Company) and getattr(origin, 'model', None) is not Company:
+        # The company name is looked up once for the whole delete
+        record_changes([token_change(
+            TokenChange.TOKEN_DELETED, instance.company_id, None, token_hash=bytes(instance.token_hash),
+        )])
+
+
+@receiver(post_save, sender=Company)
+def log_company_saved(sender, instance, created, **kwargs):
+    """Log saves that change a company's active state"""
+    if _active_changed(instance):
+        kind = TokenChange.COMPANY_ACTIVATED if instance.active else TokenChange.COMPANY_DEACTIVATED
+        record_changes([token_change(kind, instance.pk, instance.name)])
+
+
+@receiver(post_delete, sender=Company)
+def log_company_deleted(sender, instance, **kwargs):
+    record_changes([token_change(TokenChange.COMPANY_DELETED, instance.pk, instance.name)])
+
+
+@receiver(company_deactivated)
+def log_company_deactivated(sender, company_id, company_name, **kwargs):
+    """Log Company.deactivate(), which post_save does not see"""
+    record_changes([token_change(TokenChange.COMPANY_DEACTIVATED, company_id, company_name)])
@@ -0,0 +1,244 @@
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone as django_timezone
+
+from companies.models import Company
+from core.routers import aread_from_replica, read_from_replica
+from tokens.models import SignedTokenRevocation
+
+PREFIX = 'st1:'
+SALT = 'tokens.signed'
+# Company ids per query when checking that cached company names still exist
+COMPANY_CHECK_CHUNK_SIZE = 1000
+
+
+def is_signed_token(raw_token):
+    return raw_token.startswith(PREFIX)
+
+
+def sign_token(company, ttl=None):
+    """
+    Issue a signed token for a company.
+
+    Tokens live for ttl seconds, falling back to the company's token TTL and
+    then to TOKEN_SIGNED_TTL. A TTL that is not positive raises ValueError.
+
+    The token carries the company id, issue time, expiry and a random id used
+    for revocation, so validating it needs no database lookup. Returns the raw
+    token and its claims.
+    """
+    if ttl is None:
+        ttl = company.token_ttl
+    if ttl is None:
+        ttl = settings.TOKEN_SIGNED_TTL
+    if ttl <= 0:
+        raise ValueError(f'Signed token TTL must be positive, got {ttl}')
+    issued_at = int(time.time())
+    claims = {
+        'c': company.pk,
+        'iat': issued_at,
+        'exp': issued_at + ttl,
+        'jti': secrets.token_hex(8),
+    }
+    raw_token = PREFIX + signing.dumps(claims, key=settings.TOKEN_SIGNING_KEY, salt=SALT)
+    return raw_token, claims
+
+
+def read_token(raw_token):
+    """Return the claims of a correctly signed token, or None"""
+    try:
+        return signing.loads(raw_token[len(PREFIX):], key=settings.TOKEN_SIGNING_KEY, salt=SALT)
+    except signing.BadSignature:
+        return None
+
+
+def claim_datetime(claims, name):
+    return datetime.fromtimestamp(claims[name], tz=timezone.utc)
+
+
+class RevocationSet:
+    """
+    Per-process snapshot of revoked signed tokens and inactive companies.
+
+    prepare() (or aprepare() from async code) reloads the snapshot at most
+    once every refresh interval and resolves the company name of a token;
+    after that, checking a signed token is a few set lookups. Changes made by
+    this process are applied immediately; changes made elsewhere, including
+    company deletions, show up within one refresh interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything and reload on the next check"""
+        self._company_names = {}
+        self._jtis = frozenset()
+        self._inactive_companies = frozenset()
+        self._loaded_at = None
+
+    def _is_fresh(self):
+        return (
+            self._loaded_at is not None
+            and time.monotonic() - self._loaded_at < settings.TOKEN_SIGNED_REVOCATION_REFRESH
+        )
+
+    def _revoked_jtis(self):
+        return SignedTokenRevocation.objects.filter(
+            expires_at__gt=django_timezone.now()
+        ).values_list('jti', flat=True)
+
+    def _inactive_company_ids(self):
+        return Company.objects.filter(active=False).values_list('id', flat=True)
+
+    def _company_name(self, company_id):
+        return Company.objects.filter(pk=company_id).values_list('name', flat=True)
+
+    def _existing_company_ids(self, company_ids):
+        """Querysets finding which of company_ids still exist, one per chunk of ids"""
+        size = COMPANY_CHECK_CHUNK_SIZE
+        return [
+            Company.objects.filter(pk__in=company_ids[start:start + size]).values_list('id', flat=True)
+            for start in range(0, len(company_ids), size)
+        ]
+
+    def _load(self, known):
+        existing = {pk for queryset in self._existing_company_ids(known) for pk in queryset}
+        return frozenset(self._revoked_jtis()), frozenset(self._inactive_company_ids()), existing
+
+    async def _aload(self, known):
+        existing = {pk for queryset in self._existing_company_ids(known) async for pk in queryset}
+        jtis = frozenset([jti async for jti in self._revoked_jtis()])
+        inactive = frozenset([pk async for pk in self._inactive_company_ids()])
+        return jtis, inactive, existing
+
+    def _forget_missing(self, known, existing):
+        """Drop the names of companies deleted, possibly by another process, since they were looked up"""
+        for company_id in known:
+            if company_id not in existing:
+                self._company_names.pop(company_id, None)
+
+    def prepare(self, company_id):
+        """Make sure the snapshot is fresh and the company name is known; reads use a replica if any"""
+        if not self._is_fresh():
+            with self._lock:
+                if not self._is_fresh():
+                    known = list(self._company_names)
+                    (self._jtis, self._inactive_companies, existing), _ = read_from_replica(
+                        lambda: self._load(known)
+                    )
+                    self._forget_missing(known, existing)
+                    self._loaded_at = time.monotonic()
+
+        if company_id not in self._company_names:
+            name, alias = read_from_replica(self._company_name(company_id).first)
+            if name is None and alias is not None:
+                # The company may be too new to have reached the replica
+                name = self._company_name(company_id).first()
+            self._remember_name(company_id, name)
+
+    async def aprepare(self, company_id):
+        """Async version of prepare(); concurrent reloads are harmless"""
+        if not self._is_fresh():
+            known = list(self._company_names)
+            (jtis, inactive, existing), _ = await aread_from_replica(lambda: self._aload(known))
+            with self._lock:
+                self._jtis = jtis
+                self._inactive_companies = inactive
+                self._forget_missing(known, existing)
+                self._loaded_at = time.monotonic()
+
+        if company_id not in self._company_names:
+            name, alias = await aread_from_replica(self._company_name(company_id).afirst)
+            if name is None and alias is not None:
+                name = await self._company_name(company_id).afirst()
+            self._remember_name(company_id, name)
+
+    def _remember_name(self, company_id, name):
+        """
+        Company names never change, so they are kept until the company is
+        deleted: every reload of the snapshot drops the names of companies
+        that no longer exist.
+        """
+        if name is not None:
+            self._company_names[company_id] = name
+
+    def is_revoked(self, jti):
+        return jti in self._jtis
+
+    def is_company_inactive(self, company_id):
+        return company_id in self._inactive_companies
+
+    def company_name(self, company_id):
+        return self._company_names.get(company_id)
+
+    def revoke(self, jti):
+        with self._lock:
+            self._jtis = self._jtis | {jti}
+
+    def forget_company(self, company_id):
+        with self._lock:
+            self._company_names.pop(company_id, None)
+            self._inactive_companies = self._inactive_companies | {company_id}
+
+    def set_company_active(self, company_id, active):
+        with self._lock:
+            if active:
+                self._inactive_companies = self._inactive_companies - {company_id}
+            else:
+                self._inactive_companies = self._inactive_companies | {company_id}
+
+
+revocations = RevocationSet()
+
+
+def revoke_signed_token(claims):
+    """Persist the revocation of a signed token and apply it to this process"""
+    SignedTokenRevocation.objects.get_or_create(
+        jti=claims['jti'],
+        defaults={
+            'company_id': claims['c'],
+            'expires_at': claim_datetime(claims, 'exp'),
+        },
+    )
+    revocations.revoke(claims['jti'])
+
+
+def claims_error(claims, company_name):
+    """
+    Return the {field: message} error for verified claims, or None if the
+    token is valid. Expects revocations.prepare() to have run for the company.
+    """
+    if revocations.company_name(claims['c']) != company_name:
+        return {'company_name': 'Token does not belong to this company'}
+    if revocations.is_revoked(claims['jti']):
+        return {'token': 'Token is inactive'}
+    if claims['exp'] <= time.time():
+        return {'token': 'Token has expired'}
+    if revocations.is_company_inactive(claims['c']):
+        return {'company_name': 'Company is inactive'}
+    return None
+
+
+def signed_token_error(raw_token, company_name):
+    """Return the {field: message} error for a signed token, or None if it is valid"""
+    claims = read_token(raw_token)
+    if claims is None:
+        return {'token': 'Token does not exist'}
+    revocations.prepare(claims['c'])
+    return claims_error(claims, company_name)
+
+
+async def asigned_token_error(raw_token, company_name):
+    """Async version of signed_token_error()"""
+    claims = read_token(raw_token)
+    if claims is None:
+        return {'token': 'Token does not exist'}
+    await revocations.aprepare(claims['c'])
+    return claims_error(claims, company_name)
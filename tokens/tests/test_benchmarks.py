@@ -0,0 +1,73 @@
+"""
+Micro-benchmarks of the endpoints, skipped unless pytest-benchmark is installed.
+
+    pytest tokens/tests/test_benchmarks.py --benchmark-autosave
+    pytest tokens/tests/test_benchmarks.py --benchmark-compare
+"""
+import itertools
+import json
+
+import pytest
+from django.test import Client
+
+from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
+from tokens.tests.factories import TokenFactory
+
+pytest.importorskip('pytest_benchmark')
+
+
+def post(client, url, payload):
+    return client.post(url, json.dumps(payload), content_type='application/json')
+
+
+@pytest.mark.django_db
+class TestEndpointBenchmarks:
+
+    def setup_method(self):
+        self.client = Client()
+
+    def test_validate_valid_token(self, benchmark):
+        """Benchmark validating a valid token"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='bench-token')
+        payload = {'token': 'bench-token', 'company_name': company.name}
+
+        response = benchmark(post, self.client, '/api/tokens/validate/', payload)
+
+        assert response.status_code == 200
+
+    def test_validate_unknown_token(self, benchmark):
+        """Benchmark validating a token that does not exist"""
+        company = CompanyFactory()
+        payload = {'token': 'missing-token', 'company_name': company.name}
+
+        response = benchmark(post, self.client, '/api/tokens/validate/', payload)
+
+        assert response.status_code == 400
+
+    def test_validate_inactive_company(self, benchmark):
+        """Benchmark validating a token of an inactive company"""
+        company = InactiveCompanyFactory()
+        TokenFactory(company=company, token='bench-token')
+        payload = {'token': 'bench-token', 'company_name': company.name}
+
+        response = benchmark(post, self.client, '/api/tokens/validate/', payload)
+
+        assert response.status_code == 400
+
+    def test_generate_token(self, benchmark):
+        """Benchmark generating a token"""
+        company = CompanyFactory(password='bench-password')
+        payload = {'company_name': company.name, 'password': 'bench-password'}
+
+        response = benchmark(post, self.client, '/api/tokens/', payload)
+
+        assert response.status_code == 201
+
+    def test_register_company(self, benchmark):
+        """Benchmark registering a company"""
+        names = (f'bench-company-{index}' for index in itertools.count())
+
+        response = benchmark(lambda: post(self.client, '/api/companies/register/', {'company_name': next(names)}))
+
+        assert response.status_code == 201
@@ -0,0 +1,146 @@
+import hashlib
+
+import pytest
+from asgiref.sync import async_to_sync
+
+from companies.tests.factories import CompanyFactory
+from tokens.bloom import BloomFilter, token_filter
+from tokens.issuance import issue_tokens
+from tokens.models import Token
+from tokens.tests.factories import TokenFactory
+from tokens.validation import avalidate_pairs, validate_pairs
+
+
+def digest(value):
+    return hashlib.sha256(str(value).encode()).digest()
+
+
+class TestBloomFilter:
+
+    def test_added_hashes_are_found(self):
+        """Test a Bloom filter never misses a hash that was added"""
+        bloom = BloomFilter(capacity=1000, false_positive_rate=0.01, max_bytes=1024 * 1024)
+        for value in range(1000):
+            bloom.add(digest(value))
+
+        assert all(digest(value) in bloom for value in range(1000))
+        assert bloom.items == 1000
+
+    def test_false_positive_rate_is_close_to_target(self):
+        """Test unknown hashes are mostly rejected at the configured rate"""
+        bloom = BloomFilter(capacity=10000, false_positive_rate=0.01, max_bytes=1024 * 1024)
+        for value in range(10000):
+            bloom.add(digest(value))
+
+        false_positives = sum(digest(f'unknown-{value}') in bloom for value in range(10000))
+
+        assert false_positives < 200
+
+    def test_memory_budget_caps_size(self):
+        """Test the bit array never exceeds the memory budget"""
+        bloom = BloomFilter(capacity=10 ** 6, false_positive_rate=0.001, max_bytes=1024)
+
+        assert len(bloom._array) == 1024
+
+
+@pytest.mark.django_db
+class TestTokenFilter:
+
+    @pytest.fixture(autouse=True)
+    def enable_filter(self, settings):
+        settings.TOKEN_BLOOM_ENABLED = True
+        self.company = CompanyFactory()
+
+    def test_unknown_tokens_rejected_with_one_recent_rows_probe(self, django_assert_num_queries):
+        """Test misses only check the tokens inserted since the sync window started, once per batch"""
+        TokenFactory(company=self.company, token='known-token')
+        token_filter.rebuild()
+
+        with django_assert_num_queries(1) as captured:
+            errors = validate_pairs([('unknown-token', self.company.name), ('other-token', self.company.name)])
+
+        assert errors == [{'token': 'Token does not exist'}] * 2
+        assert token_filter.stats()['rejected'] == 2
+        assert 'JOIN' not in captured.captured_queries[0]['sql']
+
+    def test_tokens_issued_elsewhere_validate_before_the_next_sync(self):
+        """Test a token inserted by another process is never reported as nonexistent"""
+        token_filter.rebuild()
+        raw_token, token = Token.build(self.company)
+        Token.objects.bulk_create([token])
+
+        assert not token_filter.might_contain(Token.digest_token(raw_token))
+        assert validate_pairs([(raw_token, self.company.name)]) == [None]
+        assert async_to_sync(avalidate_pairs)([(raw_token, self.company.name)]) == [None]
+
+    def test_known_tokens_still_validated(self):
+        """Test tokens in the filter go on to the database lookup"""
+        TokenFactory(company=self.company, token='known-token')
+        token_filter.rebuild()
+
+        assert validate_pairs([('known-token', self.company.name)]) == [None]
+        assert token_filter.stats()['passed'] == 1
+
+    def test_tokens_saved_by_this_process_are_added(self):
+        """Test saving a token adds it to the filter right away"""
+        token_filter.rebuild()
+        TokenFactory(company=self.company, token='new-token')
+        list(issue_tokens(self.company, 3, chunk_size=2))
+
+        assert validate_pairs([('new-token', self.company.name)]) == [None]
+        for token in Token.objects.all():
+            assert token_filter.might_contain(bytes(token.token_hash))
+
+    def test_sync_picks_up_tokens_inserted_elsewhere(self):
+        """Test rows inserted without signals are found after a sync"""
+        token_filter.rebuild()
+        raw_token, token = Token.build(self.company)
+        Token.objects.bulk_create([token])
+
+        assert not token_filter.might_contain(Token.digest_token(raw_token))
+        token_filter.sync()
+        assert token_filter.might_contain(Token.digest_token(raw_token))
+
+    def test_sync_picks_up_late_commits_with_lower_ids(self):
+        """Test rows committed after rows with higher ids are still found"""
+        first, _ = TokenFactory.create_batch(2, company=self.company)
+        late_pk = first.pk
+        first.delete()
+        token_filter.rebuild()
+        token_filter.sync()
+        raw_token, token = Token.build(self.company)
+        token.pk = late_pk
+        Token.objects.bulk_create([token])
+
+        token_filter.sync()
+
+        assert token_filter.might_contain(Token.digest_token(raw_token))
+
+    def test_unbuilt_filter_defers_to_database(self, monkeypatch):
+        """Test every hash passes until the first build, which is started in the background"""
+        started = []
+        monkeypatch.setattr(token_filter, 'start', lambda: started.append(True))
+
+        assert validate_pairs([('unknown-token', self.company.name)]) == [{'token': 'Token does not exist'}]
+        assert started == [True]
+        assert token_filter.stats()['rejected'] == 0
+
+    def test_stats(self):
+        """Test fill and sizing statistics are exposed"""
+        TokenFactory.create_batch(3, company=self.company)
+        token_filter.rebuild()
+
+        stats = token_filter.stats()
+
+        assert stats['built'] is True
+        assert stats['items'] == 3
+        assert stats['capacity'] == 1024
+        assert 0 < stats['fill_ratio'] < 1
+        assert stats['estimated_false_positive_rate'] < 0.01
+
+    def test_disabled_filter_passes_everything(self, settings):
+        """Test nothing is rejected when the filter is disabled"""
+        token_filter.rebuild()
+        settings.TOKEN_BLOOM_ENABLED = False
+
+        assert token_filter.might_contain(digest('unknown'))
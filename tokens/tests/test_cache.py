@@ -0,0 +1,119 @@
+import pytest
+
+from companies.tests.factories import CompanyFactory
+from tokens.cache import ValidationCache, validation_cache
+from tokens.models import Token
+from tokens.serializers import TokenValidationSerializer
+from tokens.tests.factories import TokenFactory
+
+
+class TestValidationCache:
+
+    def test_hit_requires_matching_company(self):
+        """Test entries only match the company they were stored for"""
+        cache = ValidationCache(max_size=10, ttl=60)
+        cache.set('hash', 'acme', 1)
+
+        assert cache.get('hash', 'acme') is True
+        assert cache.get('hash', 'other') is None
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the cache never grows beyond max_size"""
+        cache = ValidationCache(max_size=2, ttl=60)
+        cache.set('a', 'acme', 1)
+        cache.set('b', 'acme', 1)
+        cache.get('a', 'acme')
+        cache.set('c', 'acme', 1)
+
+        assert cache.get('b', 'acme') is None
+        assert cache.get('a', 'acme') is True
+        assert cache.get('c', 'acme') is True
+        assert cache.stats()['evictions'] == 1
+
+    def test_expired_entry_is_a_miss(self, monkeypatch):
+        """Test entries stop matching once their TTL has passed"""
+        now = [1000.0]
+        monkeypatch.setattr('tokens.cache.time.monotonic', lambda: now[0])
+        cache = ValidationCache(max_size=10, ttl=5)
+        cache.set('hash', 'acme', 1)
+
+        now[0] += 6
+        assert cache.get('hash', 'acme') is None
+        assert cache.stats()['size'] == 0
+
+    def test_entry_lifetime_bounded_by_token_expiry(self, monkeypatch):
+        """Test entries never outlive the token they describe"""
+        now = [1000.0]
+        monkeypatch.setattr('tokens.cache.time.monotonic', lambda: now[0])
+        cache = ValidationCache(max_size=10, ttl=60)
+        cache.set('hash', 'acme', 1, valid_for=5)
+
+        now[0] += 6
+        assert cache.get('hash', 'acme') is None
+
+    def test_invalidate_company(self):
+        """Test invalidating a company drops only its entries"""
+        cache = ValidationCache(max_size=10, ttl=60)
+        cache.set('a', 'acme', 1)
+        cache.set('b', 'other', 2)
+
+        cache.invalidate_company(1)
+
+        assert cache.get('a', 'acme') is None
+        assert cache.get('b', 'other') is True
+        assert cache.stats()['invalidations'] == 1
+
+    def test_zero_size_disables_cache(self):
+        """Test a max_size of 0 turns the cache off"""
+        cache = ValidationCache(max_size=0, ttl=60)
+        cache.set('hash', 'acme', 1)
+        assert cache.get('hash', 'acme') is None
+
+
+@pytest.mark.django_db
+class TestValidationCacheInvalidation:
+
+    def validate(self, raw_token, company_name):
+        data = {'token': raw_token, 'company_name': company_name}
+        return TokenValidationSerializer(data=data).is_valid()
+
+    def test_repeated_validation_skips_database(self, django_assert_num_queries):
+        """Test a cached validation does not query the database"""
+        token = TokenFactory(token="cached-token")
+        assert self.validate('cached-token', token.company.name)
+
+        with django_assert_num_queries(0):
+            assert self.validate('cached-token', token.company.name)
+
+    def test_deactivating_token_evicts_entry(self):
+        """Test saving an inactive token drops its cached validation"""
+        token = TokenFactory(token="cached-token")
+        assert self.validate('cached-token', token.company.name)
+
+        token.active = False
+        token.save()
+
+        assert validation_cache.get(Token.digest_token('cached-token'), token.company.name) is None
+        assert not self.validate('cached-token', token.company.name)
+
+    def test_deactivating_company_evicts_entries(self):
+        """Test saving an inactive company drops its cached validations"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token="cached-token")
+        assert self.validate('cached-token', company.name)
+
+        company.active = False
+        company.save()
+
+        assert not self.validate('cached-token', company.name)
+
+    def test_deleting_token_evicts_entry(self):
+        """Test deleting a token drops its cached validation"""
+        token = TokenFactory(token="cached-token")
+        assert self.validate('cached-token', token.company.name)
+
+        token.delete()
+
+        assert not self.validate('cached-token', token.company.name)
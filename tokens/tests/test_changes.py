@@ -0,0 +1,273 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import AsyncClient
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from companies.tests.factories import CompanyFactory
+from tokens.issuance import issue_tokens
+from tokens.models import Token, TokenChange
+from tokens.revocation import revoke_company_tokens, revoke_tokens
+from tokens.signed import sign_token
+from tokens.tests.factories import TokenFactory
+
+KEY = 'feed-key'
+
+
+def create_token(company):
+    """Save a token the way issuance does, with its hash set before the INSERT"""
+    token = Token.build(company)[1]
+    token.save()
+    return token
+
+
+def kinds():
+    return list(TokenChange.objects.order_by('pk').values_list('kind', flat=True))
+
+
+def parse_events(body):
+    """Split a Server-Sent Events body into (id, event, data) tuples"""
+    events = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith((':', 'retry')))
+        if 'event' in fields:
+            events.append((fields.get('id'), fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.mark.django_db
+class TestChangeLog:
+
+    def test_token_lifecycle_is_logged(self):
+        """Test creating, revoking, reactivating and deleting a token each add an entry"""
+        company = CompanyFactory(name='acme')
+        token = create_token(company)
+        revoke_tokens(company, [])
+        Token.objects.filter(pk=token.pk).update(active=False)
+        token.refresh_from_db()
+        token.active = True
+        token.save()
+        token.save()
+        token.delete()
+
+        assert kinds() == ['token_created', 'token_activated', 'token_deleted']
+        assert set(TokenChange.objects.values_list('token_hash', flat=True)) == {bytes(token.token_hash)}
+        assert set(TokenChange.objects.values_list('company_name', flat=True)) == {'acme'}
+
+    def test_queryset_delete_is_logged_with_one_insert(self, django_assert_num_queries):
+        """Test a queryset delete looks the company names up once and logs its tokens in one INSERT"""
+        companies = [CompanyFactory(name='acme'), CompanyFactory(name='globex')]
+        tokens = [create_token(company) for company in companies * 3]
+        TokenChange.objects.all().delete()
+
+        # SAVEPOINT, SELECT tokens, DELETE, SELECT company names, INSERT, RELEASE SAVEPOINT
+        with django_assert_num_queries(6):
+            Token.objects.filter(pk__in=[token.pk for token in tokens]).delete()
+
+        assert kinds() == ['token_deleted'] * 6
+        assert sorted(TokenChange.objects.values_list('company_name', flat=True)) == ['acme'] * 3 + ['globex'] * 3
+
+    def test_revocations_are_logged(self):
+        """Test set-based revocations log the tokens they changed and nothing else"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='one')
+        TokenFactory(company=company, token='two')
+        signed_token, claims = sign_token(company)
+        TokenChange.objects.all().delete()
+
+        revoke_tokens(company, ['one', 'unknown', signed_token])
+        revoke_tokens(company, ['one'])
+        revoke_company_tokens(company)
+        revoke_company_tokens(company)
+
+        assert kinds() == ['signed_token_revoked', 'token_deactivated', 'company_tokens_deactivated']
+        assert TokenChange.objects.get(kind='signed_token_revoked').jti == claims['jti']
+        assert bytes(TokenChange.objects.get(kind='token_deactivated').token_hash) == Token.digest_token('one')
+
+    def test_company_changes_are_logged(self):
+        """Test deactivation, reactivation and deletion of a company, without an entry per deleted token"""
+        company = CompanyFactory()
+        TokenFactory(company=company)
+        TokenChange.objects.all().delete()
+
+        company.deactivate()
+        company = type(company).objects.get(pk=company.pk)
+        company.active = True
+        company.save()
+        company.delete()
+
+        assert kinds() == ['company_deactivated', 'company_activated', 'company_deleted']
+
+    def test_bulk_issuance_is_logged(self):
+        """Test tokens issued in bulk get an entry each"""
+        company = CompanyFactory()
+
+        list(issue_tokens(company, 5, chunk_size=2))
+
+        assert kinds() == ['token_created'] * 5
+
+    def test_disabled(self, settings):
+        """Test TOKEN_CHANGES_ENABLED=False writes nothing"""
+        settings.TOKEN_CHANGES_ENABLED = False
+
+        TokenFactory()
+
+        assert not TokenChange.objects.exists()
+
+
+@pytest.mark.django_db
+class TestTokenChangesView:
+
+    @pytest.fixture(autouse=True)
+    def feed(self, settings):
+        settings.TOKEN_CHANGES_KEY = KEY
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {KEY}')
+        self.url = '/api/tokens/changes/'
+        self.company = CompanyFactory(name='acme')
+
+    def test_pages_through_changes(self):
+        """Test changes are returned in sequence order with a cursor for the next page"""
+        tokens = [create_token(self.company) for _ in range(3)]
+
+        first = self.client.get(self.url, {'limit': 2})
+        second = self.client.get(self.url, {'since': first.data['next']})
+
+        assert first.status_code == status.HTTP_200_OK
+        assert first.data['has_more'] is True
+        assert second.data['has_more'] is False
+        changes = first.data['changes'] + second.data['changes']
+        assert [change['token_hash'] for change in changes] == [bytes(token.token_hash).hex() for token in tokens]
+        assert changes[0]['kind'] == 'token_created'
+        assert changes[0]['company_name'] == 'acme'
+        assert self.client.get(self.url, {'since': second.data['next']}).data == {
+            'changes': [], 'next': second.data['next'], 'has_more': False,
+        }
+
+    def test_requires_the_key(self, settings):
+        """Test the feed needs the bearer key and is closed without one configured"""
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer wrong')
+        assert self.client.get(self.url).status_code == status.HTTP_403_FORBIDDEN
+
+        settings.TOKEN_CHANGES_KEY = ''
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ')
+        assert self.client.get(self.url).status_code == status.HTTP_403_FORBIDDEN
+
+    def test_waits_for_recent_gaps(self, settings):
+        """Test reads stop before a fresh gap in the sequence and skip it once it is old"""
+        tokens = [create_token(self.company) for _ in range(3)]
+        changes = list(TokenChange.objects.order_by('pk'))
+        changes[1].delete()
+
+        response = self.client.get(self.url)
+        assert [change['seq'] for change in response.data['changes']] == [changes[0].pk]
+
+        settings.TOKEN_CHANGES_GAP_TIMEOUT = 0
+        response = self.client.get(self.url, {'since': response.data['next']})
+        assert [change['token_hash'] for change in response.data['changes']] == [bytes(tokens[2].token_hash).hex()]
+
+    def test_compacted_cursor_is_gone(self):
+        """Test a cursor older than the retained log gets 410 Gone"""
+        for _ in range(3):
+            TokenFactory(company=self.company)
+        first = TokenChange.objects.order_by('pk').first().pk
+        TokenChange.objects.filter(pk__lt=first + 2).delete()
+
+        assert self.client.get(self.url, {'since': first}).status_code == status.HTTP_410_GONE
+        assert self.client.get(self.url, {'since': first + 1}).status_code == status.HTTP_200_OK
+        assert self.client.get(self.url).status_code == status.HTTP_200_OK
+
+    def test_limit_is_capped(self, settings):
+        """Test pages cannot exceed TOKEN_CHANGES_PAGE_SIZE"""
+        settings.TOKEN_CHANGES_PAGE_SIZE = 10
+
+        response = self.client.get(self.url, {'limit': 11})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'limit' in response.data
+
+
+@pytest.mark.django_db
+class TestTokenChangeStream:
+
+    @pytest.fixture(autouse=True)
+    def feed(self, settings):
+        settings.TOKEN_CHANGES_KEY = KEY
+        # One pass over the log per request
+        settings.TOKEN_CHANGES_STREAM_MAX_AGE = 0
+        self.company = CompanyFactory(name='acme')
+
+    def test_streams_events_after_last_event_id(self, client):
+        """Test entries are pushed as events and a reconnect resumes after Last-Event-ID"""
+        TokenFactory(company=self.company)
+        TokenFactory(company=self.company)
+        first = TokenChange.objects.order_by('pk').first().pk
+
+        response = client.get('/api/tokens/changes/stream/', HTTP_AUTHORIZATION=f'Bearer {KEY}')
+        resumed = client.get(
+            '/api/tokens/changes/stream/', HTTP_AUTHORIZATION=f'Bearer {KEY}', HTTP_LAST_EVENT_ID=str(first),
+        )
+
+        assert response['Content-Type'] == 'text/event-stream'
+        events = parse_events(b''.join(response.streaming_content))
+        assert [(event_id, event) for event_id, event, _ in events] == [
+            (str(first), 'token_created'), (str(first + 1), 'token_created'),
+        ]
+        assert events[0][2]['company_name'] == 'acme'
+        assert [event_id for event_id, *_ in parse_events(b''.join(resumed.streaming_content))] == [str(first + 1)]
+
+    def test_keepalive_and_reset(self, client, settings):
+        """Test idle streams send keepalives and compacted cursors get a reset event"""
+        settings.TOKEN_CHANGES_STREAM_HEARTBEAT = 0
+        for _ in range(3):
+            TokenFactory(company=self.company)
+        first, latest = TokenChange.objects.order_by('pk').values_list('pk', flat=True)[::2]
+        TokenChange.objects.filter(pk__lt=latest).delete()
+
+        idle = client.get(f'/api/tokens/changes/stream/?since={latest}', HTTP_AUTHORIZATION=f'Bearer {KEY}')
+        gone = client.get(f'/api/tokens/changes/stream/?since={first}', HTTP_AUTHORIZATION=f'Bearer {KEY}')
+
+        assert b': keepalive' in b''.join(idle.streaming_content)
+        assert [event for _, event, _ in parse_events(b''.join(gone.streaming_content))] == ['reset']
+
+    def test_requires_the_key(self, client):
+        """Test the stream needs the bearer key"""
+        assert client.get('/api/tokens/changes/stream/').status_code == status.HTTP_403_FORBIDDEN
+
+    def test_async_stream(self):
+        """Test the ASGI stream pushes the same events"""
+        TokenFactory(company=self.company)
+
+        async def body():
+            response = await AsyncClient().get(
+                '/api/tokens/changes/stream/async/', headers={'Authorization': f'Bearer {KEY}'},
+            )
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        assert [event for _, event, _ in parse_events(async_to_sync(body)())] == ['token_created']
+
+
+@pytest.mark.django_db
+class TestCompactTokenChangesCommand:
+
+    def test_deletes_old_entries_but_keeps_the_newest(self):
+        """Test entries past retention are deleted, except the newest one"""
+        for _ in range(3):
+            TokenFactory()
+        TokenChange.objects.update(created_at=timezone.now() - timedelta(days=10))
+        TokenFactory()
+        TokenChange.objects.filter(pk=TokenChange.objects.order_by('pk').last().pk).update(
+            created_at=timezone.now() - timedelta(days=10),
+        )
+        out = StringIO()
+
+        call_command('compact_token_changes', days=7, batch_size=2, stdout=out)
+
+        assert TokenChange.objects.count() == 1
+        assert 'Deleted 3 change log entries' in out.getvalue()
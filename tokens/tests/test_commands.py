@@ -0,0 +1,146 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from companies.models import Company
+from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
+from tokens.issuance import issue_tokens
+from tokens.models import SignedTokenRevocation, Token, TokenChange
+from tokens.tests.factories import InactiveTokenFactory, TokenFactory
+
+
+@pytest.mark.django_db
+class TestIssueTokensCommand:
+
+    def test_issues_tokens_as_ndjson(self):
+        """Test the command inserts and prints the requested number of tokens"""
+        company = CompanyFactory()
+        out = StringIO()
+
+        call_command('issue_tokens', company.name, count=5, chunk_size=2, stdout=out)
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert len(lines) == 5
+        assert Token.objects.filter(company=company).count() == 5
+        for line in lines:
+            assert line['company_name'] == company.name
+            assert Token.objects.filter(token_hash=Token.digest_token(line['token'])).exists()
+
+    def test_inactive_company_rejected(self):
+        """Test tokens are not issued for inactive companies"""
+        company = InactiveCompanyFactory()
+
+        with pytest.raises(CommandError):
+            call_command('issue_tokens', company.name, count=1, stdout=StringIO())
+        assert not Token.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestIssueTokens:
+
+    def test_chunks_commit_before_they_are_yielded(self):
+        """Test a generator closed early keeps the chunks already handed out"""
+        company = CompanyFactory()
+        tokens = issue_tokens(company, 5, chunk_size=2)
+
+        raw_token, _ = next(tokens)
+        tokens.close()
+
+        assert Token.objects.filter(company=company).count() == 2
+        assert Token.objects.filter(token_hash=Token.digest_token(raw_token)).exists()
+
+
+@pytest.mark.django_db
+class TestPurgeTokensCommand:
+
+    def test_purges_expired_and_inactive_tokens(self):
+        """Test only expired and inactive tokens are deleted"""
+        live = TokenFactory()
+        TokenFactory(expires_at=timezone.now() + timedelta(hours=1))
+        InactiveTokenFactory()
+        TokenFactory(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+
+        call_command('purge_tokens', batch_size=2, stdout=out)
+
+        assert Token.objects.count() == 2
+        assert Token.objects.filter(pk=live.pk).exists()
+        assert 'Deleted 2 tokens' in out.getvalue()
+        assert 'rows/s' in out.getvalue()
+        assert TokenChange.objects.filter(kind=TokenChange.TOKEN_DELETED).count() == 2
+
+    def test_dry_run_keeps_rows(self):
+        """Test a dry run only counts matching tokens"""
+        InactiveTokenFactory()
+        out = StringIO()
+
+        call_command('purge_tokens', dry_run=True, stdout=out)
+
+        assert Token.objects.count() == 1
+        assert 'Would delete 1 tokens' in out.getvalue()
+
+    def test_purges_expired_signed_token_revocations(self):
+        """Test revocations are dropped once their token has expired"""
+        company = CompanyFactory()
+        SignedTokenRevocation.objects.create(
+            jti='expired', company=company, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        SignedTokenRevocation.objects.create(
+            jti='live', company=company, expires_at=timezone.now() + timedelta(hours=1)
+        )
+
+        call_command('purge_tokens', stdout=StringIO())
+
+        assert list(SignedTokenRevocation.objects.values_list('jti', flat=True)) == ['live']
+
+
+@pytest.mark.django_db
+class TestBenchTokensCommand:
+
+    def test_reports_and_saves_results(self, tmp_path):
+        """Test every scenario is reported and saved, and seeded rows are removed"""
+        output = tmp_path / 'bench.json'
+        out = StringIO()
+
+        call_command(
+            'bench_tokens', companies=4, tokens_per_company=2, inactive_fraction=0.25,
+            requests=5, in_place=True, output=str(output), stdout=out,
+        )
+
+        results = json.loads(output.read_text())
+        assert results['meta']['companies'] == 4
+        assert results['meta']['tokens'] == 8
+        for scenario in ('validate_mostly_valid', 'validate_wrong_company', 'generate_burst'):
+            assert scenario in out.getvalue()
+            assert results['scenarios'][scenario]['requests'] == 5
+            assert results['scenarios'][scenario]['p99_ms'] >= results['scenarios'][scenario]['p50_ms']
+        assert results['scenarios']['validate_wrong_company']['status_codes'] == {'400': 5}
+        assert results['scenarios']['validate_inactive_company']['status_codes'] == {'400': 5}
+        assert results['scenarios']['register_company']['status_codes'] == {'201': 5}
+        # Credentials SELECT, token INSERT and its change log INSERT
+        assert results['scenarios']['generate_burst']['queries_per_request'] == 3
+        assert not Company.objects.exists()
+        assert not Token.objects.exists()
+
+    def test_compares_against_baseline(self, tmp_path):
+        """Test a saved run can be used as the baseline of the next one"""
+        baseline = tmp_path / 'baseline.json'
+        options = dict(
+            companies=3, tokens_per_company=1, inactive_fraction=0.34, requests=3,
+            scenario=['validate_mostly_valid'], in_place=True,
+        )
+        call_command('bench_tokens', output=str(baseline), stdout=StringIO(), **options)
+        out = StringIO()
+
+        call_command('bench_tokens', compare=str(baseline), stdout=out, **options)
+
+        assert 'vs. baseline' in out.getvalue()
+
+    def test_needs_inactive_and_active_companies(self):
+        """Test the mix is rejected when a scenario would have no companies"""
+        with pytest.raises(CommandError):
+            call_command('bench_tokens', companies=2, inactive_fraction=0.5, in_place=True, stdout=StringIO())
@@ -0,0 +1,223 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from companies.tests.factories import CompanyFactory
+from tokens.index import IndexFile, build_index, token_index
+from tokens.models import Token, TokenChange
+from tokens.revocation import revoke_company_tokens, revoke_tokens
+from tokens.tests.factories import TokenFactory
+from tokens.validation import validate_pairs
+
+
+@pytest.mark.django_db
+class TestBuildIndex:
+
+    def test_records_are_sorted_and_found(self, tmp_path):
+        """Test every token is written in hash order and found by binary search"""
+        company = CompanyFactory()
+        expires_at = timezone.now() + timedelta(hours=1)
+        tokens = [TokenFactory(company=company, expires_at=expires_at) for _ in range(20)]
+        tokens[0].active = False
+        tokens[0].save()
+        path = tmp_path / 'tokens.idx'
+
+        assert build_index(path, chunk_size=7) == 20
+
+        index = IndexFile(path)
+        keys = [index[position] for position in range(len(index))]
+        assert keys == sorted(keys)
+        assert index.get(bytes(tokens[0].token_hash)) == (tokens[0].pk, company.pk, expires_at, False)
+        assert index.get(bytes(tokens[1].token_hash))[3] is True
+        assert index.get(Token.digest_token('unknown')) is None
+
+    def test_replaces_the_file_atomically(self, tmp_path):
+        """Test a rebuild swaps in a new file instead of rewriting the mapped one"""
+        TokenFactory()
+        path = tmp_path / 'tokens.idx'
+        build_index(path)
+        before = os.stat(path).st_ino
+
+        TokenFactory()
+        build_index(path)
+
+        assert os.stat(path).st_ino != before
+        assert len(IndexFile(path)) == 2
+        assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.django_db
+class TestTokenIndex:
+
+    @pytest.fixture(autouse=True)
+    def index_path(self, settings, tmp_path):
+        settings.TOKEN_INDEX_PATH = str(tmp_path / 'tokens.idx')
+        settings.TOKEN_VALIDATION_CACHE_MAX_SIZE = 0
+        self.company = CompanyFactory()
+        self.path = settings.TOKEN_INDEX_PATH
+
+    def test_indexed_tokens_validate_without_token_queries(self, django_assert_num_queries):
+        """Test tokens found in the index only need their company, which is then remembered"""
+        TokenFactory(company=self.company, token='indexed')
+        build_index(self.path)
+        token_index.refresh()
+        validate_pairs([('indexed', self.company.name)])
+
+        with django_assert_num_queries(0):
+            errors = validate_pairs([('indexed', self.company.name), ('indexed', 'someone-else')])
+
+        assert errors == [None, {'company_name': 'Token does not belong to this company'}]
+        assert token_index.stats()['hits'] == 2
+
+    def test_unknown_tokens_fall_back_to_the_database(self):
+        """Test tokens created after the last refresh still validate"""
+        build_index(self.path)
+        token_index.refresh()
+        TokenFactory(company=self.company, token='new')
+
+        assert validate_pairs([('new', self.company.name)]) == [None]
+
+    def test_overlay_picks_up_changes_since_the_build(self):
+        """Test tokens created and revoked by other processes after the build are found by the next refresh"""
+        TokenFactory(company=self.company, token='revoked')
+        build_index(self.path)
+        token_index.refresh()
+        TokenFactory(company=self.company, token='created')
+        Token.objects.filter(token_hash=Token.digest_token('revoked')).update(
+            active=False, updated_at=timezone.now(),
+        )
+        # Another process made the changes; this one has not seen them yet
+        token_index._overlay.clear()
+
+        token_index.refresh()
+
+        assert token_index.stats()['overlay'] == 2
+        assert token_index.get(Token.digest_token('created')) is not None
+        assert validate_pairs([('revoked', self.company.name)]) == [{'token': 'Token is inactive'}]
+
+    def test_overlay_picks_up_deletions_since_the_build(self):
+        """Test tokens and companies deleted by other processes after the build miss from the next refresh"""
+        other = CompanyFactory()
+        TokenFactory(company=self.company, token='deleted')
+        TokenFactory(company=self.company, token='kept')
+        TokenFactory(company=other, token='orphaned')
+        build_index(self.path)
+        token_index.refresh()
+        Token.objects.filter(token_hash=Token.digest_token('deleted')).delete()
+        other.delete()
+        # Another process made the changes; this one has not seen them yet
+        token_index._overlay.clear()
+
+        token_index.refresh()
+
+        assert token_index.get(Token.digest_token('deleted')) is None
+        assert token_index.get(Token.digest_token('orphaned')) is None
+        assert token_index.get(Token.digest_token('kept')) is not None
+        assert validate_pairs([('deleted', self.company.name)]) == [{'token': 'Token does not exist'}]
+
+    def test_revocations_in_this_process_apply_at_once(self):
+        """Test revoking tokens bypasses their stale index records before any refresh"""
+        TokenFactory(company=self.company, token='one')
+        TokenFactory(company=self.company, token='two')
+        build_index(self.path)
+        token_index.refresh()
+
+        revoke_tokens(self.company, ['one'])
+        assert validate_pairs([('one', self.company.name)]) == [{'token': 'Token is inactive'}]
+
+        revoke_company_tokens(self.company)
+        assert validate_pairs([('two', self.company.name)]) == [{'token': 'Token is inactive'}]
+
+    def test_revocation_during_a_sync_is_not_undone(self, monkeypatch):
+        """Test a sync that read a token before it was revoked does not put it back as active"""
+        token = TokenFactory(company=self.company, token='one')
+        build_index(self.path)
+        token_index.refresh()
+        token.save()
+        filter_changes = TokenChange.objects.filter
+
+        def revoke_then_filter(*args, **kwargs):
+            # The token rows have been read; the revocation lands before the overlay is updated
+            revoke_tokens(self.company, ['one'])
+            return filter_changes(*args, **kwargs)
+
+        with monkeypatch.context() as patch:
+            patch.setattr(TokenChange.objects, 'filter', revoke_then_filter)
+            token_index.refresh()
+
+        assert token_index.get(Token.digest_token('one')) is None
+        assert validate_pairs([('one', self.company.name)]) == [{'token': 'Token is inactive'}]
+
+        token_index.refresh()
+
+        assert token_index.get(Token.digest_token('one'))[3] is False
+
+    def test_deactivated_company_is_rejected(self):
+        """Test indexed tokens of a deactivated company are rejected"""
+        TokenFactory(company=self.company, token='indexed')
+        build_index(self.path)
+        token_index.refresh()
+
+        self.company.deactivate()
+
+        assert validate_pairs([('indexed', self.company.name)]) == [{'company_name': 'Company is inactive'}]
+
+    def test_replaced_file_is_remapped(self):
+        """Test a refresh maps a rebuilt file and drops the overlay it covers"""
+        build_index(self.path)
+        token_index.refresh()
+        TokenFactory(company=self.company)
+        token_index.refresh()
+        assert token_index.stats()['tokens'] == 0
+
+        build_index(self.path)
+        token_index.refresh()
+
+        assert token_index.stats()['tokens'] == 1
+
+    def test_missing_file_leaves_the_index_unmapped(self):
+        """Test validation uses the database until the index is built"""
+        TokenFactory(company=self.company, token='token')
+        token_index.refresh()
+
+        assert validate_pairs([('token', self.company.name)]) == [None]
+        assert token_index.stats()['mapped'] is False
+
+
+@pytest.mark.django_db
+class TestBuildTokenIndexCommand:
+
+    def test_builds_the_index(self, tmp_path):
+        """Test the command writes the index to --path"""
+        TokenFactory()
+        out = StringIO()
+
+        call_command('build_token_index', path=str(tmp_path / 'tokens.idx'), stdout=out)
+
+        assert 'Indexed 1 tokens' in out.getvalue()
+        assert len(IndexFile(tmp_path / 'tokens.idx')) == 1
+
+    def test_purge_rebuilds_the_index(self, settings, tmp_path):
+        """Test purge_tokens drops deleted tokens from a configured index"""
+        settings.TOKEN_INDEX_PATH = str(tmp_path / 'tokens.idx')
+        TokenFactory()
+        revoked = TokenFactory()
+        build_index(settings.TOKEN_INDEX_PATH)
+        Token.objects.filter(pk=revoked.pk).update(active=False, updated_at=timezone.now())
+        out = StringIO()
+
+        call_command('purge_tokens', stdout=out)
+
+        assert 'Rebuilt the token index with 1 tokens' in out.getvalue()
+        assert IndexFile(settings.TOKEN_INDEX_PATH).get(bytes(revoked.token_hash)) is None
+
+    def test_requires_a_path(self, settings):
+        """Test the command fails without TOKEN_INDEX_PATH or --path"""
+        settings.TOKEN_INDEX_PATH = ''
+
+        with pytest.raises(CommandError):
+            call_command('build_token_index', stdout=StringIO())
@@ -0,0 +1,143 @@
+import json
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from companies.tests.factories import CompanyFactory
+from tokens.listing import (company_tokens, decode_cursor, encode_cursor,
+                            export_tokens_ndjson, tokens_page)
+from tokens.models import Token
+from tokens.tests.factories import TokenFactory
+
+
+def create_tokens(company, count):
+    """Tokens created in pairs sharing a created_at, oldest first"""
+    tokens = [TokenFactory(company=company) for _ in range(count)]
+    start = timezone.now() - timedelta(days=1)
+    for index, token in enumerate(tokens):
+        Token.objects.filter(pk=token.pk).update(created_at=start + timedelta(seconds=index // 2))
+    return tokens
+
+
+@pytest.mark.django_db
+class TestTokensPage:
+
+    def test_pages_cover_every_token_once_newest_first(self):
+        """Test walking the cursors returns each token once, including ties on created_at"""
+        company = CompanyFactory()
+        tokens = create_tokens(company, 5)
+        TokenFactory()
+
+        seen, cursor = [], None
+        while True:
+            page = tokens_page(company, cursor and decode_cursor(cursor), limit=2)
+            seen += [token['id'] for token in page['tokens']]
+            cursor = page['next']
+            if cursor is None:
+                break
+
+        assert seen == [token.pk for token in reversed(tokens)]
+        assert page['tokens'][-1]['token_hash'] == bytes(tokens[0].token_hash).hex()
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode to the position they encode and malformed ones are rejected"""
+        created_at = timezone.now()
+
+        assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+        for cursor in ('', 'not-base64!', encode_cursor(created_at, 42)[:-4]):
+            with pytest.raises(ValueError):
+                decode_cursor(cursor)
+
+    def test_ordered_scans_use_the_composite_index(self):
+        """Test the listing order is served by token_company_created_idx"""
+        company = CompanyFactory()
+
+        plan = company_tokens(company).order_by('-created_at', '-pk').explain()
+
+        assert 'token_company_created_idx' in plan
+
+
+@pytest.mark.django_db
+class TestTokenExport:
+
+    def test_streams_every_token_with_one_query(self, django_assert_num_queries):
+        """Test the export yields a JSON line per token, oldest first, from a single query"""
+        company = CompanyFactory()
+        tokens = create_tokens(company, 5)
+        TokenFactory()
+
+        with django_assert_num_queries(1):
+            lines = list(export_tokens_ndjson(company, chunk_size=2))
+
+        rows = [json.loads(line) for line in lines]
+        assert [row['id'] for row in rows] == [token.pk for token in tokens]
+        assert rows[0]['active'] is True
+        assert rows[0]['last_used_at'] is None
+
+
+@pytest.mark.django_db
+class TestTokenListView:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = reverse('token-list')
+        self.company = CompanyFactory(password='test123')
+
+    def test_lists_tokens_page_by_page(self):
+        """Test GET lists the company's tokens with a cursor for the next page"""
+        tokens = create_tokens(self.company, 3)
+
+        first = self.client.get(self.url, {'company': self.company.name, 'limit': 2}, HTTP_X_COMPANY_PASSWORD='test123')
+        second = self.client.get(
+            self.url, {'company': self.company.name, 'cursor': first.data['next']}, HTTP_X_COMPANY_PASSWORD='test123',
+        )
+
+        assert first.status_code == status.HTTP_200_OK
+        assert [token['id'] for token in first.data['tokens']] == [tokens[2].pk, tokens[1].pk]
+        assert [token['id'] for token in second.data['tokens']] == [tokens[0].pk]
+        assert second.data['next'] is None
+
+    def test_listing_is_separate_from_generation(self):
+        """Test listing has its own URL name, so metrics and rate limits tell it apart"""
+        response = self.client.get(self.url, {'company': self.company.name}, HTTP_X_COMPANY_PASSWORD='test123')
+        generate = self.client.get(reverse('token-generate'), {'company': self.company.name})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.wsgi_request.resolver_match.url_name == 'token-list'
+        assert generate.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_requires_the_password_header(self):
+        """Test credentials come from X-Company-Password and never from the query string"""
+        response = self.client.get(self.url, {'company': self.company.name, 'password': 'test123'})
+        wrong = self.client.get(self.url, {'company': self.company.name}, HTTP_X_COMPANY_PASSWORD='wrong')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'password' in response.data
+        assert 'Invalid credentials' in str(wrong.data)
+
+    def test_rejects_bad_cursor_and_limit(self, settings):
+        """Test malformed cursors and oversized pages are rejected"""
+        settings.TOKEN_LIST_MAX_PAGE_SIZE = 10
+
+        response = self.client.get(
+            self.url, {'company': self.company.name, 'cursor': 'bogus', 'limit': 11}, HTTP_X_COMPANY_PASSWORD='test123',
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert set(response.data) == {'cursor', 'limit'}
+
+    def test_export(self):
+        """Test the export endpoint streams the company's tokens as NDJSON"""
+        create_tokens(self.company, 3)
+
+        response = self.client.get(
+            reverse('token-export'), {'company': self.company.name}, HTTP_X_COMPANY_PASSWORD='test123',
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'application/x-ndjson'
+        assert len(b''.join(response.streaming_content).splitlines()) == 3
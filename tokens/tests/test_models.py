@@ -1,4 +1,7 @@
+from datetime import timedelta
+
 import pytest
+from django.utils import timezone
 from tokens.models import Token
 from tokens.tests.factories import TokenFactory, InactiveTokenFactory
 from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
@@ -24,13 +27,21 @@ class TestTokenModel:
     def test_token_hashing(self):
         """Test token hashing functionality"""
         raw_token = "test-token-123"
-        hashed = Token.hash_token(raw_token)
+        hashed = Token.digest_token(raw_token)
         
         # Create token with this raw token
         token = TokenFactory.build()
         token.set_token(raw_token)
         
         assert token.token_hash == hashed
+        assert len(token.token_hash) == 32
+        assert Token.hash_token(raw_token) == hashed.hex()
+
+    def test_token_lookup_by_digest(self):
+        """Test stored tokens are found by their binary digest"""
+        token = TokenFactory(token="test-token-123")
+        found = Token.objects.get(token_hash=Token.digest_token("test-token-123"))
+        assert found == token
 
     def test_token_validation_active_company_active_token(self):
         """Test token is valid when both company and token are active"""
@@ -55,3 +66,15 @@ class TestTokenModel:
         company = InactiveCompanyFactory()
         token = InactiveTokenFactory(company=company)
         assert token.is_valid() is False
+
+    def test_token_validation_expired_token(self):
+        """Test token is invalid once it has expired"""
+        token = TokenFactory(expires_at=timezone.now() - timedelta(seconds=1))
+        assert token.is_expired() is True
+        assert token.is_valid() is False
+
+    def test_token_validation_unexpired_token(self):
+        """Test token is valid until it expires"""
+        token = TokenFactory(expires_at=timezone.now() + timedelta(hours=1))
+        assert token.is_expired() is False
+        assert token.is_valid() is True
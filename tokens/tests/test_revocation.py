@@ -0,0 +1,140 @@
+import pytest
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from companies.tests.factories import CompanyFactory
+from tokens.cache import validation_cache
+from tokens.models import SignedTokenRevocation, Token
+from tokens.revocation import revoke_company_tokens, revoke_tokens
+from tokens.signed import sign_token
+from tokens.tests.factories import TokenFactory
+from tokens.validation import validate_pairs
+
+
+@pytest.mark.django_db
+class TestRevokeTokens:
+
+    def test_revokes_in_constant_queries(self, django_assert_num_queries):
+        """Test any number of tokens is revoked with a single SELECT, UPDATE and change log INSERT"""
+        company = CompanyFactory()
+        raw_tokens = [f'token-{index}' for index in range(20)]
+        for raw_token in raw_tokens:
+            TokenFactory(company=company, token=raw_token)
+
+        # Plus the savepoint and its release
+        with django_assert_num_queries(5):
+            assert revoke_tokens(company, raw_tokens) == 20
+
+        assert not Token.objects.filter(active=True).exists()
+
+    def test_only_counts_the_company_s_active_tokens(self):
+        """Test tokens of other companies and already revoked ones are left alone"""
+        company = CompanyFactory()
+        TokenFactory(company=company, token='mine')
+        TokenFactory(token='theirs')
+
+        assert revoke_tokens(company, ['mine', 'theirs', 'unknown']) == 1
+        assert revoke_tokens(company, ['mine']) == 0
+        assert Token.objects.get(token_hash=Token.digest_token('theirs')).active is True
+
+    def test_cached_validations_are_dropped(self):
+        """Test a revoked token stops validating in this process immediately"""
+        token = TokenFactory(token='cached-token')
+        pair = ('cached-token', token.company.name)
+        validate_pairs([pair])
+        assert validation_cache.stats()['size'] == 1
+
+        revoke_tokens(token.company, ['cached-token'])
+
+        assert validation_cache.stats()['size'] == 0
+        assert validate_pairs([pair]) == [{'token': 'Token is inactive'}]
+
+    def test_signed_tokens_are_revoked(self, django_assert_num_queries):
+        """Test signed tokens of the company get a revocation row"""
+        company = CompanyFactory()
+        raw_token, claims = sign_token(company)
+        other_token, _ = sign_token(CompanyFactory())
+
+        with django_assert_num_queries(5):
+            assert revoke_tokens(company, [raw_token, other_token]) == 1
+
+        assert list(SignedTokenRevocation.objects.values_list('jti', flat=True)) == [claims['jti']]
+        assert validate_pairs([(raw_token, company.name)]) == [{'token': 'Token is inactive'}]
+        assert revoke_tokens(company, [raw_token]) == 0
+
+    def test_revoke_company_tokens(self, django_assert_num_queries):
+        """Test every token of a company is revoked at once and dropped from the cache"""
+        company = CompanyFactory()
+        for index in range(5):
+            TokenFactory(company=company, token=f'token-{index}')
+        TokenFactory(token='other')
+        validate_pairs([('token-0', company.name)])
+
+        # The UPDATE and one change log entry, inside a savepoint
+        with django_assert_num_queries(4):
+            assert revoke_company_tokens(company) == 5
+
+        assert Token.objects.filter(active=True).count() == 1
+        assert validate_pairs([('token-0', company.name)]) == [{'token': 'Token is inactive'}]
+
+
+@pytest.mark.django_db
+class TestRevocationViews:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.company = CompanyFactory(password='test123')
+        self.credentials = {'company_name': self.company.name, 'password': 'test123'}
+
+    def test_revoke_token(self):
+        """Test a single token is revoked and the count returned"""
+        TokenFactory(company=self.company, token='revoke-me')
+
+        response = self.client.post('/api/tokens/revoke/', {**self.credentials, 'token': 'revoke-me'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'revoked': 1}
+
+    def test_revoke_batch(self):
+        """Test a list of tokens is revoked"""
+        for raw_token in ('a', 'b', 'c'):
+            TokenFactory(company=self.company, token=raw_token)
+
+        response = self.client.post(
+            '/api/tokens/revoke/batch/', {**self.credentials, 'tokens': ['a', 'b', 'x']}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'revoked': 2}
+
+    def test_revoke_batch_size_is_capped(self, settings):
+        """Test batches above TOKEN_REVOCATION_BATCH_MAX_SIZE are rejected"""
+        settings.TOKEN_REVOCATION_BATCH_MAX_SIZE = 2
+
+        response = self.client.post(
+            '/api/tokens/revoke/batch/', {**self.credentials, 'tokens': ['a', 'b', 'c']}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'tokens' in response.data
+
+    def test_revoke_all(self):
+        """Test every token of the company is revoked"""
+        TokenFactory(company=self.company)
+        TokenFactory(company=self.company)
+
+        response = self.client.post('/api/tokens/revoke/all/', self.credentials, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'revoked': 2}
+
+    def test_invalid_credentials(self):
+        """Test tokens can only be revoked by their own company"""
+        TokenFactory(company=self.company, token='revoke-me')
+
+        response = self.client.post(
+            '/api/tokens/revoke/', {**self.credentials, 'password': 'wrong', 'token': 'revoke-me'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Token.objects.get().active is True
@@ -1,9 +1,14 @@
+from datetime import timedelta
+
 import pytest
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
 from tokens.models import Token
-from tokens.serializers import (TokenGenerationSerializer,
+from tokens.serializers import (TokenBatchValidationSerializer,
+                                TokenBulkGenerationSerializer,
+                                TokenGenerationSerializer,
                                 TokenValidationSerializer)
 from tokens.tests.factories import InactiveTokenFactory, TokenFactory
 
@@ -27,6 +32,22 @@ class TestTokenGenerationSerializer:
         assert 'token_obj' in result
         assert len(result['token']) > 0
         assert result['token_obj'].company == company
+        assert result['token_obj'].expires_at is None
+
+    def test_token_expiry_follows_company_ttl(self):
+        """Test new tokens expire after the company's token TTL"""
+        company = CompanyFactory(password="test123", token_ttl=60)
+        data = {
+            'company_name': company.name,
+            'password': 'test123'
+        }
+        
+        serializer = TokenGenerationSerializer(data=data)
+        assert serializer.is_valid()
+        
+        token = serializer.create(serializer.validated_data)['token_obj']
+        assert token.expires_at is not None
+        assert token.expires_at <= timezone.now() + timedelta(seconds=60)
 
     def test_invalid_company_name(self):
         """Test token generation with non-existent company"""
@@ -62,6 +83,39 @@ class TestTokenGenerationSerializer:
         assert not serializer.is_valid()
 
 
+@pytest.mark.django_db
+class TestTokenBulkGenerationSerializer:
+
+    def test_valid_bulk_request(self):
+        """Test credentials are checked once and the count is kept"""
+        company = CompanyFactory(password="test123")
+        data = {'company_name': company.name, 'password': 'test123', 'count': 10}
+
+        serializer = TokenBulkGenerationSerializer(data=data)
+        assert serializer.is_valid()
+        assert serializer.validated_data['company'] == company
+        assert serializer.validated_data['count'] == 10
+
+    def test_count_limit(self, settings):
+        """Test counts above TOKEN_BULK_MAX_COUNT are rejected"""
+        settings.TOKEN_BULK_MAX_COUNT = 5
+        company = CompanyFactory(password="test123")
+        data = {'company_name': company.name, 'password': 'test123', 'count': 6}
+
+        serializer = TokenBulkGenerationSerializer(data=data)
+        assert not serializer.is_valid()
+        assert 'count' in serializer.errors
+
+    def test_wrong_password_rejected(self):
+        """Test bulk issuance rejected for wrong password"""
+        company = CompanyFactory(password="correct123")
+        data = {'company_name': company.name, 'password': 'wrong123', 'count': 1}
+
+        serializer = TokenBulkGenerationSerializer(data=data)
+        assert not serializer.is_valid()
+        assert 'non_field_errors' in serializer.errors
+
+
 @pytest.mark.django_db
 class TestTokenValidationSerializer:
     
@@ -93,3 +147,123 @@ class TestTokenValidationSerializer:
         assert not serializer.is_valid()
         assert 'company_name' in serializer.errors
         assert 'Token does not belong to this company' in str(serializer.errors['company_name'])
+
+
+@pytest.mark.django_db
+class TestTokenValidationQueryCount:
+
+    def assert_single_query(self, django_assert_num_queries, data):
+        serializer = TokenValidationSerializer(data=data)
+        with django_assert_num_queries(1):
+            is_valid = serializer.is_valid()
+        return is_valid, serializer.errors
+
+    def test_valid_token_uses_one_query(self, django_assert_num_queries):
+        """Test a valid token is resolved with a single query"""
+        token = TokenFactory(token="test-token-123")
+        data = {'token': 'test-token-123', 'company_name': token.company.name}
+
+        is_valid, _ = self.assert_single_query(django_assert_num_queries, data)
+        assert is_valid
+
+    def test_nonexistent_token_uses_one_query(self, django_assert_num_queries):
+        """Test 'Token does not exist' is resolved with a single query"""
+        company = CompanyFactory()
+        data = {'token': 'non-existent-token', 'company_name': company.name}
+
+        is_valid, errors = self.assert_single_query(django_assert_num_queries, data)
+        assert not is_valid
+        assert 'Token does not exist' in str(errors['token'])
+
+    def test_wrong_company_uses_one_query(self, django_assert_num_queries):
+        """Test 'Token does not belong to this company' is resolved with a single query"""
+        TokenFactory(token="test-token-123")
+        other_company = CompanyFactory()
+        data = {'token': 'test-token-123', 'company_name': other_company.name}
+
+        is_valid, errors = self.assert_single_query(django_assert_num_queries, data)
+        assert not is_valid
+        assert 'Token does not belong to this company' in str(errors['company_name'])
+
+    def test_inactive_token_uses_one_query(self, django_assert_num_queries):
+        """Test 'Token is inactive' is resolved with a single query"""
+        token = InactiveTokenFactory(token="inactive-token")
+        data = {'token': 'inactive-token', 'company_name': token.company.name}
+
+        is_valid, errors = self.assert_single_query(django_assert_num_queries, data)
+        assert not is_valid
+        assert 'Token is inactive' in str(errors['token'])
+
+    def test_inactive_company_uses_one_query(self, django_assert_num_queries):
+        """Test 'Company is inactive' is resolved with a single query"""
+        company = InactiveCompanyFactory()
+        TokenFactory(company=company, token="company-inactive-token")
+        data = {'token': 'company-inactive-token', 'company_name': company.name}
+
+        is_valid, errors = self.assert_single_query(django_assert_num_queries, data)
+        assert not is_valid
+        assert 'Company is inactive' in str(errors['company_name'])
+
+    def test_expired_token_uses_one_query(self, django_assert_num_queries):
+        """Test 'Token has expired' is resolved with a single query"""
+        token = TokenFactory(token="expired-token", expires_at=timezone.now() - timedelta(seconds=1))
+        data = {'token': 'expired-token', 'company_name': token.company.name}
+
+        is_valid, errors = self.assert_single_query(django_assert_num_queries, data)
+        assert not is_valid
+        assert 'Token has expired' in str(errors['token'])
+
+
+@pytest.mark.django_db
+class TestTokenBatchValidationSerializer:
+
+    def test_results_follow_input_order(self):
+        """Test each item gets the same outcome as single validation"""
+        token = TokenFactory(token="valid-token")
+        inactive = InactiveTokenFactory(token="inactive-token")
+        other_company = CompanyFactory()
+        data = {'tokens': [
+            {'token': 'valid-token', 'company_name': token.company.name},
+            {'token': 'missing-token', 'company_name': token.company.name},
+            {'token': 'valid-token', 'company_name': other_company.name},
+            {'token': 'inactive-token', 'company_name': inactive.company.name},
+        ]}
+
+        serializer = TokenBatchValidationSerializer(data=data)
+        assert serializer.is_valid()
+        assert serializer.validated_data['results'] == [
+            {'valid': True},
+            {'valid': False, 'errors': {'token': ['Token does not exist']}},
+            {'valid': False, 'errors': {'company_name': ['Token does not belong to this company']}},
+            {'valid': False, 'errors': {'token': ['Token is inactive']}},
+        ]
+
+    def test_batch_uses_one_query(self, django_assert_num_queries):
+        """Test the query count does not grow with the batch size"""
+        company = CompanyFactory()
+        raw_tokens = [f"batch-token-{n}" for n in range(20)]
+        for raw_token in raw_tokens:
+            TokenFactory(company=company, token=raw_token)
+        data = {'tokens': [
+            {'token': raw_token, 'company_name': company.name} for raw_token in raw_tokens
+        ]}
+
+        serializer = TokenBatchValidationSerializer(data=data)
+        with django_assert_num_queries(1):
+            assert serializer.is_valid()
+        assert all(result['valid'] for result in serializer.validated_data['results'])
+
+    def test_batch_size_limit(self, settings):
+        """Test batches larger than the configured maximum are rejected"""
+        settings.TOKEN_VALIDATION_BATCH_MAX_SIZE = 2
+        data = {'tokens': [{'token': 't', 'company_name': 'c'}] * 3}
+
+        serializer = TokenBatchValidationSerializer(data=data)
+        assert not serializer.is_valid()
+        assert 'tokens' in serializer.errors
+
+    def test_empty_batch_rejected(self):
+        """Test an empty batch is rejected"""
+        serializer = TokenBatchValidationSerializer(data={'tokens': []})
+        assert not serializer.is_valid()
+        assert 'tokens' in serializer.errors
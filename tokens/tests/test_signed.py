@@ -0,0 +1,132 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+
+from companies.models import Company
+from companies.tests.factories import CompanyFactory
+from tokens.models import SignedTokenRevocation
+from tokens.serializers import (TokenGenerationSerializer,
+                                TokenValidationSerializer)
+from tokens.signed import (read_token, revocations, revoke_signed_token,
+                           sign_token)
+from tokens.validation import avalidate_pairs, validate_pairs
+
+
+@pytest.mark.django_db
+class TestSignedTokens:
+
+    def test_round_trip(self):
+        """Test a signed token carries its claims"""
+        company = CompanyFactory()
+        raw_token, claims = sign_token(company, ttl=60)
+
+        assert raw_token.startswith('st1:')
+        assert read_token(raw_token) == claims
+        assert claims['c'] == company.pk
+        assert claims['exp'] - claims['iat'] == 60
+
+    def test_ttl_falls_back_only_when_unset(self, settings):
+        """Test the company's TTL and then TOKEN_SIGNED_TTL apply only when no TTL is given"""
+        settings.TOKEN_SIGNED_TTL = 300
+        _, company_claims = sign_token(CompanyFactory(token_ttl=120))
+        _, default_claims = sign_token(CompanyFactory())
+
+        assert company_claims['exp'] - company_claims['iat'] == 120
+        assert default_claims['exp'] - default_claims['iat'] == 300
+
+    def test_non_positive_ttl_is_rejected(self):
+        """Test a zero or negative TTL raises instead of falling back to the defaults"""
+        company = CompanyFactory()
+
+        with pytest.raises(ValueError):
+            sign_token(company, ttl=0)
+        with pytest.raises(ValueError):
+            sign_token(company, ttl=-5)
+
+    def test_tampered_token_does_not_exist(self):
+        """Test a token with a bad signature is rejected without a query"""
+        company = CompanyFactory()
+        raw_token, _ = sign_token(company)
+
+        assert validate_pairs([(raw_token[:-2] + 'xx', company.name)]) == [
+            {'token': 'Token does not exist'}
+        ]
+
+    def test_valid_token_checked_in_memory(self, django_assert_num_queries):
+        """Test repeated validations of signed tokens never query the database"""
+        company = CompanyFactory()
+        raw_token, _ = sign_token(company)
+        assert validate_pairs([(raw_token, company.name)]) == [None]
+
+        other_token, _ = sign_token(company)
+        with django_assert_num_queries(0):
+            assert validate_pairs([(raw_token, company.name), (other_token, company.name)]) == [None, None]
+
+    def test_wrong_company(self):
+        """Test a signed token only validates for the company it was issued to"""
+        company = CompanyFactory()
+        other_company = CompanyFactory()
+        raw_token, _ = sign_token(company)
+
+        assert validate_pairs([(raw_token, other_company.name)]) == [
+            {'company_name': 'Token does not belong to this company'}
+        ]
+
+    def test_expired_token(self, monkeypatch):
+        """Test a signed token is rejected after its expiry"""
+        company = CompanyFactory()
+        raw_token, claims = sign_token(company, ttl=60)
+        monkeypatch.setattr('tokens.signed.time.time', lambda: claims['exp'] + 1)
+
+        assert validate_pairs([(raw_token, company.name)]) == [{'token': 'Token has expired'}]
+
+    def test_revoked_token(self):
+        """Test a revoked signed token is inactive"""
+        company = CompanyFactory()
+        raw_token, claims = sign_token(company)
+
+        revoke_signed_token(claims)
+
+        assert SignedTokenRevocation.objects.filter(jti=claims['jti']).exists()
+        assert validate_pairs([(raw_token, company.name)]) == [{'token': 'Token is inactive'}]
+
+    def test_deactivated_company(self):
+        """Test signed tokens stop validating once their company is deactivated"""
+        company = CompanyFactory()
+        raw_token, _ = sign_token(company)
+        assert validate_pairs([(raw_token, company.name)]) == [None]
+
+        company.active = False
+        company.save()
+
+        assert validate_pairs([(raw_token, company.name)]) == [{'company_name': 'Company is inactive'}]
+
+    def test_company_deleted_by_another_process(self, settings):
+        """Test a reload forgets the names of companies deleted without this process noticing"""
+        companies = CompanyFactory(), CompanyFactory()
+        raw_tokens = [sign_token(company)[0] for company in companies]
+        assert validate_pairs([(raw_tokens[0], companies[0].name)]) == [None]
+        assert async_to_sync(avalidate_pairs)([(raw_tokens[1], companies[1].name)]) == [None]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Company._meta.db_table}')
+        settings.TOKEN_SIGNED_REVOCATION_REFRESH = 0
+
+        error = {'company_name': 'Token does not belong to this company'}
+        assert validate_pairs([(raw_tokens[0], companies[0].name)]) == [error]
+        assert async_to_sync(avalidate_pairs)([(raw_tokens[1], companies[1].name)]) == [error]
+        assert revocations.company_name(companies[0].pk) is None
+
+    def test_generation_and_validation_serializers(self):
+        """Test the serializers issue and accept signed tokens"""
+        company = CompanyFactory(password="test123")
+        data = {'company_name': company.name, 'password': 'test123', 'format': 'signed'}
+
+        serializer = TokenGenerationSerializer(data=data)
+        assert serializer.is_valid()
+        result = serializer.create(serializer.validated_data)
+        assert result['token_obj'] is None
+        assert result['expires_at'] > result['created_at']
+
+        serializer = TokenValidationSerializer(data={'token': result['token'], 'company_name': company.name})
+        assert serializer.is_valid()
@@ -0,0 +1,188 @@
+from datetime import timedelta
+
+import pytest
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from companies.tests.factories import CompanyFactory
+from tokens.models import Token
+from tokens.tests.factories import InactiveTokenFactory, TokenFactory
+from tokens.usage import company_usage, usage_tracker
+from tokens.validation import validate_pairs
+
+
+@pytest.mark.django_db
+class TestUsageTracker:
+
+    def test_validations_are_counted_in_memory(self, django_assert_num_queries):
+        """Test validation records uses without writing them"""
+        token = TokenFactory(token='usage-token')
+
+        with django_assert_num_queries(1):
+            validate_pairs([('usage-token', token.company.name)] * 3)
+
+        token.refresh_from_db()
+        assert token.use_count == 0
+        assert usage_tracker.stats()['pending'] == 1
+        assert usage_tracker.stats()['recorded'] == 3
+
+    def test_cache_hits_are_counted(self, django_assert_num_queries):
+        """Test validations answered by the validation cache still count as uses"""
+        token = TokenFactory(token='cached-token')
+        validate_pairs([('cached-token', token.company.name)])
+
+        with django_assert_num_queries(0):
+            validate_pairs([('cached-token', token.company.name)])
+
+        usage_tracker.flush()
+        token.refresh_from_db()
+        assert token.use_count == 2
+
+    def test_failed_validations_are_not_counted(self):
+        """Test only successful validations are recorded"""
+        token = InactiveTokenFactory(token='inactive-token')
+        validate_pairs([('inactive-token', token.company.name), ('missing', token.company.name)])
+
+        assert usage_tracker.stats()['recorded'] == 0
+
+    def test_flush_writes_batched_updates(self, settings, django_assert_num_queries):
+        """Test a flush adds to use_count and sets last_used_at with one UPDATE per batch"""
+        settings.TOKEN_USAGE_FLUSH_BATCH_SIZE = 2
+        tokens = [TokenFactory() for _ in range(3)]
+        Token.objects.filter(pk=tokens[0].pk).update(use_count=5)
+        for token in tokens:
+            usage_tracker.record(token.pk, uses=2)
+
+        with django_assert_num_queries(2):
+            assert usage_tracker.flush() == 3
+
+        counts = dict(Token.objects.values_list('pk', 'use_count'))
+        assert counts == {tokens[0].pk: 7, tokens[1].pk: 2, tokens[2].pk: 2}
+        assert not Token.objects.filter(last_used_at__isnull=True).exists()
+        assert usage_tracker.stats()['pending'] == 0
+        assert usage_tracker.stats()['flushed'] == 6
+
+    def test_flush_keeps_later_last_used_at(self):
+        """Test a flush never moves last_used_at backwards"""
+        token = TokenFactory()
+        later = timezone.now() + timedelta(hours=1)
+        Token.objects.filter(pk=token.pk).update(last_used_at=later)
+        usage_tracker.record(token.pk)
+
+        usage_tracker.flush()
+
+        token.refresh_from_db()
+        assert token.last_used_at == later
+        assert token.use_count == 1
+
+    def test_pending_tokens_are_bounded(self, settings):
+        """Test uses of new tokens are dropped once the tracker is full"""
+        settings.TOKEN_USAGE_MAX_PENDING = 2
+        for token_id in (1, 2, 3, 3, 1):
+            usage_tracker.record(token_id)
+
+        stats = usage_tracker.stats()
+        assert stats['pending'] == 2
+        assert stats['recorded'] == 3
+        assert stats['dropped'] == 2
+
+    def test_failed_flush_keeps_uses(self, monkeypatch):
+        """Test uses survive a failed flush and are written by the next one"""
+        token = TokenFactory()
+        usage_tracker.record(token.pk)
+
+        def fail(batch):
+            raise RuntimeError('database is down')
+
+        monkeypatch.setattr(usage_tracker, '_write', fail)
+        with pytest.raises(RuntimeError):
+            usage_tracker.flush()
+        monkeypatch.undo()
+
+        assert usage_tracker.stats()['pending'] == 1
+        usage_tracker.flush()
+        token.refresh_from_db()
+        assert token.use_count == 1
+
+    def test_disabled_tracker_records_nothing(self, settings):
+        """Test TOKEN_USAGE_TRACKING_ENABLED turns tracking off"""
+        settings.TOKEN_USAGE_TRACKING_ENABLED = False
+        token = TokenFactory(token='untracked-token')
+        validate_pairs([('untracked-token', token.company.name)])
+
+        assert usage_tracker.stats()['pending'] == 0
+
+
+@pytest.mark.django_db
+class TestCompanyUsage:
+
+    def test_summary_and_unused_tokens(self):
+        """Test totals cover every token and unused ones are listed least recently used first"""
+        company = CompanyFactory()
+        now = timezone.now()
+        never = TokenFactory(company=company)
+        old = TokenFactory(company=company)
+        recent = TokenFactory(company=company)
+        InactiveTokenFactory(company=company)
+        TokenFactory()
+        Token.objects.filter(pk=old.pk).update(use_count=3, last_used_at=now - timedelta(days=40))
+        Token.objects.filter(pk=recent.pk).update(use_count=1, last_used_at=now)
+
+        usage = company_usage(company, unused_days=30)
+
+        assert usage['tokens'] == 4
+        assert usage['active'] == 3
+        assert usage['used'] == 2
+        assert usage['never_used'] == 2
+        assert usage['total_uses'] == 4
+        assert usage['last_used_at'] == now
+        assert [token['id'] for token in usage['unused_tokens']] == [never.pk, old.pk]
+
+    def test_without_unused_days_lists_never_used_tokens(self):
+        """Test only never used tokens are listed without unused_days"""
+        company = CompanyFactory()
+        never = TokenFactory(company=company)
+        used = TokenFactory(company=company)
+        Token.objects.filter(pk=used.pk).update(use_count=F('use_count') + 1, last_used_at=timezone.now())
+
+        usage = company_usage(company)
+
+        assert [token['id'] for token in usage['unused_tokens']] == [never.pk]
+
+
+@pytest.mark.django_db
+class TestTokenUsageView:
+
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = reverse('token-usage')
+
+    def test_reports_flushed_usage(self):
+        """Test the endpoint reports uses once they are flushed"""
+        company = CompanyFactory(password='test123')
+        TokenFactory(company=company, token='reported-token')
+        validate_pairs([('reported-token', company.name)])
+        usage_tracker.flush()
+
+        response = self.client.post(
+            self.url, {'company_name': company.name, 'password': 'test123'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['tokens'] == 1
+        assert response.data['total_uses'] == 1
+        assert response.data['unused_tokens'] == []
+
+    def test_invalid_credentials(self):
+        """Test usage is only reported to the company itself"""
+        company = CompanyFactory(password='test123')
+
+        response = self.client.post(
+            self.url, {'company_name': company.name, 'password': 'wrong'}, format='json'
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Invalid credentials' in str(response.data)
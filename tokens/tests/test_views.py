@@ -1,8 +1,11 @@
+import json
+
 import pytest
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from companies.tests.factories import CompanyFactory, InactiveCompanyFactory
+from tokens.models import Token
 from tokens.tests.factories import InactiveTokenFactory, TokenFactory
 
 
@@ -33,6 +36,26 @@ class TestTokenGenerationView:
         assert len(response.data['token']) > 0
         assert 'successfully' in response.data['message']
 
+    def test_signed_token_generation(self):
+        """Test a signed token can be requested and then validated"""
+        company = CompanyFactory(password="test123")
+        data = {
+            'company_name': company.name,
+            'password': 'test123',
+            'format': 'signed'
+        }
+        
+        response = self.client.post(self.url, data, format='json')
+        
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['token'].startswith('st1:')
+        assert 'expires_at' in response.data
+        assert not Token.objects.exists()
+
+        data = {'token': response.data['token'], 'company_name': company.name}
+        response = self.client.post('/api/tokens/validate/', data, format='json')
+        assert response.status_code == status.HTTP_200_OK
+
     def test_invalid_company_credentials(self):
         """Test token generation with invalid credentials"""
         company = CompanyFactory(password="correct123")
@@ -81,9 +104,44 @@ class TestTokenGenerationView:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
     def test_only_post_method_allowed(self):
-        """Test that only POST method is allowed"""
-        response = self.client.get(self.url)
-        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        """Test that only POST is allowed; tokens are listed at token-list"""
+        for response in (self.client.get(self.url), self.client.put(self.url)):
+            assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+@pytest.mark.django_db
+class TestTokenBulkGenerationView:
+
+    def setup_method(self):
+        """Set up test client for each test"""
+        self.client = APIClient()
+        self.url = '/api/tokens/bulk/'
+
+    def test_tokens_streamed_as_ndjson(self, settings):
+        """Test bulk issuance streams one valid token per line"""
+        settings.TOKEN_BULK_CHUNK_SIZE = 3
+        company = CompanyFactory(password="test123")
+        data = {'company_name': company.name, 'password': 'test123', 'count': 7}
+
+        response = self.client.post(self.url, data, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        assert len(lines) == 7
+        assert len({line['token'] for line in lines}) == 7
+        assert Token.objects.filter(company=company).count() == 7
+
+    def test_invalid_credentials(self):
+        """Test bulk issuance with invalid credentials"""
+        company = CompanyFactory(password="correct123")
+        data = {'company_name': company.name, 'password': 'wrong123', 'count': 2}
+
+        response = self.client.post(self.url, data, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'non_field_errors' in response.data
+        assert not Token.objects.exists()
 
 
 @pytest.mark.django_db
@@ -148,3 +206,200 @@ class TestTokenValidationView:
         """Test that only POST method is allowed"""
         response = self.client.get(self.url)
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+@pytest.mark.django_db
+class TestTokenBatchValidationView:
+
+    def setup_method(self):
+        """Set up test client for each test"""
+        self.client = APIClient()
+        self.url = '/api/tokens/validate/batch/'
+
+    def test_batch_validation(self):
+        """Test a batch returns a result per item"""
+        token = TokenFactory(token="test-token-123")
+        data = {'tokens': [
+            {'token': 'test-token-123', 'company_name': token.company.name},
+            {'token': 'nonexistent-token', 'company_name': token.company.name},
+        ]}
+
+        response = self.client.post(self.url, data, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0] == {'valid': True}
+        assert response.data['results'][1]['valid'] is False
+        assert response.data['results'][1]['errors'] == {'token': ['Token does not exist']}
+
+    def test_malformed_item_rejected(self):
+        """Test a batch with a missing field is rejected as a whole"""
+        data = {'tokens': [{'token': 'test-token-123'}]}
+
+        response = self.client.post(self.url, data, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'tokens' in response.data
+
+    def test_only_post_method_allowed(self):
+        """Test that only POST method is allowed"""
+        response = self.client.get(self.url)
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+
+@pytest.mark.django_db
+class TestAsyncTokenViews:
+
+    def setup_method(self):
+        """Set up test client for each test"""
+        self.client = APIClient()
+
+    def post_both(self, sync_url, async_url, data, **kwargs):
+        """Post the same payload to the sync and async views"""
+        kwargs.setdefault('format', 'json')
+        return (
+            self.client.post(sync_url, data, **kwargs),
+            self.client.post(async_url, data, **kwargs),
+        )
+
+    @pytest.mark.parametrize('token_name, company_name', [
+        ('test-token-123', 'own'),
+        ('test-token-123', 'other'),
+        ('inactive-token', 'own'),
+        ('missing-token', 'own'),
+        ('', 'own'),
+    ])
+    def test_validation_matches_sync_view(self, token_name, company_name):
+        """Test the async validation view answers exactly like the sync one"""
+        token = TokenFactory(token="test-token-123")
+        InactiveTokenFactory(company=token.company, token="inactive-token")
+        other_company = CompanyFactory()
+        name = token.company.name if company_name == 'own' else other_company.name
+        data = {'token': token_name, 'company_name': name}
+
+        sync_response, async_response = self.post_both(
+            '/api/tokens/validate/', '/api/tokens/validate/async/', data
+        )
+
+        assert async_response.status_code == sync_response.status_code
+        assert async_response.content == sync_response.content
+
+    def test_validation_error_responses_match_sync_view(self):
+        """Test malformed requests get the same errors as the sync view"""
+        for body, content_type in [('invalid json', 'application/json'), ('x', 'text/plain')]:
+            sync_response, async_response = self.post_both(
+                '/api/tokens/validate/', '/api/tokens/validate/async/', body,
+                format=None, content_type=content_type
+            )
+            assert async_response.status_code == sync_response.status_code
+            assert async_response.json() == sync_response.json()
+
+        sync_response = self.client.get('/api/tokens/validate/')
+        async_response = self.client.get('/api/tokens/validate/async/')
+        assert async_response.status_code == sync_response.status_code
+        assert async_response.json() == sync_response.json()
+
+    def test_generation(self):
+        """Test the async generation view issues a usable token"""
+        company = CompanyFactory(password="test123")
+        data = {'company_name': company.name, 'password': 'test123'}
+
+        response = self.client.post('/api/tokens/async/', data, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert set(response.json()) == {'token', 'company_name', 'created_at', 'message'}
+        assert Token.objects.filter(token_hash=Token.digest_token(response.json()['token'])).exists()
+
+    def test_generation_invalid_credentials(self):
+        """Test the async generation view rejects bad credentials like the sync one"""
+        company = CompanyFactory(password="correct123")
+        data = {'company_name': company.name, 'password': 'wrong123'}
+
+        sync_response, async_response = self.post_both('/api/tokens/', '/api/tokens/async/', data)
+
+        assert async_response.status_code == sync_response.status_code
+        assert async_response.content == sync_response.content
+
+
+@pytest.mark.django_db
+class TestFastTokenValidationView:
+
+    def setup_method(self):
+        """Set up test client for each test"""
+        self.client = APIClient()
+        self.url = '/api/tokens/validate/fast/'
+
+    def assert_same_response(self, body, content_type='application/json'):
+        drf_response = self.client.post('/api/tokens/validate/', body, content_type=content_type)
+        fast_response = self.client.post(self.url, body, content_type=content_type)
+
+        assert fast_response.status_code == drf_response.status_code
+        assert fast_response.content == drf_response.content
+        return fast_response
+
+    def test_valid_token(self):
+        """Test a valid token gets the same answer as the DRF view"""
+        token = TokenFactory(token="test-token-123")
+        body = json.dumps({'token': 'test-token-123', 'company_name': token.company.name})
+
+        response = self.assert_same_response(body)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_whitespace_is_trimmed_like_drf(self):
+        """Test surrounding whitespace is ignored exactly like CharField does"""
+        token = TokenFactory(token="test-token-123")
+        body = json.dumps({'token': '  test-token-123\n', 'company_name': f' {token.company.name} '})
+
+        response = self.assert_same_response(body)
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.parametrize('payload', [
+        {'token': 'missing-token', 'company_name': 'acme'},
+        {'token': '', 'company_name': 'acme'},
+        {'token': 'x' * 256, 'company_name': 'acme'},
+        {'token': 'bad\u0000token', 'company_name': 'acme'},
+        {'token': True, 'company_name': 'acme'},
+        {'token': ['list'], 'company_name': 'acme'},
+        {'token': None, 'company_name': 'acme'},
+        {'company_name': 'acme'},
+        ['not', 'a', 'dict'],
+    ])
+    def test_invalid_payloads(self, payload):
+        """Test every rejected payload gets the same answer as the DRF view"""
+        response = self.assert_same_response(json.dumps(payload))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize('body, content_type', [
+        ('invalid json', 'application/json'),
+        ('{"token": NaN}', 'application/json'),
+        ('token=abc', 'text/plain'),
+        ('', 'application/json'),
+    ])
+    def test_request_errors(self, body, content_type):
+        """Test parse and media type errors match the DRF view"""
+        self.assert_same_response(body, content_type)
+
+    def test_without_orjson(self, monkeypatch):
+        """Test the standard library fallback answers the same way"""
+        monkeypatch.setattr('core.http.orjson', None)
+        token = TokenFactory(token="test-token-123")
+
+        self.assert_same_response(json.dumps({'token': 'test-token-123', 'company_name': token.company.name}))
+        self.assert_same_response('invalid json')
+
+    def test_only_post_method_allowed(self):
+        """Test that only POST method is allowed"""
+        drf_response = self.client.get('/api/tokens/validate/')
+        fast_response = self.client.get(self.url)
+
+        assert fast_response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert fast_response.content == drf_response.content
+
+    def test_options_matches_drf(self):
+        """Test OPTIONS gets the same metadata and Allow header as the DRF view"""
+        drf_response = self.client.options('/api/tokens/validate/')
+        fast_response = self.client.options(self.url)
+
+        assert fast_response.status_code == status.HTTP_200_OK
+        # DRF's own order varies from run to run
+        assert set(fast_response['Allow'].split(', ')) == set(drf_response['Allow'].split(', ')) == {'POST', 'OPTIONS'}
+        assert fast_response.content == drf_response.content
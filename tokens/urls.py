@@ -1,7 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from tokens.views import generate_token, validate_token
+from tokens.views import (agenerate_token, atoken_change_stream,
+                          avalidate_token, export_tokens, generate_token,
+                          generate_tokens, list_tokens,
+                          revoke_all_tokens, revoke_token, revoke_token_batch,
+                          token_change_stream, token_changes, token_usage,
+                          validate_token, validate_token_fast, validate_tokens)
+
+# TOKEN_VALIDATE_FAST_PATH serves the main validation URL without DRF
+validate_view = validate_token_fast if settings.TOKEN_VALIDATE_FAST_PATH else validate_token
 
 urlpatterns = [
     path('', generate_token, name='token-generate'),
-    path('validate/', validate_token, name='token-validate'),
+    path('async/', agenerate_token, name='token-generate-async'),
+    path('bulk/', generate_tokens, name='token-generate-bulk'),
+    path('list/', list_tokens, name='token-list'),
+    path('export/', export_tokens, name='token-export'),
+    path('validate/', validate_view, name='token-validate'),
+    path('validate/fast/', validate_token_fast, name='token-validate-fast'),
+    path('validate/async/', avalidate_token, name='token-validate-async'),
+    path('validate/batch/', validate_tokens, name='token-validate-batch'),
+    path('usage/', token_usage, name='token-usage'),
+    path('revoke/', revoke_token, name='token-revoke'),
+    path('revoke/batch/', revoke_token_batch, name='token-revoke-batch'),
+    path('revoke/all/', revoke_all_tokens, name='token-revoke-all'),
+    path('changes/', token_changes, name='token-changes'),
+    path('changes/stream/', token_change_stream, name='token-changes-stream'),
+    path('changes/stream/async/', atoken_change_stream, name='token-changes-stream-async'),
 ]
@@ -0,0 +1,215 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (Case, Count, DateTimeField, F, Max, Q,
+                              PositiveBigIntegerField, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from core.metrics import Counter, registry
+from tokens.models import Token
+
+logger = logging.getLogger(__name__)
+
+usage_flushes = Counter(
+    registry, 'token_usage_flushed_total', 'Token uses written to the database by the usage tracker',
+    labels=('result',),
+)
+
+
+class UsageTracker:
+    """
+    Per-process write-behind counter of token uses.
+
+    Validation only bumps an in-memory {token_id: [uses, last_seen]} entry; a
+    background thread writes the totals every TOKEN_USAGE_FLUSH_INTERVAL
+    seconds with one UPDATE per TOKEN_USAGE_FLUSH_BATCH_SIZE tokens, and again
+    when the process exits. At most TOKEN_USAGE_MAX_PENDING tokens are held:
+    uses of further tokens are dropped (and counted) and the thread is woken
+    to flush early. Uses still in memory when a worker is killed are lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self.reset()
+
+    def reset(self):
+        """Forget unflushed uses and counters"""
+        with self._lock:
+            self._pending = {}
+            self.recorded = 0
+            self.dropped = 0
+            self.flushed = 0
+            self.failed = 0
+            self.flushed_at = None
+
+    @property
+    def enabled(self):
+        return settings.TOKEN_USAGE_TRACKING_ENABLED
+
+    def start(self):
+        """Start the flush thread of this process, once"""
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self._run, name='token-usage-flush', daemon=True).start()
+
+    def _run(self):
+        while self.enabled:
+            self._wake.wait(settings.TOKEN_USAGE_FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Token usage flush failed')
+            finally:
+                connection.close_if_unusable_or_obsolete()
+        with self._lock:
+            self._started_pid = None
+
+    def record(self, token_id, uses=1):
+        """Count a use of a token; never touches the database"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            entry = self._pending.get(token_id)
+            if entry is not None:
+                entry[0] += uses
+                entry[1] = now
+            elif len(self._pending) < settings.TOKEN_USAGE_MAX_PENDING:
+                self._pending[token_id] = [uses, now]
+            else:
+                self.dropped += uses
+                self._wake.set()
+                return
+            self.recorded += uses
+        if self._started_pid != os.getpid():
+            self.start()
+
+    def _merge_back(self, pending):
+        """Keep uses whose flush failed for the next attempt, within the memory bound"""
+        with self._lock:
+            for token_id, (uses, last_seen) in pending.items():
+                entry = self._pending.get(token_id)
+                if entry is not None:
+                    entry[0] += uses
+                    entry[1] = max(entry[1], last_seen)
+                elif len(self._pending) < settings.TOKEN_USAGE_MAX_PENDING:
+                    self._pending[token_id] = [uses, last_seen]
+                else:
+                    self.dropped += uses
+
+    def flush(self):
+        """Write every pending use to the database and return the number of tokens updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        items = sorted(pending.items())
+        batch_size = settings.TOKEN_USAGE_FLUSH_BATCH_SIZE
+        done = 0
+        try:
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                self._write(batch)
+                done = start + len(batch)
+        except Exception:
+            failed = dict(items[done:])
+            failed_uses = sum(uses for uses, _ in failed.values())
+            self.failed += failed_uses
+            usage_flushes.inc('failed', amount=failed_uses)
+            self._merge_back(failed)
+            raise
+        finally:
+            written = sum(uses for _, (uses, _) in items[:done])
+            self.flushed += written
+            if written:
+                usage_flushes.inc('written', amount=written)
+            self.flushed_at = time.monotonic()
+        return done
+
+    def _write(self, batch):
+        """Add the uses of a batch of tokens with a single UPDATE"""
+        uses = Case(
+            *(When(pk=token_id, then=Value(count)) for token_id, (count, _) in batch),
+            default=Value(0),
+            output_field=PositiveBigIntegerField(),
+        )
+        last_seen = Case(
+            *(
+                When(pk=token_id, then=Value(datetime.fromtimestamp(seen, dt_timezone.utc)))
+                for token_id, (_, seen) in batch
+            ),
+            output_field=DateTimeField(),
+        )
+        Token.objects.filter(pk__in=[token_id for token_id, _ in batch]).update(
+            use_count=F('use_count') + uses,
+            # Another worker may already have written a later use
+            last_used_at=Greatest(Coalesce(F('last_used_at'), last_seen), last_seen),
+        )
+
+    def stats(self):
+        """Return the counters used to size the tracker"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'max_pending': settings.TOKEN_USAGE_MAX_PENDING,
+                'recorded': self.recorded,
+                'dropped': self.dropped,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'flushed_age': None if self.flushed_at is None else time.monotonic() - self.flushed_at,
+            }
+
+
+usage_tracker = UsageTracker()
+
+
+@atexit.register
+def flush_usage_at_exit():
+    try:
+        usage_tracker.flush()
+    except Exception:
+        logger.exception('Token usage flush at exit failed')
+
+
+def company_usage(company, unused_days=None, limit=100):
+    """
+    Summarize token usage for a company.
+
+    Returns totals over all its tokens plus up to limit active tokens not used
+    in the last unused_days days (or never used, without unused_days),
+    least recently used first.
+    """
+    tokens = Token.objects.filter(company=company).order_by()
+    summary = tokens.aggregate(
+        tokens=Count('pk'),
+        active=Count('pk', filter=Q(active=True)),
+        used=Count('pk', filter=Q(use_count__gt=0)),
+        total_uses=Coalesce(Sum('use_count'), 0),
+        last_used_at=Max('last_used_at'),
+    )
+    summary['never_used'] = summary['tokens'] - summary['used']
+
+    stale = Q(last_used_at__isnull=True)
+    if unused_days is not None:
+        stale |= Q(last_used_at__lt=timezone.now() - timedelta(days=unused_days))
+    summary['unused_tokens'] = list(
+        tokens.filter(stale, active=True)
+        .order_by(F('last_used_at').asc(nulls_first=True), 'pk')
+        .values('id', 'created_at', 'last_used_at', 'use_count')[:limit]
+    )
+    return summary
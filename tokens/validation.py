@@ -0,0 +1,272 @@
+from django.conf import settings
+from django.utils import timezone
+
+from audit.log import audit_log
+from audit.models import AuditEvent
+from core.metrics import token_validations
+from core.routers import aread_from_replica, read_from_replica
+from tokens.bloom import token_filter
+from tokens.cache import validation_cache
+from tokens.index import token_index
+from tokens.models import Token
+from tokens.signed import (asigned_token_error, is_signed_token, revocations,
+                           signed_token_error)
+from tokens.usage import usage_tracker
+
+# Everything validation needs, fetched with a single join on the company
+VALIDATION_FIELDS = (
+    'id',
+    'token_hash',
+    'active',
+    'expires_at',
+    'company_id',
+    'company__name',
+    'company__active',
+)
+
+# Outcome label reported to token_validations_total for each error message
+OUTCOMES = {
+    'Token does not exist': 'does_not_exist',
+    'Token does not belong to this company': 'wrong_company',
+    'Token is inactive': 'inactive_token',
+    'Token has expired': 'expired',
+    'Company is inactive': 'inactive_company',
+}
+
+
+def _lookup_queryset(token_hashes):
+    return Token.objects.values(*VALIDATION_FIELDS).filter(token_hash__in=token_hashes).order_by()
+
+
+def _fetch_rows(token_hashes):
+    return {bytes(row['token_hash']): row for row in _lookup_queryset(token_hashes)}
+
+
+async def _afetch_rows(token_hashes):
+    return {bytes(row['token_hash']): row async for row in _lookup_queryset(token_hashes)}
+
+
+def _missing(token_hashes, rows, alias):
+    """Hashes a replica did not return, which may just not have been replicated yet"""
+    if alias is None or not settings.DATABASE_REPLICA_RECHECK_MISSING:
+        return set()
+    return set(token_hashes) - rows.keys()
+
+
+def lookup_tokens(token_hashes):
+    """
+    Fetch validation rows for a set of token hashes in one query, on a
+    replica when there are any. Hashes the replica does not know are looked
+    up again on the primary.
+    """
+    rows, alias = read_from_replica(lambda: _fetch_rows(token_hashes))
+    missing = _missing(token_hashes, rows, alias)
+    if missing:
+        rows.update(_fetch_rows(missing))
+    return rows
+
+
+async def alookup_tokens(token_hashes):
+    """Async version of lookup_tokens()"""
+    rows, alias = await aread_from_replica(lambda: _afetch_rows(token_hashes))
+    missing = _missing(token_hashes, rows, alias)
+    if missing:
+        rows.update(await _afetch_rows(missing))
+    return rows
+
+
+def _indexed(token_hashes):
+    """Records of the token index for the hashes it knows"""
+    records = {}
+    for token_hash in token_hashes:
+        record = token_index.get(token_hash)
+        if record is not None:
+            records[token_hash] = record
+    return records
+
+
+def _index_rows(records):
+    """
+    Turn index records into validation rows, with the company name and status
+    kept by the signed token revocation set. Companies it cannot name, such
+    as deleted ones, are left to the database.
+    """
+    rows = {}
+    for token_hash, (token_id, company_id, expires_at, active) in records.items():
+        company_name = revocations.company_name(company_id)
+        if company_name is None:
+            continue
+        rows[token_hash] = {
+            'id': token_id,
+            'token_hash': token_hash,
+            'active': active,
+            'expires_at': expires_at,
+            'company_id': company_id,
+            'company__name': company_name,
+            'company__active': not revocations.is_company_inactive(company_id),
+        }
+    return rows
+
+
+def resolve_tokens(token_hashes):
+    """Validation rows from the token index, with the database answering for the hashes it does not know"""
+    records = _indexed(token_hashes)
+    for company_id in {record[1] for record in records.values()}:
+        revocations.prepare(company_id)
+    rows = _index_rows(records)
+    if len(rows) < len(token_hashes):
+        rows.update(lookup_tokens(token_hashes - rows.keys()))
+    return rows
+
+
+async def aresolve_tokens(token_hashes):
+    """Async version of resolve_tokens()"""
+    records = _indexed(token_hashes)
+    for company_id in {record[1] for record in records.values()}:
+        await revocations.aprepare(company_id)
+    rows = _index_rows(records)
+    if len(rows) < len(token_hashes):
+        rows.update(await alookup_tokens(token_hashes - rows.keys()))
+    return rows
+
+
+def token_error(row, company_name):
+    """Return the {field: message} error for a token row, or None if it is valid"""
+    if row is None:
+        return {'token': 'Token does not exist'}
+    if row['company__name'] != company_name:
+        return {'company_name': 'Token does not belong to this company'}
+    if not row['active']:
+        return {'token': 'Token is inactive'}
+    if row['expires_at'] is not None and row['expires_at'] <= timezone.now():
+        return {'token': 'Token has expired'}
+    if not row['company__active']:
+        return {'company_name': 'Company is inactive'}
+    return None
+
+
+def seconds_left(expires_at):
+    if expires_at is None:
+        return None
+    return (expires_at - timezone.now()).total_seconds()
+
+
+def _uncached_hashes(pairs, errors, indexes, digests):
+    """
+    Map each opaque pair index that needs a database lookup to its hash,
+    storing the hash of every opaque pair in digests for the audit log.
+    Pairs answered by the validation cache are skipped and counted as a use.
+    Pairs the Bloom filter does not know are returned apart, as a second
+    mapping, until _recheck_missed() has ruled out recently issued tokens.
+    """
+    token_hashes = {}
+    missed = {}
+    for index in indexes:
+        raw_token, company_name = pairs[index]
+        token_hash = digests[index] = Token.digest_token(raw_token)
+        token_id = validation_cache.get(token_hash, company_name)
+        if token_id is not None:
+            usage_tracker.record(token_id)
+            continue
+        if not token_filter.might_contain(token_hash):
+            missed[index] = token_hash
+            continue
+        token_hashes[index] = token_hash
+    return token_hashes, missed
+
+
+def _recheck_missed(pairs, errors, token_hashes, missed, recent):
+    """Send Bloom filter misses issued since its last sync to the lookup and reject the rest"""
+    for index, token_hash in missed.items():
+        if token_hash in recent:
+            token_hashes[index] = token_hash
+        else:
+            errors[index] = token_error(None, pairs[index][1])
+
+
+def record_outcomes(pairs, errors, digests, block=True):
+    """
+    Count each outcome and queue their audit events together. Signed tokens
+    have no entry in digests and are hashed here.
+    """
+    audit = audit_log.enabled
+    events = []
+    for index, ((raw_token, company_name), error) in enumerate(zip(pairs, errors)):
+        if error is None:
+            outcome = 'valid'
+        else:
+            (message,) = error.values()
+            outcome = OUTCOMES[message]
+        token_validations.inc(outcome)
+        if audit:
+            token_hash = digests[index] or Token.digest_token(raw_token)
+            events.append((AuditEvent.TOKEN_VALIDATED, outcome, company_name, token_hash))
+    audit_log.record_many(events, block=block)
+
+
+def _apply_rows(pairs, errors, token_hashes, rows):
+    for index, token_hash in token_hashes.items():
+        company_name = pairs[index][1]
+        row = rows.get(token_hash)
+        errors[index] = token_error(row, company_name)
+        if errors[index] is None:
+            validation_cache.set(
+                token_hash, company_name, row['company_id'],
+                value=row['id'], valid_for=seconds_left(row['expires_at']),
+            )
+            usage_tracker.record(row['id'])
+
+
+def validate_pairs(pairs):
+    """
+    Validate (raw_token, company_name) pairs.
+
+    Returns one entry per pair, in order: None when the token is valid,
+    otherwise the {field: message} error. Signed tokens are checked in
+    memory; opaque pairs answered by the validation cache skip the database,
+    those missed by the Bloom filter only need one probe of the tokens
+    inserted since its last sync, those found in the token index only need
+    their company, and the rest are resolved with a single query no matter
+    how many pairs are given. Successful opaque validations
+    are counted by the usage tracker; signed tokens have no row to count.
+    """
+    errors = [None] * len(pairs)
+    opaque = []
+    for index, (raw_token, company_name) in enumerate(pairs):
+        if is_signed_token(raw_token):
+            errors[index] = signed_token_error(raw_token, company_name)
+        else:
+            opaque.append(index)
+
+    digests = [None] * len(pairs)
+    token_hashes, missed = _uncached_hashes(pairs, errors, opaque, digests)
+    if missed:
+        _recheck_missed(pairs, errors, token_hashes, missed, token_filter.recent_hashes(set(missed.values())))
+    if token_hashes:
+        rows = resolve_tokens(set(token_hashes.values()))
+        _apply_rows(pairs, errors, token_hashes, rows)
+    record_outcomes(pairs, errors, digests)
+    return errors
+
+
+async def avalidate_pairs(pairs):
+    """Async version of validate_pairs() built on the async ORM"""
+    errors = [None] * len(pairs)
+    opaque = []
+    for index, (raw_token, company_name) in enumerate(pairs):
+        if is_signed_token(raw_token):
+            errors[index] = await asigned_token_error(raw_token, company_name)
+        else:
+            opaque.append(index)
+
+    digests = [None] * len(pairs)
+    token_hashes, missed = _uncached_hashes(pairs, errors, opaque, digests)
+    if missed:
+        recent = await token_filter.arecent_hashes(set(missed.values()))
+        _recheck_missed(pairs, errors, token_hashes, missed, recent)
+    if token_hashes:
+        rows = await aresolve_tokens(set(token_hashes.values()))
+        _apply_rows(pairs, errors, token_hashes, rows)
+    # Never wait for room in the audit queue on the event loop
+    record_outcomes(pairs, errors, digests, block=False)
+    return errors
@@ -1,7 +1,91 @@
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from tokens.serializers import TokenGenerationSerializer, TokenValidationSerializer
+
+from companies.models import Company
+from companies.serializers import CompanyCredentialsSerializer
+from core.http import (fast_json_loads, json_response, method_not_allowed,
+                       options_response, parse_json_body, renderer)
+from tokens.changes import (achange_stream, change_stream, changes_page,
+                            is_authorized)
+from tokens.issuance import aissue_token, issue_tokens_ndjson
+from tokens.listing import export_tokens_ndjson, tokens_page
+from tokens.revocation import revoke_company_tokens, revoke_tokens
+from tokens.serializers import (TokenBatchRevocationSerializer,
+                                TokenBatchValidationSerializer,
+                                TokenBulkGenerationSerializer,
+                                TokenChangesSerializer,
+                                TokenCredentialsSerializer,
+                                TokenExportSerializer,
+                                TokenGenerationSerializer, TokenListSerializer,
+                                TokenPairSerializer,
+                                TokenRevocationSerializer,
+                                TokenUsageSerializer, TokenValidationSerializer)
+from tokens.usage import company_usage
+from tokens.validation import avalidate_pairs, validate_pairs
+
+VALID_RESPONSE = {
+    'valid': True,
+    'message': 'Token is valid'
+}
+
+INVALID_RESPONSE = {
+    'valid': False,
+    'message': 'Token is invalid or inactive'
+}
+
+# Pre-rendered bodies for the fast validation path
+VALID_BODY = renderer.render(VALID_RESPONSE)
+INVALID_BODY = renderer.render(INVALID_RESPONSE)
+
+SURROGATES = re.compile('[\ud800-\udfff]')
+
+FORBIDDEN_CHANGES = {'detail': 'Invalid or missing change feed key.'}
+COMPACTED_CHANGES = {'detail': 'Changes after this sequence were compacted; drop cached state and restart from 0.'}
+
+
+def generation_response_data(result):
+    response_data = {
+        'token': result['token'],
+        'company_name': result['company'].name,
+        'created_at': result['created_at'],
+        'message': 'Token generated successfully. Please save your token - it will not be shown again.'
+    }
+    if 'expires_at' in result:
+        response_data['expires_at'] = result['expires_at']
+    return response_data
+
+
+def query_credentials(request):
+    """
+    Query parameters of a GET request with the company password taken from the
+    X-Company-Password header, so that it never ends up in access logs
+    """
+    data = request.query_params.dict()
+    data.pop('password', None)
+    if 'X-Company-Password' in request.headers:
+        data['password'] = request.headers['X-Company-Password']
+    return data
+
+
+@api_view(['GET'])
+def list_tokens(request):
+    """
+    Page through an authenticated company's tokens, newest first
+    """
+    serializer = TokenListSerializer(data=query_credentials(request))
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        page = tokens_page(data['company'], data.get('cursor'), data.get('limit', settings.TOKEN_LIST_PAGE_SIZE))
+        return Response(page, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
@@ -10,21 +94,80 @@ def generate_token(request):
     Generate a new token for authenticated company
     """
     serializer = TokenGenerationSerializer(data=request.data)
-    
+
     if serializer.is_valid():
         result = serializer.create(serializer.validated_data)
-        token_obj = result['token_obj']
-        raw_token = result['token']
-        
-        response_data = {
-            'token': raw_token,
-            'company_name': token_obj.company.name,
-            'created_at': token_obj.created_at,
-            'message': 'Token generated successfully. Please save your token - it will not be shown again.'
-        }
-        
-        return Response(response_data, status=status.HTTP_201_CREATED)
-    
+        return Response(generation_response_data(result), status=status.HTTP_201_CREATED)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@csrf_exempt
+async def agenerate_token(request):
+    """
+    Async version of generate_token built on the async ORM.
+
+    Hashing the password with SHA-256 takes microseconds, so it runs on the
+    event loop; only the database round trips are awaited.
+    """
+    if request.method != 'POST':
+        return method_not_allowed(request)
+
+    data, error_response = parse_json_body(request)
+    if error_response is not None:
+        return error_response
+
+    serializer = TokenCredentialsSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    credentials = serializer.validated_data
+    company = await Company.objects.filter(
+        name=credentials['company_name'],
+        active=True
+    ).afirst()
+    if company is None or not company.check_password(credentials['password']):
+        return json_response(
+            {'non_field_errors': ['Invalid credentials']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    result = await aissue_token(company, credentials['format'])
+    return json_response(generation_response_data(result), status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+def generate_tokens(request):
+    """
+    Issue many tokens for an authenticated company, streamed back as NDJSON
+    """
+    serializer = TokenBulkGenerationSerializer(data=request.data)
+
+    if serializer.is_valid():
+        lines = issue_tokens_ndjson(
+            serializer.validated_data['company'],
+            serializer.validated_data['count'],
+        )
+        return StreamingHttpResponse(
+            lines,
+            content_type='application/x-ndjson',
+            status=status.HTTP_201_CREATED,
+        )
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def export_tokens(request):
+    """
+    Stream every token of an authenticated company as NDJSON
+    """
+    serializer = TokenExportSerializer(data=query_credentials(request))
+
+    if serializer.is_valid():
+        lines = export_tokens_ndjson(serializer.validated_data['company'])
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -34,16 +177,207 @@ def validate_token(request):
     Validate if a token is active and valid
     """
     serializer = TokenValidationSerializer(data=request.data)
-    
+
+    if serializer.is_valid():
+        return Response(VALID_RESPONSE, status=status.HTTP_200_OK)
+
+    return Response(INVALID_RESPONSE, status=status.HTTP_400_BAD_REQUEST)
+
+
+@csrf_exempt
+async def avalidate_token(request):
+    """
+    Async version of validate_token built on the async ORM
+    """
+    if request.method != 'POST':
+        return method_not_allowed(request)
+
+    data, error_response = parse_json_body(request)
+    if error_response is not None:
+        return error_response
+
+    serializer = TokenPairSerializer(data=data)
+    if serializer.is_valid():
+        pair = (serializer.validated_data['token'], serializer.validated_data['company_name'])
+        if (await avalidate_pairs([pair]))[0] is None:
+            return json_response(VALID_RESPONSE, status=status.HTTP_200_OK)
+
+    return json_response(INVALID_RESPONSE, status=status.HTTP_400_BAD_REQUEST)
+
+
+def clean_char_field(value, max_length=255):
+    """
+    Mirror serializers.CharField(max_length=...) without the field machinery.
+    Returns the cleaned string, or None when DRF would reject the value.
+    """
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    value = str(value).strip()
+    if not value or len(value) > max_length or '\x00' in value or SURROGATES.search(value):
+        return None
+    return value
+
+
+@csrf_exempt
+def validate_token_fast(request):
+    """
+    Validate a token without the DRF stack.
+
+    Answers with exactly the same status codes and bodies as validate_token,
+    but skips content negotiation, the serializer field machinery and
+    response rendering.
+    """
+    if request.method == 'OPTIONS':
+        return options_response(request, validate_token)
+    if request.method != 'POST':
+        return method_not_allowed(request)
+
+    data, error_response = parse_json_body(request, loads=fast_json_loads)
+    if error_response is not None:
+        return error_response
+
+    if isinstance(data, dict):
+        raw_token = clean_char_field(data.get('token'))
+        company_name = clean_char_field(data.get('company_name'))
+        if raw_token is not None and company_name is not None:
+            if validate_pairs([(raw_token, company_name)])[0] is None:
+                return HttpResponse(VALID_BODY, content_type='application/json')
+
+    return HttpResponse(INVALID_BODY, status=status.HTTP_400_BAD_REQUEST, content_type='application/json')
+
+
+@api_view(['POST'])
+def validate_tokens(request):
+    """
+    Validate a batch of tokens, returning a result per item
+    """
+    serializer = TokenBatchValidationSerializer(data=request.data)
+
     if serializer.is_valid():
         response_data = {
-            'valid': True,
-            'message': 'Token is valid'
+            'results': serializer.validated_data['results']
         }
         return Response(response_data, status=status.HTTP_200_OK)
-    
-    response_data = {
-        'valid': False,
-        'message': 'Token is invalid or inactive'
-    }
-    return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def token_usage(request):
+    """
+    Report how an authenticated company's tokens are used
+    """
+    serializer = TokenUsageSerializer(data=request.data)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        usage = company_usage(data['company'], data.get('unused_days'), data['limit'])
+        return Response(usage, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def revoke_token(request):
+    """
+    Revoke one of the authenticated company's tokens
+    """
+    serializer = TokenRevocationSerializer(data=request.data)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        return Response({'revoked': revoke_tokens(data['company'], [data['token']])}, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def revoke_token_batch(request):
+    """
+    Revoke a list of the authenticated company's tokens with one UPDATE
+    """
+    serializer = TokenBatchRevocationSerializer(data=request.data)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        return Response({'revoked': revoke_tokens(data['company'], data['tokens'])}, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+def revoke_all_tokens(request):
+    """
+    Revoke every stored token of the authenticated company with one UPDATE
+    """
+    serializer = CompanyCredentialsSerializer(data=request.data)
+
+    if serializer.is_valid():
+        revoked = revoke_company_tokens(serializer.validated_data['company'])
+        return Response({'revoked': revoked}, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def token_changes(request):
+    """
+    Page through the token change log after a sequence number
+    """
+    if not is_authorized(request):
+        return Response(FORBIDDEN_CHANGES, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = TokenChangesSerializer(data=request.query_params)
+
+    if serializer.is_valid():
+        data = serializer.validated_data
+        page = changes_page(data['since'], data.get('limit', settings.TOKEN_CHANGES_PAGE_SIZE))
+        if page is None:
+            return Response(COMPACTED_CHANGES, status=status.HTTP_410_GONE)
+        return Response(page, status=status.HTTP_200_OK)
+
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def stream_request(request):
+    """Return (since, None) for a change stream request, or (None, error_response)"""
+    if request.method != 'GET':
+        return None, method_not_allowed(request, allowed=('GET',))
+    if not is_authorized(request):
+        return None, json_response(FORBIDDEN_CHANGES, status=status.HTTP_403_FORBIDDEN)
+
+    params = {'since': request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since', 0)}
+    serializer = TokenChangesSerializer(data=params)
+    if not serializer.is_valid():
+        return None, json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data['since'], None
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def token_change_stream(request):
+    """
+    Push token change log entries as Server-Sent Events, resuming after
+    Last-Event-ID. Holds a worker for up to TOKEN_CHANGES_STREAM_MAX_AGE
+    seconds; prefer the async stream under ASGI.
+    """
+    since, error_response = stream_request(request)
+    if error_response is not None:
+        return error_response
+    return event_stream_response(change_stream(since))
+
+
+async def atoken_change_stream(request):
+    """
+    Async version of token_change_stream that waits on the event loop
+    """
+    since, error_response = stream_request(request)
+    if error_response is not None:
+        return error_response
+    return event_stream_response(achange_stream(since))